@@ -8,5 +8,13 @@ psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-E
 EOSQL
 
 psql -v ON_ERROR_STOP=1 --username spider --dbname spiderdata <<-EOSQL
-  CREATE TABLE scrapped_data (url TEXT PRIMARY KEY, title TEXT, html TEXT);
+  CREATE TABLE scrapped_data (url TEXT PRIMARY KEY, title TEXT, html TEXT, text TEXT, extracted JSONB, canonical TEXT,
+    redirects JSONB, tsv TSVECTOR);
+  CREATE INDEX scrapped_data_tsv_idx ON scrapped_data USING GIN (tsv);
+  CREATE TABLE links (src TEXT, dst TEXT, PRIMARY KEY (src, dst));
+  CREATE TABLE page_rank (url TEXT PRIMARY KEY, rank DOUBLE PRECISION, inlinks INTEGER);
+  CREATE TABLE fetch_history (url TEXT, fetched_at TIMESTAMPTZ, hash TEXT, changed BOOLEAN);
+  CREATE INDEX fetch_history_url_idx ON fetch_history (url, fetched_at);
+  CREATE TABLE page_versions (url TEXT, version INTEGER, fetched_at TIMESTAMPTZ, keyframe BOOLEAN, size INTEGER,
+    data BYTEA, PRIMARY KEY (url, version));
 EOSQL
@@ -0,0 +1,306 @@
+import json
+import time
+from asyncio import CancelledError, Task, gather, sleep
+from typing import Dict
+
+from aiohttp import ClientSession, web
+
+try:
+    from .db import Storage
+    from .scrapper import Scrapper
+    from .urls import doctor, get_base_domain
+except ImportError:
+    from db import Storage
+    from scrapper import Scrapper
+    from urls import doctor, get_base_domain
+
+RUNNING = 'running'         # задача выполняется
+DONE = 'done'               # обход завершен
+CANCELLED = 'cancelled'     # задача отменена
+FAILED = 'failed'           # обход прерван ошибкой
+
+
+class JobScrapper(Scrapper):
+    """ Скраппер задачи API: статусное сообщение не выводится, прогресс доступен через API. """
+
+    def print_message(self):
+        return
+
+    def clear_message(self):
+        return
+
+
+class Job:
+
+    id: str                 # идентификатор задачи
+    url: str                # URL начала обхода
+    depth: int              # глубина обхода
+    scrapper: JobScrapper   # скраппер задачи
+    task: Task              # задача цикла событий, выполняющая обход
+    status: str             # состояние: RUNNING, DONE, CANCELLED или FAILED
+    error: str              # описание ошибки (None, если ошибки не было)
+    started: float          # момент запуска
+    finished: float         # момент завершения (None, если задача выполняется)
+
+    def __init__(self, id: str, url: str, depth: int, scrapper: JobScrapper):
+        """ Инициализация задачи обхода.
+
+        :param id: идентификатор задачи
+        :type id: str
+        :param url: URL начала обхода
+        :type url: str
+        :param depth: глубина обхода
+        :type depth: int
+        :param scrapper: скраппер задачи
+        :type scrapper: JobScrapper
+        """
+        self.id = id
+        self.url = url
+        self.depth = depth
+        self.scrapper = scrapper
+        self.task = None
+        self.status = RUNNING
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+
+    async def run(self):
+        """ Выполнить обход. Загруженные страницы записываются в хранилище и при отмене задачи. """
+        try:
+            await self.scrapper.scrape(doctor(self.url), self.depth)
+            self.status = DONE
+        except CancelledError:
+            self.status = CANCELLED
+        except Exception as error:
+            self.status = FAILED
+            self.error = repr(error)
+        finally:
+            await self.scrapper.flush()
+            self.finished = time.time()
+
+    def describe(self) -> dict:
+        """ Получить состояние задачи.
+
+        :return: идентификатор, URL, глубина, состояние, число выполненных и всех задач, статистика и время выполнения
+        :rtype: dict
+        """
+        done, total = self.scrapper.progress()
+        return {
+            'id': self.id,
+            'url': self.url,
+            'depth': self.depth,
+            'status': self.status,
+            'done': done,
+            'total': total,
+            'stat': dict(self.scrapper.stat),
+            'elapsed': (self.finished or time.time()) - self.started,
+            'error': self.error,
+        }
+
+
+class Api:
+
+    _storage: Storage           # хранилище, открытое на все время работы сервера
+    _session: ClientSession     # клиент, общий для всех задач обхода
+    _jobs: Dict[str, Job]       # задачи обхода по идентификаторам
+
+    def __init__(self, storage: Storage):
+        """ Инициализация HTTP API.
+
+        :param storage: хранилище (еще не открытое: оно открывается при запуске приложения)
+        :type storage: Storage
+        """
+        self._storage = storage
+        self._session = None
+        self._jobs = {}
+
+    @staticmethod
+    def int_param(request: web.Request, name: str, default: int) -> int:
+        """ Получить неотрицательный целочисленный параметр запроса.
+
+        :param request: запрос
+        :type request: web.Request
+        :param name: имя параметра
+        :type name: str
+        :param default: значение по умолчанию
+        :type default: int
+        :raises web.HTTPBadRequest: если значение не является неотрицательным целым числом
+        :return: значение
+        :rtype: int
+        """
+        value = request.query.get(name)
+        if value is None:
+            return default
+        if not value.isdigit():
+            raise web.HTTPBadRequest(text=f'{name} must be a non-negative integer')
+        return int(value)
+
+    def job(self, request: web.Request) -> Job:
+        """ Получить задачу по идентификатору из пути запроса.
+
+        :param request: запрос
+        :type request: web.Request
+        :raises web.HTTPNotFound: если задачи нет
+        :return: задача
+        :rtype: Job
+        """
+        job = self._jobs.get(request.match_info['id'])
+        if job is None:
+            raise web.HTTPNotFound(text='job not found')
+        return job
+
+    async def get(self, request: web.Request) -> web.Response:
+        """ Обработчик запроса /get?url=<url>&n=<n>&offset=<offset>: URL и заголовки загруженных страниц.
+
+        :param request: запрос
+        :type request: web.Request
+        :return: ответ JSON {"records": [{"url": ..., "title": ...}, ...], "next": <смещение следующей страницы>};
+            next равно null, если записей больше нет
+        :rtype: web.Response
+        """
+        url = request.query.get('url')
+        if not url:
+            raise web.HTTPBadRequest(text='url is required')
+        counter = self.int_param(request, 'n', 1)
+        offset = self.int_param(request, 'offset', 0)
+        records = [
+            {'url': record['url'], 'title': record['title']}
+            async for record in self._storage.get_records(get_base_domain(url), counter, offset)
+        ]
+        following = offset + counter if counter and len(records) == counter else None
+        return web.json_response({'records': records, 'next': following})
+
+    async def start_job(self, request: web.Request) -> web.Response:
+        """ Обработчик запроса POST /jobs с телом JSON {"url": <url>, "depth": <глубина>}: запустить обход.
+
+        :param request: запрос
+        :type request: web.Request
+        :return: ответ 201 с состоянием задачи
+        :rtype: web.Response
+        """
+        try:
+            params = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text='body must be JSON')
+        url = params.get('url') if isinstance(params, dict) else None
+        depth = params.get('depth', 0) if isinstance(params, dict) else None
+        if not isinstance(url, str) or not url:
+            raise web.HTTPBadRequest(text='url is required')
+        if not isinstance(depth, int) or depth < 0:
+            raise web.HTTPBadRequest(text='depth must be a non-negative integer')
+
+        job = Job(str(len(self._jobs) + 1), url, depth, JobScrapper(url, self._session, self._storage))
+        job.task = Task(job.run())
+        self._jobs[job.id] = job
+        return web.json_response(job.describe(), status=201)
+
+    async def list_jobs(self, request: web.Request) -> web.Response:
+        """ Обработчик запроса GET /jobs: состояния всех задач.
+
+        :param request: запрос
+        :type request: web.Request
+        :return: ответ JSON {"jobs": [...]}
+        :rtype: web.Response
+        """
+        return web.json_response({'jobs': [job.describe() for job in self._jobs.values()]})
+
+    async def get_job(self, request: web.Request) -> web.Response:
+        """ Обработчик запроса GET /jobs/<id>: состояние задачи.
+
+        :param request: запрос
+        :type request: web.Request
+        :return: ответ JSON с состоянием задачи
+        :rtype: web.Response
+        """
+        return web.json_response(self.job(request).describe())
+
+    async def cancel_job(self, request: web.Request) -> web.Response:
+        """ Обработчик запроса DELETE /jobs/<id>: отменить задачу и дождаться записи загруженных страниц.
+
+        :param request: запрос
+        :type request: web.Request
+        :return: ответ JSON с состоянием задачи
+        :rtype: web.Response
+        """
+        job = self.job(request)
+        job.task.cancel()
+        await gather(job.task, return_exceptions=True)
+        return web.json_response(job.describe())
+
+    async def stream_progress(self, request: web.Request) -> web.StreamResponse:
+        """ Обработчик запроса GET /jobs/<id>/progress?interval=<секунды>: поток состояний задачи.
+
+        Состояние выводится строкой JSON с заданным периодом (по умолчанию раз в секунду), поток завершается после
+        завершения задачи.
+
+        :param request: запрос
+        :type request: web.Request
+        :return: поток строк JSON
+        :rtype: web.StreamResponse
+        """
+        job = self.job(request)
+        try:
+            interval = float(request.query.get('interval', 1))
+        except ValueError:
+            raise web.HTTPBadRequest(text='interval must be a number')
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        while True:
+            finished = job.task.done()
+            await response.write(json.dumps(job.describe()).encode() + b'\n')
+            if finished:
+                break
+            await sleep(interval)
+        await response.write_eof()
+        return response
+
+    async def on_startup(self, app: web.Application):
+        await self._storage.connect()
+        self._session = ClientSession()
+
+    async def on_cleanup(self, app: web.Application):
+        tasks = [job.task for job in self._jobs.values()]
+        for task in tasks:
+            task.cancel()
+        await gather(*tasks, return_exceptions=True)
+        await self._session.close()
+        await self._storage.close()
+
+    def application(self) -> web.Application:
+        """ Получить приложение aiohttp.
+
+        Хранилище и клиент HTTP открываются при запуске приложения и используются всеми запросами и задачами обхода.
+        При остановке выполняющиеся задачи отменяются.
+
+        :return: приложение
+        :rtype: web.Application
+        """
+        app = web.Application()
+        app.router.add_get('/get', self.get)
+        app.router.add_post('/jobs', self.start_job)
+        app.router.add_get('/jobs', self.list_jobs)
+        app.router.add_get('/jobs/{id}', self.get_job)
+        app.router.add_delete('/jobs/{id}', self.cancel_job)
+        app.router.add_get('/jobs/{id}/progress', self.stream_progress)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8080, path: str = None) -> web.AppRunner:
+        """ Запустить HTTP-сервер.
+
+        :param host: адрес, defaults to '127.0.0.1'
+        :type host: str, optional
+        :param port: порт, defaults to 8080
+        :type port: int, optional
+        :param path: путь к сокету Unix (если задан, адрес и порт не используются), defaults to None
+        :type path: str, optional
+        :return: запущенный сервер (для остановки вызвать cleanup)
+        :rtype: web.AppRunner
+        """
+        runner = web.AppRunner(self.application(), access_log=None)
+        await runner.setup()
+        site = web.UnixSite(runner, path) if path else web.TCPSite(runner, host, port)
+        await site.start()
+        return runner
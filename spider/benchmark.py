@@ -0,0 +1,379 @@
+#!/bin/python3
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import time
+from argparse import ArgumentParser
+from asyncio import Task, get_event_loop, sleep
+from typing import List, Tuple
+
+from aiohttp import ClientSession, web
+from bs4 import BeautifulSoup
+
+try:
+    from .profiler import StageProfiler, percentile, peak_rss, rss
+    from .scrapper import Scrapper
+    from .storage import open_storage
+except ImportError:
+    from profiler import StageProfiler, percentile, peak_rss, rss
+    from scrapper import Scrapper
+    from storage import open_storage
+
+
+MEMORY = 'memory'   # хранилище-заглушка в памяти
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', 'pages')    # страницы тестов
+LINK_KINDS = (      # виды ссылок страницы микробенчмарка ({i} - номер ссылки)
+    'https://example.com/a/{i}', '/b/{i}/', 'c/{i}', '?page={i}', '/d/{i}#frag', '#top',
+    'https://other.org/{i}', '//cdn.example.com/{i}', 'mailto:user{i}@example.com', '/repeated',
+)
+FILLER = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. '
+
+
+class SyntheticSite:
+
+    pages: int              # число страниц сайта
+    fanout: int             # число ссылок на странице
+    page_size: int          # примерный размер HTML страницы в байтах
+    latency: float          # задержка ответа в секундах
+    error_rate: float       # доля страниц, отвечающих ошибкой 500
+    non_html_ratio: float   # доля страниц с типом контента, отличным от text/html
+    seed: int               # зерно генератора: одинаковые параметры дают одинаковый сайт
+
+    def __init__(self, pages: int = 1000, fanout: int = 10, page_size: int = 20000, latency: float = 0.0,
+                 error_rate: float = 0.0, non_html_ratio: float = 0.0, seed: int = 0):
+        """ Инициализация синтетического сайта.
+
+        :param pages: число страниц сайта, defaults to 1000
+        :type pages: int, optional
+        :param fanout: число ссылок на странице, defaults to 10
+        :type fanout: int, optional
+        :param page_size: примерный размер HTML страницы в байтах, defaults to 20000
+        :type page_size: int, optional
+        :param latency: задержка ответа в секундах, defaults to 0.0
+        :type latency: float, optional
+        :param error_rate: доля страниц, отвечающих ошибкой 500, defaults to 0.0
+        :type error_rate: float, optional
+        :param non_html_ratio: доля страниц с типом контента, отличным от text/html, defaults to 0.0
+        :type non_html_ratio: float, optional
+        :param seed: зерно генератора, defaults to 0
+        :type seed: int, optional
+        """
+        self.pages = pages
+        self.fanout = fanout
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.non_html_ratio = non_html_ratio
+        self.seed = seed
+
+    def kind(self, number: int) -> str:
+        """ Получить тип страницы: 'error', 'binary' или 'html'.
+
+        Тип определяется номером страницы и зерном; стартовая страница всегда HTML.
+
+        :param number: номер страницы
+        :type number: int
+        :return: тип страницы
+        :rtype: str
+        """
+        if number == 0:
+            return 'html'
+        value = random.Random(f'{self.seed}:{number}:kind').random()
+        if value < self.error_rate:
+            return 'error'
+        if value < self.error_rate + self.non_html_ratio:
+            return 'binary'
+        return 'html'
+
+    def render(self, number: int) -> str:
+        """ Сформировать HTML страницы.
+
+        :param number: номер страницы
+        :type number: int
+        :return: HTML
+        :rtype: str
+        """
+        generator = random.Random(f'{self.seed}:{number}:links')
+        links = ''.join(f'<a href="/p/{generator.randrange(self.pages)}">link</a>\n' for _ in range(self.fanout))
+        head = f'<!DOCTYPE html>\n<html><head><title>page {number}</title></head><body>\n{links}<p>'
+        tail = '</p></body></html>\n'
+        padding = max(self.page_size - len(head) - len(tail), 0)
+        return head + (FILLER * (padding // len(FILLER) + 1))[:padding] + tail
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """ Обработчик запроса страницы /p/<номер>.
+
+        :param request: запрос
+        :type request: web.Request
+        :return: ответ
+        :rtype: web.Response
+        """
+        number = int(request.match_info['number'])
+        if self.latency:
+            await sleep(self.latency)
+        if number >= self.pages:
+            raise web.HTTPNotFound()
+        kind = self.kind(number)
+        if kind == 'error':
+            raise web.HTTPInternalServerError()
+        if kind == 'binary':
+            return web.Response(body=b'\x00' * 1024, content_type='application/octet-stream')
+        return web.Response(text=self.render(number), content_type='text/html')
+
+    def application(self) -> web.Application:
+        """ Получить приложение aiohttp, обслуживающее сайт.
+
+        :return: приложение
+        :rtype: web.Application
+        """
+        app = web.Application()
+        app.router.add_get('/p/{number:\\d+}', self.handle)
+        return app
+
+
+class MemoryDB:
+
+    records: int    # число записанных страниц
+    size: int       # суммарный размер записанного HTML
+
+    def __init__(self):
+        """ Инициализация заглушки БД, которая только подсчитывает записанные данные. """
+        self.records = 0
+        self.size = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return
+
+    async def add_records(self, data: List[Tuple[str, str, str]]):
+        """ Учесть записи.
+
+        :param data: список кортежей, первый элемент в которых - URl, второй - заголовок, а третий - контент
+        :type data: List[Tuple[str, str, str]]
+        """
+        self.records += len(data)
+        self.size += sum(len(record[2]) for record in data)
+
+
+def serve_site(site: SyntheticSite, host: str, port: int):
+    """ Точка входа процесса, обслуживающего синтетический сайт.
+
+    Сайт работает в отдельном процессе, чтобы сервер не делил с обходчиком цикл событий и ядро процессора.
+
+    :param site: сайт
+    :type site: SyntheticSite
+    :param host: адрес
+    :type host: str
+    :param port: порт
+    :type port: int
+    """
+    web.run_app(site.application(), host=host, port=port, print=None, access_log=None)
+
+
+def git_revision() -> str:
+    """ Получить текущую ревизию репозитория (пустая строка, если недоступна). """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+async def wait_for_server(url: str, timeout: float = 10):
+    """ Дождаться, пока сервер начнет отвечать.
+
+    :param url: URL, отвечающий после запуска сервера
+    :type url: str
+    :param timeout: максимальное время ожидания в секундах, defaults to 10
+    :type timeout: float, optional
+    """
+    deadline = time.time() + timeout
+    async with ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url):
+                    return
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                await sleep(0.1)
+
+
+async def run(site: SyntheticSite, depth: int, interval: float = 1.0, storage: str = MEMORY,
+              host: str = 'localhost', port: int = 8765) -> dict:
+    """ Запустить синтетический сайт и обойти его скраппером.
+
+    :param site: сайт
+    :type site: SyntheticSite
+    :param depth: глубина обхода
+    :type depth: int
+    :param interval: период замеров в секундах, defaults to 1.0
+    :type interval: float, optional
+    :param storage: строка подключения к хранилищу или MEMORY для заглушки БД в памяти, defaults to MEMORY
+    :type storage: str, optional
+    :param host: адрес сайта, defaults to 'localhost'
+    :type host: str, optional
+    :param port: порт сайта, defaults to 8765
+    :type port: int, optional
+    :return: результаты: страниц в секунду, пиковый RSS, перцентили задержки GET и замеры по времени
+    :rtype: dict
+    """
+    context = multiprocessing.get_context('spawn')
+    server = context.Process(target=serve_site, args=(site, host, port), daemon=True)
+    server.start()
+    url = f'http://{host}:{port}/p/0'
+    try:
+        await wait_for_server(url)
+
+        db = MemoryDB() if storage == MEMORY else open_storage(storage)
+
+        timeline = []
+        profiler = StageProfiler()
+        async with ClientSession(trace_configs=[profiler.trace_config()]) as session, db:
+            scrapper = Scrapper(url, session, db, profiler=profiler)
+
+            async def sample():
+                started, done, seen = time.perf_counter(), 0, 0
+                while True:
+                    await sleep(interval)
+                    latencies = profiler.samples('get')
+                    current = scrapper.stat.get('done', 0)
+                    timeline.append({
+                        'time': round(time.perf_counter() - started, 3),
+                        'pages_per_second': (current - done) / interval,
+                        'rss': rss(),
+                        'p99_get': percentile(sorted(latencies[seen:]), 99),
+                    })
+                    done, seen = current, len(latencies)
+
+            sampler = Task(sample())
+            started = time.perf_counter()
+            try:
+                await scrapper.scrape(url, depth)
+                await scrapper.flush()
+            finally:
+                sampler.cancel()
+            elapsed = time.perf_counter() - started
+            scrapper.clear_message()
+    finally:
+        server.terminate()
+        server.join()
+
+    report = profiler.report()
+    return {
+        'revision': git_revision(),
+        'time': time.time(),
+        'site': vars(site),
+        'depth': depth,
+        'storage': storage.split('://')[0],
+        'elapsed': elapsed,
+        'pages': scrapper.stat.get('done', 0),
+        'pages_per_second': scrapper.stat.get('done', 0) / elapsed,
+        'peak_rss': peak_rss(),
+        'get': report.get('get', {}),
+        'stat': scrapper.stat,
+        'timeline': timeline,
+    }
+
+
+def bench_links(links: int = 3000, repeat: int = 5) -> dict:
+    """ Сравнить извлечение ссылок по одному тэгу (check_link) и пакетом (extract_links) на страницах тестов.
+
+    В тело каждой страницы из tests/pages добавляются ссылки разных видов: абсолютные, от корня сайта, относительные,
+    с фрагментом, на другие хосты, повторы. Страница разбирается один раз, замеряется только извлечение ссылок;
+    для каждого способа берется лучшее время из repeat повторов.
+
+    :param links: число ссылок на странице, defaults to 3000
+    :type links: int, optional
+    :param repeat: число повторов, defaults to 5
+    :type repeat: int, optional
+    :return: суммарное время обоих способов по всем страницам, число ссылок и ускорение
+    :rtype: dict
+    """
+    url = 'https://example.com/docs/index'
+    scrapper = Scrapper(url, None, None)
+    anchors = ''.join(
+        f'<a href="{LINK_KINDS[i % len(LINK_KINDS)].format(i=i)}">{i}</a>\n' for i in range(links)
+    )
+    per_tag = batch = 0.0
+    found = 0
+    for name in sorted(os.listdir(PAGES_DIR)):
+        with open(os.path.join(PAGES_DIR, name)) as file:
+            soup = BeautifulSoup(file.read().replace('</body>', anchors + '</body>'), 'lxml')
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = (scrapper.check_link(tag, url) for tag in soup.find_all('a'))
+            result = {link for link in result if link is not None}
+            timings.append(time.perf_counter() - started)
+        per_tag += min(timings)
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = scrapper.extract_links(soup, url)
+            timings.append(time.perf_counter() - started)
+        batch += min(timings)
+        found += len(result)
+
+    return {
+        'revision': git_revision(),
+        'time': time.time(),
+        'links_per_page': links,
+        'pages': len(os.listdir(PAGES_DIR)),
+        'links_found': found,
+        'per_tag_seconds': per_tag,
+        'batch_seconds': batch,
+        'speedup': per_tag / batch,
+    }
+
+
+DESCRIPTION = """Offline crawl benchmark.
+Starts a local synthetic website in a separate process, crawls it with Scrapper and prints a JSON report.
+"""
+
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(description=DESCRIPTION)
+    parser.add_argument('--pages', type=int, default=1000, help='number of pages on the synthetic site')
+    parser.add_argument('--fanout', type=int, default=10, help='links per page')
+    parser.add_argument('--page-size', type=int, default=20000, help='approximate page size in bytes')
+    parser.add_argument('--latency', type=float, default=0.0, help='server response delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of pages answering 500')
+    parser.add_argument('--non-html-ratio', type=float, default=0.0, help='share of non-HTML pages')
+    parser.add_argument('--seed', type=int, default=0, help='site generator seed')
+    parser.add_argument('--depth', type=int, default=10, help='scrapping depth')
+    parser.add_argument('--interval', type=float, default=1.0, help='timeline sampling interval in seconds')
+    parser.add_argument('--storage', nargs='+', default=[MEMORY],
+                        help='storages to compare: "memory" (in-memory stand-in), postgresql://..., sqlite://<file>, '
+                             'warc://<directory>')
+    parser.add_argument('--port', type=int, default=8765, help='synthetic site port')
+    parser.add_argument('--output', help='append the JSON report to this file to track regressions')
+    parser.add_argument('--links', type=int,
+                        help='instead of crawling, time link extraction on tests/pages with this many links per page')
+    args = parser.parse_args()
+
+    if args.links:
+        line = json.dumps(bench_links(args.links))
+        print(line)
+        if args.output:
+            with open(args.output, 'a') as file:
+                file.write(line + '\n')
+        parser.exit()
+
+    site = SyntheticSite(args.pages, args.fanout, args.page_size, args.latency, args.error_rate,
+                         args.non_html_ratio, args.seed)
+    loop = get_event_loop()
+    for storage in args.storage:
+        result = loop.run_until_complete(run(site, args.depth, args.interval, storage, port=args.port))
+
+        line = json.dumps(result)
+        print(line)
+        if args.output:
+            with open(args.output, 'a') as file:
+                file.write(line + '\n')
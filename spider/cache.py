@@ -0,0 +1,465 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from asyncio import get_event_loop
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, List, Tuple, Union
+
+from aiohttp import ClientSession
+from multidict import CIMultiDict
+from yarl import URL
+
+HEURISTIC_STATUSES = {200, 203, 204, 300, 301, 404, 405, 410, 414, 501}    # статусы, кэшируемые по умолчанию
+HEURISTIC_FRACTION = 0.1            # доля времени с момента изменения, в течение которой ответ считается свежим
+HEURISTIC_LIMIT = 24 * 60 * 60      # ограничение эвристического срока свежести в секундах
+
+
+def parse_date(value: str) -> Union[float, None]:
+    """ Разобрать дату HTTP.
+
+    :param value: значение заголовка
+    :type value: str
+    :return: метка времени или None, если дата не задана или некорректна
+    :rtype: Union[float, None]
+
+    >>> parse_date('Sun, 06 Nov 1994 08:49:37 GMT')
+    784111777.0
+    >>> parse_date('yesterday') is None
+    True
+    """
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def parse_cache_control(value: str) -> Dict[str, str]:
+    """ Разобрать заголовок Cache-Control.
+
+    :param value: значение заголовка
+    :type value: str
+    :return: директивы в нижнем регистре и их значения (пустая строка для директив без значения)
+    :rtype: Dict[str, str]
+
+    >>> parse_cache_control('public, max-age="60", No-Cache')
+    {'public': '', 'max-age': '60', 'no-cache': ''}
+    """
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, argument = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"')
+    return directives
+
+
+def is_storable(status: int, headers: CIMultiDict) -> bool:
+    """ Проверить, может ли ответ быть сохранен в частном кэше (RFC 7234, раздел 3).
+
+    :param status: статус ответа
+    :type status: int
+    :param headers: заголовки ответа
+    :type headers: CIMultiDict
+    :return: True, если ответ можно сохранить
+    :rtype: bool
+
+    >>> is_storable(200, CIMultiDict())
+    True
+    >>> is_storable(200, CIMultiDict({'Cache-Control': 'no-store'}))
+    False
+    >>> is_storable(500, CIMultiDict())
+    False
+    >>> is_storable(500, CIMultiDict({'Cache-Control': 'max-age=10'}))
+    True
+    """
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-store' in directives or headers.get('Vary', '').strip() == '*':
+        return False
+    return status in HEURISTIC_STATUSES or 'max-age' in directives or 'Expires' in headers
+
+
+def freshness_lifetime(status: int, headers: CIMultiDict, response_time: float) -> float:
+    """ Получить срок свежести ответа в секундах (RFC 7234, раздел 4.2.1).
+
+    Используются директива max-age, заголовок Expires или, если они не заданы, эвристика: доля времени с момента
+    последнего изменения. Ответ с директивой no-cache всегда требует повторной проверки.
+
+    :param status: статус ответа
+    :type status: int
+    :param headers: заголовки ответа
+    :type headers: CIMultiDict
+    :param response_time: момент получения ответа
+    :type response_time: float
+    :return: срок свежести
+    :rtype: float
+
+    >>> freshness_lifetime(200, CIMultiDict({'Cache-Control': 'max-age=60'}), 0)
+    60.0
+    >>> headers = CIMultiDict({'Date': 'Sun, 06 Nov 1994 08:49:37 GMT', 'Expires': 'Sun, 06 Nov 1994 08:50:37 GMT'})
+    >>> freshness_lifetime(200, headers, 0)
+    60.0
+    >>> headers = CIMultiDict({'Date': 'Sun, 06 Nov 1994 08:49:37 GMT',
+    ...                        'Last-Modified': 'Sun, 06 Nov 1994 07:49:37 GMT'})
+    >>> freshness_lifetime(200, headers, 0)
+    360.0
+    >>> freshness_lifetime(200, CIMultiDict({'Cache-Control': 'no-cache, max-age=60'}), 0)
+    0.0
+    """
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-cache' in directives:
+        return 0.0
+    if directives.get('max-age', '').isdigit():
+        return float(directives['max-age'])
+    date = parse_date(headers.get('Date')) or response_time
+    if 'Expires' in headers:
+        expires = parse_date(headers['Expires'])
+        return max(expires - date, 0.0) if expires is not None else 0.0
+    modified = parse_date(headers.get('Last-Modified'))
+    if modified is not None and status in HEURISTIC_STATUSES:
+        return min(max(date - modified, 0.0) * HEURISTIC_FRACTION, HEURISTIC_LIMIT)
+    return 0.0
+
+
+def expiration_time(status: int, headers: CIMultiDict, response_time: float) -> float:
+    """ Получить момент, до которого ответ остается свежим, с учетом его возраста (RFC 7234, раздел 4.2.3).
+
+    :param status: статус ответа
+    :type status: int
+    :param headers: заголовки ответа
+    :type headers: CIMultiDict
+    :param response_time: момент получения ответа
+    :type response_time: float
+    :return: метка времени
+    :rtype: float
+
+    >>> expiration_time(200, CIMultiDict({'Cache-Control': 'max-age=60', 'Age': '20'}), 1000)
+    1040.0
+    """
+    date = parse_date(headers.get('Date')) or response_time
+    age = headers.get('Age', '')
+    initial_age = max(response_time - date, float(age) if age.isdigit() else 0.0)
+    return response_time + freshness_lifetime(status, headers, response_time) - initial_age
+
+
+class CachedResponse:
+    """ Ответ, сохраненный в кэше. Повторяет используемую скраппером часть интерфейса aiohttp.ClientResponse. """
+
+    status: int             # статус ответа
+    headers: CIMultiDict    # заголовки ответа
+    url: URL                # URL ответа (конечный, если запрос был перенаправлен)
+    history: tuple = ()     # перенаправления не сохраняются (скраппер определяет их по конечному URL)
+    _body: bytes            # тело ответа (None для ответа на HEAD)
+    _encoding: str          # кодировка тела
+
+    def __init__(self, status: int, headers: CIMultiDict, url: str, body: bytes = None, encoding: str = 'utf-8'):
+        self.status = status
+        self.headers = headers
+        self.url = URL(url)
+        self._body = body
+        self._encoding = encoding
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return
+
+    async def read(self) -> bytes:
+        return self._body or b''
+
+    def get_encoding(self) -> str:
+        return self._encoding
+
+
+class CachedRequest:
+    """ Асинхронный контекстный менеджер запроса: ответ получается из кэша или из сети при входе в контекст. """
+
+    def __init__(self, request: Awaitable[CachedResponse]):
+        self._request = request
+
+    async def __aenter__(self) -> CachedResponse:
+        return await self._request
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return
+
+
+class CachedSession:
+    """ Дисковый кэш ответов HTTP между скраппером и ClientSession.
+
+    Тела ответов хранятся сжатыми gzip в файлах, названных по хэшу SHA-256 содержимого, поэтому одинаковые страницы
+    хранятся один раз. Индекс (URL, статус, заголовки, срок свежести, момент последнего обращения) хранится в SQLite.
+    Свежие ответы отдаются без запроса, устаревшие проверяются условным запросом (If-None-Match/If-Modified-Since).
+    При превышении размера кэша удаляются ответы, к которым дольше всего не обращались.
+
+    В режиме воспроизведения сеть не используется: сохраненные ответы отдаются независимо от свежести, а на
+    отсутствующие в кэше запросы возвращается ответ 504 (как на запрос с директивой only-if-cached).
+    """
+
+    EVICTION_BATCH = 100    # число записей, читаемых из индекса за один проход вытеснения
+
+    _session: ClientSession         # клиент, выполняющий запросы (None в режиме воспроизведения)
+    _directory: str                 # каталог кэша
+    _max_size: int                  # максимальный суммарный размер сжатых тел в байтах
+    _replay: bool                   # режим воспроизведения без обращения к сети
+    _size: int                      # текущий суммарный размер сжатых тел
+    _connection: sqlite3.Connection = None  # соединение с индексом
+    _executor: ThreadPoolExecutor = None    # поток, в котором выполняются операции с диском
+    stat: dict                      # статистика кэша: hit, miss, revalidated, stored, evicted
+
+    def __init__(self, session: Union[ClientSession, None], directory: str, max_size: int = 1024 ** 3,
+                 replay: bool = False):
+        """ Инициализация кэша.
+
+        :param session: клиент, выполняющий запросы (может быть None в режиме воспроизведения)
+        :type session: Union[ClientSession, None]
+        :param directory: каталог кэша
+        :type directory: str
+        :param max_size: максимальный суммарный размер сжатых тел в байтах, defaults to 1 GiB
+        :type max_size: int, optional
+        :param replay: режим воспроизведения без обращения к сети, defaults to False
+        :type replay: bool, optional
+        """
+        self._session = session
+        self._directory = directory
+        self._max_size = max_size
+        self._replay = replay
+        self._size = 0
+        self.stat = {}
+
+    async def run(self, func: Callable, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        return await get_event_loop().run_in_executor(self._executor, func, *args)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self._directory, digest[:2], f'{digest}.gz')
+
+    def _connect(self):
+        os.makedirs(self._directory, exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(self._directory, 'index.db'), check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, status INTEGER, headers TEXT, url TEXT, '
+            'encoding TEXT, digest TEXT, expires REAL, accessed REAL)'
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed_idx ON responses (accessed)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS responses_digest_idx ON responses (digest)')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS bodies (digest TEXT PRIMARY KEY, size INTEGER)')
+        self._connection.commit()
+        self._size = self._connection.execute('SELECT coalesce(sum(size), 0) FROM bodies').fetchone()[0]
+
+    async def __aenter__(self):
+        """ Открыть индекс кэша. """
+        await self.run(self._connect)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        """ Закрыть индекс кэша и клиент. """
+        await self.run(self._connection.close)
+        self._executor.shutdown()
+        self._executor = None
+        if self._session is not None:
+            await self._session.close()
+
+    def count(self, name: str):
+        self.stat[name] = self.stat.get(name, 0) + 1
+
+    def _load(self, key: str) -> Union[Tuple[CachedResponse, float], None]:
+        row = self._connection.execute(
+            'SELECT status, headers, url, encoding, digest, expires FROM responses WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, headers, url, encoding, digest, expires = row
+        body = None
+        if digest is not None:
+            try:
+                with gzip.open(self._path(digest)) as file:
+                    body = file.read()
+            except OSError:
+                return None
+        with self._connection:
+            self._connection.execute('UPDATE responses SET accessed = ? WHERE key = ?', (time.time(), key))
+        return CachedResponse(status, CIMultiDict(json.loads(headers)), url, body, encoding), expires
+
+    def _store(self, key: str, response: CachedResponse, body: Union[bytes, None], expires: float) -> List[str]:
+        digest = size = None
+        if body is not None:
+            digest = hashlib.sha256(body).hexdigest()
+            path = self._path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temporary = f'{path}.tmp'
+                with open(temporary, 'wb') as file:
+                    file.write(gzip.compress(body, compresslevel=6))
+                os.replace(temporary, path)
+            size = os.path.getsize(path)
+        with self._connection:
+            if digest is not None and self._connection.execute(
+                'INSERT OR IGNORE INTO bodies (digest, size) VALUES (?, ?)', (digest, size)
+            ).rowcount:
+                self._size += size
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses (key, status, headers, url, encoding, digest, expires, accessed) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, response.status, json.dumps(list(response.headers.items())), str(response.url),
+                 response.get_encoding(), digest, expires, time.time())
+            )
+        return self._evict() if self._size > self._max_size else []
+
+    def _evict(self) -> List[str]:
+        evicted = []
+        while self._size > self._max_size:
+            rows = self._connection.execute(
+                'SELECT key, digest FROM responses ORDER BY accessed LIMIT ?', (self.EVICTION_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            removed = []
+            with self._connection:
+                for key, digest in rows:
+                    if self._size <= self._max_size:
+                        break
+                    self._connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    evicted.append(key)
+                    # тело удаляется, только если на него не ссылаются другие записи
+                    if digest is None or self._connection.execute(
+                        'SELECT 1 FROM responses WHERE digest = ? LIMIT 1', (digest,)
+                    ).fetchone():
+                        continue
+                    size, = self._connection.execute('SELECT size FROM bodies WHERE digest = ?', (digest,)).fetchone()
+                    self._connection.execute('DELETE FROM bodies WHERE digest = ?', (digest,))
+                    self._size -= size
+                    removed.append(digest)
+            for digest in removed:
+                try:
+                    os.remove(self._path(digest))
+                except OSError:
+                    pass
+        return evicted
+
+    def _touch(self, key: str, headers: CIMultiDict, expires: float):
+        with self._connection:
+            self._connection.execute(
+                'UPDATE responses SET headers = ?, expires = ?, accessed = ? WHERE key = ?',
+                (json.dumps(list(headers.items())), expires, time.time(), key)
+            )
+
+    async def store(self, key: str, status: int, headers: CIMultiDict, url: str, body: Union[bytes, None],
+                    encoding: str, response_time: float) -> CachedResponse:
+        """ Сохранить ответ, если он может быть сохранен, и вернуть его копию.
+
+        :param key: ключ записи (метод и URL)
+        :type key: str
+        :param status: статус ответа
+        :type status: int
+        :param headers: заголовки ответа
+        :type headers: CIMultiDict
+        :param url: URL ответа
+        :type url: str
+        :param body: тело ответа (None для ответа на HEAD)
+        :type body: Union[bytes, None]
+        :param encoding: кодировка тела
+        :type encoding: str
+        :param response_time: момент получения ответа
+        :type response_time: float
+        :return: ответ
+        :rtype: CachedResponse
+        """
+        response = CachedResponse(status, headers, url, body, encoding)
+        if is_storable(status, headers):
+            expires = expiration_time(status, headers, response_time)
+            evicted = await self.run(self._store, key, response, body, expires)
+            self.count('stored')
+            if evicted:
+                self.stat['evicted'] = self.stat.get('evicted', 0) + len(evicted)
+        return response
+
+    async def fetch(self, method: str, url: str, timeout: float, allow_redirects: bool = True) -> CachedResponse:
+        """ Получить ответ из кэша или из сети.
+
+        :param method: метод: GET или HEAD
+        :type method: str
+        :param url: URL
+        :type url: str
+        :param timeout: таймаут запроса
+        :type timeout: float
+        :param allow_redirects: выполнять перенаправления (при запросе в сеть), defaults to True
+        :type allow_redirects: bool, optional
+        :return: ответ
+        :rtype: CachedResponse
+        """
+        key = f'{method} {url}'
+        cached = await self.run(self._load, key)
+        # на HEAD можно ответить заголовками сохраненного ответа на GET
+        if cached is None and method == 'HEAD':
+            cached = await self.run(self._load, f'GET {url}')
+        if cached is not None and (self._replay or cached[1] > time.time()):
+            self.count('hit')
+            return cached[0]
+        if self._replay:
+            self.count('miss')
+            return CachedResponse(504, CIMultiDict(), url)
+
+        # устаревший ответ проверяется условным запросом, если у него есть валидаторы
+        headers = {}
+        if cached is not None and method == 'GET':
+            if 'ETag' in cached[0].headers:
+                headers['If-None-Match'] = cached[0].headers['ETag']
+            if 'Last-Modified' in cached[0].headers:
+                headers['If-Modified-Since'] = cached[0].headers['Last-Modified']
+
+        request = self._session.get if method == 'GET' else self._session.head
+        async with request(url, timeout=timeout, headers=headers, allow_redirects=allow_redirects) as response:
+            response_time = time.time()
+            if response.status == 304 and headers:
+                self.count('revalidated')
+                merged = CIMultiDict(cached[0].headers)
+                merged.update(response.headers)
+                cached[0].headers = merged
+                await self.run(self._touch, key, merged, expiration_time(cached[0].status, merged, response_time))
+                return cached[0]
+            self.count('miss')
+            body = await response.read() if method == 'GET' else None
+            encoding = response.get_encoding() if method == 'GET' else 'utf-8'
+            return await self.store(key, response.status, CIMultiDict(response.headers), str(response.url), body,
+                                    encoding, response_time)
+
+    def get(self, url: str, timeout: float = None, allow_redirects: bool = True) -> CachedRequest:
+        """ Выполнить запрос GET через кэш.
+
+        :param url: URL
+        :type url: str
+        :param timeout: таймаут запроса, defaults to None
+        :type timeout: float, optional
+        :param allow_redirects: выполнять перенаправления, defaults to True
+        :type allow_redirects: bool, optional
+        :return: асинхронный контекстный менеджер, возвращающий ответ
+        :rtype: CachedRequest
+        """
+        return CachedRequest(self.fetch('GET', url, timeout, allow_redirects))
+
+    def head(self, url: str, timeout: float = None, allow_redirects: bool = False) -> CachedRequest:
+        """ Выполнить запрос HEAD через кэш.
+
+        :param url: URL
+        :type url: str
+        :param timeout: таймаут запроса, defaults to None
+        :type timeout: float, optional
+        :param allow_redirects: выполнять перенаправления, defaults to False (как в aiohttp)
+        :type allow_redirects: bool, optional
+        :return: асинхронный контекстный менеджер, возвращающий ответ
+        :rtype: CachedRequest
+        """
+        return CachedRequest(self.fetch('HEAD', url, timeout, allow_redirects))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,350 @@
+import multiprocessing
+import zlib
+from asyncio import Task, gather, get_event_loop, new_event_loop, set_event_loop, sleep
+from multiprocessing.queues import Queue
+from multiprocessing.sharedctypes import Synchronized
+from time import perf_counter
+from typing import Dict, List, Sequence, Set, TYPE_CHECKING
+from urllib.parse import urlparse
+
+from aiohttp import ClientSession, TCPConnector
+
+try:
+    from .extractors import Pipeline
+    from .resolver import CachingResolver
+    from .scope import Scope
+    from .throttle import Throttle
+    from .traps import TrapDetector
+    from .db import WORKERS
+    from .scrapper import Scrapper
+    from .storage import open_storage
+except ImportError:
+    from extractors import Pipeline
+    from resolver import CachingResolver
+    from scope import Scope
+    from throttle import Throttle
+    from traps import TrapDetector
+    from db import WORKERS
+    from scrapper import Scrapper
+    from storage import open_storage
+
+if TYPE_CHECKING:
+    try:
+        from .db import DB
+    except ImportError:
+        from db import DB
+
+
+SHARD_BY_HOST = 'host'  # шардирование по хосту: все страницы хоста обрабатываются одним процессом
+SHARD_BY_URL = 'url'    # шардирование по URL: страницы одного хоста распределяются между процессами
+POLL_TIME = 0.1         # период опроса счетчика незавершенных задач координатором
+
+
+def shard_of(url: str, shards: int, by: str = SHARD_BY_HOST) -> int:
+    """ Получить номер шарда (процесса-обработчика), которому принадлежит URL.
+
+    Используется crc32, а не hash, так как значение hash для строк отличается в разных процессах.
+
+    :param url: URL
+    :type url: str
+    :param shards: число шардов
+    :type shards: int
+    :param by: ключ шардирования (SHARD_BY_HOST или SHARD_BY_URL), defaults to SHARD_BY_HOST
+    :type by: str, optional
+    :return: номер шарда
+    :rtype: int
+
+    >>> shard_of('https://example.com/some/path', 1)
+    0
+    >>> shard_of('https://example.com/0', 4) == shard_of('https://example.com/1', 4)
+    True
+    """
+    key = urlparse(url).netloc if by == SHARD_BY_HOST else url
+    return zlib.crc32(key.encode()) % shards
+
+
+def merge_stat(total: dict, stat: dict):
+    """ Добавить статистику процесса-обработчика к общей статистике.
+
+    :param total: общая статистика
+    :type total: dict
+    :param stat: статистика процесса-обработчика
+    :type stat: dict
+
+    >>> total = {'done': 1}
+    >>> merge_stat(total, {'done': 2, 'wrong_content_type': {'image/png': 1}})
+    >>> total
+    {'done': 3, 'wrong_content_type': {'image/png': 1}}
+    """
+    for key, value in stat.items():
+        if isinstance(value, dict):
+            merge_stat(total.setdefault(key, {}), value)
+        else:
+            total[key] = total.get(key, 0) + value
+
+
+class ShardedScrapper(Scrapper):
+
+    _index: int             # номер шарда этого обработчика
+    _queues: List           # входящие очереди всех обработчиков
+    _pending: Synchronized       # общий счетчик незавершенных задач
+    _shard_by: str          # ключ шардирования
+    _routed_urls: set       # множество URL, переданных другим обработчикам
+
+    def __init__(self, url: str, session: ClientSession, db: 'DB', index: int, queues: List, pending: Synchronized,
+                 shard_by: str = SHARD_BY_HOST, scope: Scope = None, pipeline: Pipeline = None,
+                 traps: TrapDetector = None, throttle: Throttle = None, history: bool = False,
+                 versions: bool = False, resolver: CachingResolver = None, store_links: bool = False,
+                 priorities: Dict[str, float] = None):
+        """ Инициализация шардированного скраппера.
+
+        :param url: URL, с которого начинается обход. На основе этого URL будет получен базовый домен
+        :type url: str
+        :param session: сессия для формирования запросов
+        :type session: ClientSession
+        :param db: клиент для работы с БД
+        :type db: DB
+        :param index: номер шарда этого обработчика
+        :type index: int
+        :param queues: входящие очереди всех обработчиков (элементы очереди - кортежи из URL и глубины обхода)
+        :type queues: List
+        :param pending: общий счетчик незавершенных задач (multiprocessing.Value)
+        :type pending: Synchronized
+        :param shard_by: ключ шардирования, defaults to SHARD_BY_HOST
+        :type shard_by: str, optional
+        :param scope: область обхода, defaults to None (регистрируемый домен URL и его поддомены)
+        :type scope: Scope, optional
+        :param pipeline: извлекатели данных страниц, defaults to None
+        :type pipeline: Pipeline, optional
+        :param traps: детектор ловушек обходчика, defaults to None
+        :type traps: TrapDetector, optional
+        :param throttle: регулятор числа одновременных запросов, defaults to None
+        :type throttle: Throttle, optional
+        :param history: сохранять историю загрузок, defaults to False
+        :type history: bool, optional
+        :param versions: сохранять версии HTML страниц, defaults to False
+        :type versions: bool, optional
+        :param resolver: резолвер с кэшем и опережающим разрешением имен, defaults to None
+        :type resolver: CachingResolver, optional
+        :param store_links: сохранять граф ссылок, defaults to False
+        :type store_links: bool, optional
+        :param priorities: приоритеты URL (ссылки, найденные обработчиком, ставятся в очередь по убыванию приоритета),
+            defaults to None
+        :type priorities: Dict[str, float], optional
+        """
+        super().__init__(url, session, db, store_links=store_links, priorities=priorities, scope=scope,
+                         pipeline=pipeline, traps=traps, throttle=throttle, history=history, versions=versions,
+                         resolver=resolver)
+        self._index = index
+        self._queues = queues
+        self._pending = pending
+        self._shard_by = shard_by
+        self._routed_urls = set()
+
+    def print_message(self):
+        """ Несколько процессов не могут делить одну статусную строку, поэтому сообщение не выводится. """
+
+    def clear_message(self):
+        """ Несколько процессов не могут делить одну статусную строку, поэтому сообщение не выводится. """
+
+    def route(self, links: Set[str], depth: int) -> Set[str]:
+        """ Передать ссылки, принадлежащие другим шардам, их обработчикам.
+
+        Счетчик незавершенных задач увеличивается до отправки ссылки, поэтому он не может обнулиться, пока ссылка
+        находится в очереди.
+
+        :param links: множество новых ссылок
+        :type links: Set[str]
+        :param depth: уровень глубины обхода, с которым ссылки будут обработаны
+        :type depth: int
+        :return: множество ссылок для локальной обработки
+        :rtype: Set[str]
+        """
+        shards = len(self._queues)
+        local = set()
+        for link in links:
+            index = shard_of(link, shards, self._shard_by)
+            if index == self._index:
+                local.add(link)
+            elif link not in self._routed_urls:
+                self._routed_urls.add(link)
+                with self._pending.get_lock():
+                    self._pending.value += 1
+                self._queues[index].put((link, depth))
+        return local
+
+    async def scrape_routed(self, url: str, depth: int):
+        """ Обработать URL, полученный из входящей очереди, и отметить задачу выполненной.
+
+        :param url: URL
+        :type url: str
+        :param depth: уровень глубины обхода
+        :type depth: int
+        """
+        try:
+            await self.scrape(url, depth)
+        finally:
+            with self._pending.get_lock():
+                self._pending.value -= 1
+
+
+async def work(url: str, index: int, queues: List, pending: Synchronized, results: Queue, storage: str,
+               shard_by: str, scope: Scope, extractors: Sequence[str], traps: TrapDetector, throttle: bool,
+               history: bool, versions: bool, dns_cache: bool, links: bool, prioritize: bool):
+    """ Цикл процесса-обработчика: получать URL из входящей очереди до получения None. После завершения сводка
+    обработчика (Scrapper.summary) передается координатору.
+
+    :param url: URL начала обхода
+    :type url: str
+    :param index: номер шарда
+    :type index: int
+    :param queues: входящие очереди всех обработчиков
+    :type queues: List
+    :param pending: общий счетчик незавершенных задач
+    :type pending: Synchronized
+    :param results: очередь для передачи статистики координатору
+    :type results: Queue
+    :param storage: строка подключения к хранилищу
+    :type storage: str
+    :param shard_by: ключ шардирования
+    :type shard_by: str
+    :param scope: область обхода
+    :type scope: Scope
+    :param extractors: имена извлекателей данных страниц (None, если данные не извлекаются)
+    :type extractors: Sequence[str]
+    :param traps: детектор ловушек обходчика (None, если ловушки не отслеживаются)
+    :type traps: TrapDetector
+    :param throttle: регулировать число одновременных запросов
+    :type throttle: bool
+    :param history: сохранять историю загрузок
+    :type history: bool
+    :param versions: сохранять версии HTML страниц
+    :type versions: bool
+    :param dns_cache: разрешать имена хостов заранее и кэшировать результаты
+    :type dns_cache: bool
+    :param links: сохранять граф ссылок
+    :type links: bool
+    :param prioritize: ставить ссылки в очередь по убыванию PageRank (ранги читаются из хранилища)
+    :type prioritize: bool
+    """
+    loop = get_event_loop()
+    inbox = queues[index]
+    tasks = set()
+    resolver = CachingResolver() if dns_cache else None
+    connector = TCPConnector(resolver=resolver, use_dns_cache=False) if resolver else None
+    async with ClientSession(connector=connector) as session, open_storage(storage) as db:
+        pipeline = Pipeline(extractors) if extractors else None
+        priorities = await db.get_ranks(scope.base_domain) if prioritize else None
+        scrapper = ShardedScrapper(url, session, db, index, queues, pending, shard_by, scope, pipeline, traps,
+                                   Throttle() if throttle else None, history, versions, resolver, links, priorities)
+        while True:
+            item = await loop.run_in_executor(None, inbox.get)
+            if item is None:
+                break
+            task = Task(scrapper.scrape_routed(*item))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await gather(*tasks)
+        await scrapper.flush()
+    if resolver is not None:
+        await resolver.close()
+    results.put(scrapper.summary())
+
+
+def run_worker(*args):
+    """ Точка входа процесса-обработчика. Аргументы передаются в work. """
+    loop = new_event_loop()
+    set_event_loop(loop)
+    loop.run_until_complete(work(*args))
+    loop.close()
+
+
+async def run_cluster(url: str, depth: int, workers: int, storage: str, shard_by: str = SHARD_BY_HOST,
+                      scope: Scope = None, extractors: Sequence[str] = None, traps: TrapDetector = None,
+                      throttle: bool = False, history: bool = False, versions: bool = False,
+                      dns_cache: bool = False, links: bool = False, prioritize: bool = False) -> dict:
+    """ Обойти сайт несколькими процессами-обработчиками.
+
+    URL распределяются между процессами по хэшу хоста (или всего URL), поэтому каждый URL загружается только
+    процессом-владельцем, и повторных загрузок не происходит. Ссылки, найденные одним процессом, передаются
+    владельцу через очереди multiprocessing. Обход завершается, когда общий счетчик незавершенных задач обнуляется.
+
+    :param url: URL начала обхода
+    :type url: str
+    :param depth: глубина обхода
+    :type depth: int
+    :param workers: число процессов-обработчиков
+    :type workers: int
+    :param storage: строка подключения к хранилищу (все процессы пишут в него одновременно, поэтому хранилище должно
+        это допускать: PostgreSQL или SQLite)
+    :type storage: str
+    :param shard_by: ключ шардирования, defaults to SHARD_BY_HOST
+    :type shard_by: str, optional
+    :param scope: область обхода (передается процессам в виде правил и компилируется в каждом из них),
+        defaults to None (регистрируемый домен URL и его поддомены)
+    :type scope: Scope, optional
+    :param extractors: имена извлекателей данных страниц (каждый процесс создает свой набор), defaults to None
+    :type extractors: Sequence[str], optional
+    :param traps: детектор ловушек обходчика (каждый процесс получает свою копию и проверяет ссылки, найденные на
+        своих страницах), defaults to None
+    :type traps: TrapDetector, optional
+    :param throttle: регулировать число одновременных запросов (каждый процесс подстраивает свои лимиты, в
+        статистике лимиты процессов складываются), defaults to False
+    :type throttle: bool, optional
+    :param history: сохранять историю загрузок, defaults to False
+    :type history: bool, optional
+    :param versions: сохранять версии HTML страниц (страница загружается только своим процессом, поэтому цепочки
+        версий страницы не пересекаются), defaults to False
+    :type versions: bool, optional
+    :param dns_cache: разрешать имена хостов заранее и кэшировать результаты (у каждого процесса свой кэш),
+        defaults to False
+    :type dns_cache: bool, optional
+    :param links: сохранять граф ссылок, defaults to False
+    :type links: bool, optional
+    :param prioritize: ставить ссылки в очередь по убыванию PageRank (каждый процесс читает ранги из хранилища и
+        упорядочивает найденные им ссылки), defaults to False
+    :type prioritize: bool, optional
+    :return: сводка обхода в формате Scrapper.summary: суммы числа страниц и объема по процессам, длительность обхода
+        и суммарная статистика
+    :rtype: dict
+    :raises ValueError: если хранилище не допускает одновременной записи несколькими процессами (сегменты WARC)
+    """
+    if WORKERS not in open_storage(storage).FEATURES:
+        raise ValueError(f'storage {storage} does not support concurrent writes by several workers')
+    started = perf_counter()
+    context = multiprocessing.get_context('spawn')
+    queues = [context.Queue() for _ in range(workers)]
+    results = context.Queue()
+    pending = context.Value('i', 1)
+
+    url = Scrapper.doctor(url)
+    processes = [
+        context.Process(target=run_worker,
+                        args=(url, index, queues, pending, results, storage, shard_by, scope, extractors, traps,
+                              throttle, history, versions, dns_cache, links, prioritize),
+                        daemon=True)
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    queues[shard_of(url, workers, shard_by)].put((url, depth))
+    while pending.value > 0:
+        if not all(process.is_alive() for process in processes):
+            raise RuntimeError('worker process exited unexpectedly')
+        await sleep(POLL_TIME)
+
+    for queue in queues:
+        queue.put(None)
+
+    loop = get_event_loop()
+    summary = {'pages': 0, 'bytes': 0, 'seconds': 0.0, 'stopped': None, 'stat': {}}
+    for _ in processes:
+        worker = await loop.run_in_executor(None, results.get)
+        summary['pages'] += worker['pages']
+        summary['bytes'] += worker['bytes']
+        merge_stat(summary['stat'], worker['stat'])
+    for process in processes:
+        await loop.run_in_executor(None, process.join)
+    summary['seconds'] = round(perf_counter() - started, 3)
+    return summary
@@ -1,18 +1,621 @@
-from typing import List, Tuple, AsyncIterator, Union
+import json
+from abc import ABC, abstractmethod
+from asyncio import get_event_loop
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from time import perf_counter
+from typing import Dict, FrozenSet, List, NamedTuple, Sequence, Set, Tuple, AsyncIterator, Union, TYPE_CHECKING
+from urllib.parse import parse_qsl
 
 import asyncpg
 
+try:
+    from .delta import LATEST, PageVersion, encode, rebuild
+    from .revisit import FetchStats
+    from .urls import get_base_domain
+except ImportError:
+    from delta import LATEST, PageVersion, encode, rebuild
+    from revisit import FetchStats
+    from urls import get_base_domain
 
-class DB:
+if TYPE_CHECKING:
+    try:
+        from .metrics import Metrics
+    except ImportError:
+        from metrics import Metrics
 
-    _user: str                       # имя пользователя БД
-    _password: str                   # пароль пользователя БД
-    _database: str                   # имя БД
-    _host: str                       # хост БД
-    _port: int                       # порт БД
-    _pool: asyncpg.pool.Pool = None  # пул подключений БД
+# поля записи страницы, необязательные поля идут в конце
+RECORD_FIELDS = ('url', 'title', 'html', 'text', 'extracted', 'canonical', 'redirects')
+RAW_COLUMNS = ('html', 'text')                      # поля, которые iter_pages может вернуть байтами
+SEARCH = 'search'           # возможность хранилища: полнотекстовый поиск
+LINKS = 'links'             # возможность хранилища: граф ссылок и ранги страниц
+HISTORY = 'history'         # возможность хранилища: история загрузок
+VERSIONS = 'versions'       # возможность хранилища: версии страниц
+WORKERS = 'workers'         # возможность хранилища: одновременная запись несколькими процессами-обработчиками
 
-    def __init__(self, user: str, password: str, database: str, host: str = '127.0.0.1', port: int = 5432):
+
+def complete_record(record: tuple) -> tuple:
+    """ Дополнить запись страницы значениями None для отсутствующих необязательных полей.
+
+    :param record: запись
+    :type record: tuple
+    :return: запись со всеми полями RECORD_FIELDS
+    :rtype: tuple
+
+    >>> complete_record(('https://example.com', 'title', 'html'))
+    ('https://example.com', 'title', 'html', None, None, None, None)
+    """
+    return tuple(record) + (None,) * (len(RECORD_FIELDS) - len(record))
+
+
+def check_columns(columns: Sequence[str]) -> Tuple[str, ...]:
+    """ Проверить, что все столбцы являются полями записи страницы.
+
+    :param columns: столбцы
+    :type columns: Sequence[str]
+    :raises ValueError: если список пуст или содержит неизвестный столбец
+    :return: столбцы
+    :rtype: Tuple[str, ...]
+
+    >>> check_columns(['url', 'html'])
+    ('url', 'html')
+    >>> check_columns(['url', 'tsv'])
+    Traceback (most recent call last):
+    ...
+    ValueError: unknown columns: tsv
+    """
+    unknown = [column for column in columns if column not in RECORD_FIELDS]
+    if unknown or not columns:
+        raise ValueError(f'unknown columns: {", ".join(unknown)}')
+    return tuple(columns)
+
+
+TABLE = 'scrapped_data'                              # таблица страниц
+# столбцы таблицы страниц (кроме столбцов ключа секционирования base_domain и crawled_on)
+COLUMNS = 'url TEXT, title TEXT, html TEXT, text TEXT, extracted JSONB, canonical TEXT, redirects JSONB, tsv TSVECTOR'
+INTERVALS = ('day', 'week', 'month')                # периоды секций по дате обхода
+# таблица страниц первой версии схемы
+FIRST_TABLE = f'CREATE TABLE IF NOT EXISTS {TABLE} (url TEXT PRIMARY KEY, title TEXT, html TEXT)'
+# столбцы таблицы страниц, добавленные после первой версии схемы, и их типы
+ADDED_COLUMNS = (('text', 'TEXT'), ('tsv', 'TSVECTOR'), ('extracted', 'JSONB'), ('canonical', 'TEXT'),
+                 ('redirects', 'JSONB'))
+# таблицы и индексы, которых может не быть в БД, созданных прежними версиями: имя и запрос создания
+RELATIONS = (
+    (f'{TABLE}_tsv_idx', f'CREATE INDEX IF NOT EXISTS {TABLE}_tsv_idx ON {TABLE} USING GIN (tsv)'),
+    ('links', 'CREATE TABLE IF NOT EXISTS links (src TEXT, dst TEXT, PRIMARY KEY (src, dst))'),
+    ('page_rank',
+     'CREATE TABLE IF NOT EXISTS page_rank (url TEXT PRIMARY KEY, rank DOUBLE PRECISION, inlinks INTEGER)'),
+    ('fetch_history',
+     'CREATE TABLE IF NOT EXISTS fetch_history (url TEXT, fetched_at TIMESTAMPTZ, hash TEXT, changed BOOLEAN)'),
+    ('fetch_history_url_idx', 'CREATE INDEX IF NOT EXISTS fetch_history_url_idx ON fetch_history (url, fetched_at)'),
+    ('page_versions',
+     'CREATE TABLE IF NOT EXISTS page_versions (url TEXT, version INTEGER, fetched_at TIMESTAMPTZ, keyframe BOOLEAN, '
+     'size INTEGER, data BYTEA, PRIMARY KEY (url, version))'),
+)
+
+
+def period_start(day: date, interval: str) -> date:
+    """ Получить начало периода секции, в который попадает дата.
+
+    :param day: дата
+    :type day: date
+    :param interval: период: day, week (с понедельника) или month
+    :type interval: str
+    :return: первый день периода
+    :rtype: date
+
+    >>> period_start(date(2026, 10, 15), 'day'), period_start(date(2026, 10, 15), 'week')
+    (datetime.date(2026, 10, 15), datetime.date(2026, 10, 12))
+    >>> period_start(date(2026, 10, 15), 'month')
+    datetime.date(2026, 10, 1)
+    """
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def period_end(start: date, interval: str) -> date:
+    """ Получить начало следующего периода (верхнюю границу секции, не входящую в нее).
+
+    :param start: первый день периода
+    :type start: date
+    :param interval: период: day, week или month
+    :type interval: str
+    :return: первый день следующего периода
+    :rtype: date
+
+    >>> period_end(date(2026, 12, 1), 'month'), period_end(date(2026, 10, 12), 'week')
+    (datetime.date(2027, 1, 1), datetime.date(2026, 10, 19))
+    """
+    if interval == 'week':
+        return start + timedelta(days=7)
+    if interval == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+class Partitioning(NamedTuple):
+    """ Схема секционирования таблицы страниц. Хранится в комментарии к таблице в виде JSON. """
+
+    interval: str = None            # период секций по дате обхода crawled_on (None - без секционирования по дате)
+    domain_partitions: int = 0      # число секций по хэшу базового домена base_domain (0 - без секционирования)
+
+    @property
+    def keys(self) -> Tuple[str, ...]:
+        """ Столбцы первичного ключа: первичный ключ секционированной таблицы включает ключи секционирования.
+
+        >>> Partitioning('month', 16).keys, Partitioning(domain_partitions=4).keys
+        (('url', 'crawled_on', 'base_domain'), ('url', 'base_domain'))
+        """
+        keys = ('url',)
+        if self.interval:
+            keys += ('crawled_on',)
+        if self.domain_partitions:
+            keys += ('base_domain',)
+        return keys
+
+    def table_ddl(self) -> List[str]:
+        """ Получить запросы создания секционированной таблицы страниц (и секций по домену, если таблица не
+        секционируется по дате: секции периодов создаются по мере записи страниц).
+
+        :return: запросы
+        :rtype: List[str]
+
+        >>> for query in Partitioning(domain_partitions=2).table_ddl():
+        ...     print(query)
+        CREATE TABLE scrapped_data (url TEXT, title TEXT, html TEXT, text TEXT, extracted JSONB, canonical TEXT, \
+redirects JSONB, tsv TSVECTOR, base_domain TEXT, crawled_on DATE, PRIMARY KEY (url, base_domain)) \
+PARTITION BY HASH (base_domain)
+        CREATE INDEX scrapped_data_tsv_idx ON scrapped_data USING GIN (tsv)
+        COMMENT ON TABLE scrapped_data IS '{"interval": null, "domain_partitions": 2}'
+        CREATE TABLE scrapped_data_h00 PARTITION OF scrapped_data FOR VALUES WITH (MODULUS 2, REMAINDER 0)
+        CREATE TABLE scrapped_data_h01 PARTITION OF scrapped_data FOR VALUES WITH (MODULUS 2, REMAINDER 1)
+        """
+        strategy = 'RANGE (crawled_on)' if self.interval else 'HASH (base_domain)'
+        queries = [
+            f'CREATE TABLE {TABLE} ({COLUMNS}, base_domain TEXT, crawled_on DATE, '
+            f'PRIMARY KEY ({", ".join(self.keys)})) PARTITION BY {strategy}',
+            f'CREATE INDEX {TABLE}_tsv_idx ON {TABLE} USING GIN (tsv)',
+            f"COMMENT ON TABLE {TABLE} IS '{json.dumps(self._asdict())}'",
+        ]
+        if not self.interval:
+            queries += self.hash_ddl(TABLE)
+        return queries
+
+    def hash_ddl(self, parent: str, if_not_exists: str = '') -> List[str]:
+        """ Получить запросы создания секций по хэшу базового домена.
+
+        :param parent: секционируемая таблица
+        :type parent: str
+        :param if_not_exists: 'IF NOT EXISTS ' для секций, создаваемых при записи, defaults to ''
+        :type if_not_exists: str, optional
+        :return: запросы
+        :rtype: List[str]
+        """
+        return [
+            f'CREATE TABLE {if_not_exists}{parent}_h{remainder:02d} PARTITION OF {parent} '
+            f'FOR VALUES WITH (MODULUS {self.domain_partitions}, REMAINDER {remainder})'
+            for remainder in range(self.domain_partitions)
+        ]
+
+    def period_ddl(self, start: date) -> List[str]:
+        """ Получить запросы создания секции периода (и ее секций по домену).
+
+        :param start: первый день периода
+        :type start: date
+        :return: запросы
+        :rtype: List[str]
+
+        >>> for query in Partitioning('month').period_ddl(date(2026, 10, 1)):
+        ...     print(query)
+        CREATE TABLE IF NOT EXISTS scrapped_data_p20261001 PARTITION OF scrapped_data \
+FOR VALUES FROM ('2026-10-01') TO ('2026-11-01')
+        """
+        name = self.period_name(start)
+        query = (f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} '
+                 f"FOR VALUES FROM ('{start}') TO ('{period_end(start, self.interval)}')")
+        if not self.domain_partitions:
+            return [query]
+        return [query + ' PARTITION BY HASH (base_domain)'] + self.hash_ddl(name, 'IF NOT EXISTS ')
+
+    @staticmethod
+    def period_name(start: date) -> str:
+        """ Получить имя секции периода.
+
+        :param start: первый день периода
+        :type start: date
+        :return: имя таблицы секции
+        :rtype: str
+        """
+        return f'{TABLE}_p{start:%Y%m%d}'
+
+    @staticmethod
+    def parse_period(name: str) -> Union[date, None]:
+        """ Получить первый день периода по имени секции.
+
+        :param name: имя таблицы секции
+        :type name: str
+        :return: первый день периода или None, если это не секция периода
+        :rtype: Union[date, None]
+
+        >>> Partitioning.parse_period('scrapped_data_p20261001'), Partitioning.parse_period('scrapped_data_h03')
+        (datetime.date(2026, 10, 1), None)
+        """
+        prefix = f'{TABLE}_p'
+        if not name.startswith(prefix):
+            return None
+        return datetime.strptime(name[len(prefix):], '%Y%m%d').date()
+
+
+class PartitionInfo(NamedTuple):
+    """ Сведения о секции таблицы страниц. """
+
+    name: str               # имя таблицы секции
+    start: date             # первый день периода (None для секций по домену)
+    end: date               # первый день следующего периода (None для секций по домену)
+    rows: int               # оценка числа строк по статистике планировщика
+    size: int               # размер секции с индексами и вложенными секциями в байтах
+
+
+class PoolOptions(NamedTuple):
+    """ Параметры пула подключений PostgreSQL. """
+
+    min_size: int = 2                   # число подключений, открываемых при создании пула
+    max_size: int = 10                  # максимальное число подключений: остальные открываются по мере нужды
+    max_queries: int = 50000            # число запросов, после которого подключение заменяется новым
+    max_idle: float = 300.0             # время в секундах, после которого неиспользуемое подключение закрывается
+    statement_cache_size: int = 100    # размер кэша подготовленных запросов каждого подключения
+    pgbouncer: bool = False             # режим для pgbouncer в режиме пулинга транзакций
+
+    @classmethod
+    def from_query(cls, query: str) -> 'PoolOptions':
+        """ Получить параметры из строки запроса строки подключения (postgresql://...?max_size=20&pgbouncer=true).
+
+        :param query: строка запроса
+        :type query: str
+        :raises ValueError: если параметр неизвестен или его значение некорректно
+        :return: параметры (незаданные - по умолчанию)
+        :rtype: PoolOptions
+
+        >>> options = PoolOptions.from_query('max_size=20&max_idle=60&pgbouncer=true')
+        >>> options.min_size, options.max_size, options.max_idle, options.pgbouncer
+        (2, 20, 60.0, True)
+        >>> PoolOptions.from_query('pool=1')
+        Traceback (most recent call last):
+        ...
+        ValueError: unknown storage options: pool
+        """
+        options = dict(parse_qsl(query))
+        unknown = [name for name in options if name not in cls._fields]
+        if unknown:
+            raise ValueError(f'unknown storage options: {", ".join(unknown)}')
+        values = {}
+        for name, value in options.items():
+            kind = cls.__annotations__[name]
+            values[name] = value.lower() in ('1', 'true', 'yes') if kind is bool else kind(value)
+        return cls(**values)
+
+
+class PartitionManager:
+    """ Управление секционированием таблицы страниц PostgreSQL.
+
+    Таблица секционируется декларативно: по дате обхода crawled_on (секция на день, неделю или месяц) и/или по хэшу
+    базового домена base_domain. Строки направляет в секции сам PostgreSQL по значениям ключей, секции периодов
+    создаются при первой записи в период. Срок хранения соблюдается удалением секций прошедших периодов целиком, без
+    построчного удаления, поэтому ни VACUUM, ни раздувание индексов не растут с возрастом данных.
+    """
+
+    LOCK_KEY = 0x73706964       # ключ рекомендательной блокировки, под которой создаются таблица и секции
+
+    scheme: Partitioning                # схема секционирования (None, если таблица не секционирована)
+    _pool: asyncpg.pool.Pool            # пул подключений БД
+    _periods: Set[date]                 # первые дни периодов, секции которых уже созданы
+
+    def __init__(self, pool: asyncpg.pool.Pool):
+        """ Инициализация.
+
+        :param pool: пул подключений БД
+        :type pool: asyncpg.pool.Pool
+        """
+        self.scheme = None
+        self._pool = pool
+        self._periods = set()
+
+    async def load(self) -> Union[Partitioning, None]:
+        """ Прочитать схему секционирования из комментария к таблице страниц.
+
+        :return: схема или None, если таблица не секционирована
+        :rtype: Union[Partitioning, None]
+        """
+        query = "SELECT obj_description(to_regclass($1), 'pg_class')"
+        async with self._pool.acquire() as conn:
+            comment = await conn.fetchval(query, TABLE)
+        self.scheme = Partitioning(**json.loads(comment)) if comment else None
+        return self.scheme
+
+    async def create(self, scheme: Partitioning):
+        """ Создать секционированную таблицу страниц. Пустая несекционированная таблица (например, созданная
+        init_db.sh) заменяется.
+
+        :param scheme: схема секционирования
+        :type scheme: Partitioning
+        :raises ValueError: если схема не задает секционирования или таблица уже содержит страницы
+        """
+        if scheme.interval not in (None,) + INTERVALS or scheme.domain_partitions < 0:
+            raise ValueError(f'unknown interval: {scheme.interval}')
+        if not scheme.interval and not scheme.domain_partitions:
+            raise ValueError('partitioning requires an interval or domain partitions')
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute('SELECT pg_advisory_xact_lock($1)', self.LOCK_KEY)
+                if await conn.fetchval('SELECT to_regclass($1) IS NOT NULL', TABLE):
+                    if await conn.fetchval(f'SELECT EXISTS (SELECT 1 FROM {TABLE})'):
+                        raise ValueError(f'{TABLE} is not empty')
+                    await conn.execute(f'DROP TABLE {TABLE}')
+                for query in scheme.table_ddl():
+                    await conn.execute(query)
+        self.scheme = scheme
+        self._periods = set()
+        if scheme.interval:
+            await self.ensure(datetime.now(timezone.utc).date())
+
+    async def ensure(self, day: date):
+        """ Создать секцию периода, в который попадает дата, если ее еще нет.
+
+        Созданные секции запоминаются, поэтому запрос к БД выполняется один раз на период в каждом процессе.
+
+        :param day: дата
+        :type day: date
+        """
+        start = period_start(day, self.scheme.interval)
+        if start in self._periods:
+            return
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute('SELECT pg_advisory_xact_lock($1)', self.LOCK_KEY)
+                for query in self.scheme.period_ddl(start):
+                    await conn.execute(query)
+        self._periods.add(start)
+
+    async def list_partitions(self) -> List[PartitionInfo]:
+        """ Получить секции таблицы страниц (верхнего уровня).
+
+        :return: секции по имени
+        :rtype: List[PartitionInfo]
+        """
+        query = """
+        SELECT c.relname,
+        (SELECT coalesce(sum(greatest(l.reltuples, 0)), 0)::bigint
+         FROM pg_partition_tree(c.oid) AS t JOIN pg_class AS l ON l.oid = t.relid
+         WHERE t.isleaf),
+        (SELECT coalesce(sum(pg_total_relation_size(t.relid)), 0)::bigint FROM pg_partition_tree(c.oid) AS t)
+        FROM pg_inherits AS i
+        JOIN pg_class AS c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass($1)
+        ORDER BY c.relname
+        """
+        async with self._pool.acquire() as conn:
+            records = await conn.fetch(query, TABLE)
+        partitions = []
+        for name, rows, size in records:
+            start = Partitioning.parse_period(name)
+            end = period_end(start, self.scheme.interval) if start is not None else None
+            partitions.append(PartitionInfo(name, start, end, rows, size))
+        return partitions
+
+    async def drop_before(self, cutoff: date) -> List[str]:
+        """ Удалить секции периодов, закончившихся не позже даты: страницы, не загружавшиеся повторно с этой даты.
+
+        :param cutoff: дата, с которой страницы хранятся
+        :type cutoff: date
+        :return: имена удаленных секций
+        :rtype: List[str]
+        """
+        dropped = []
+        for partition in await self.list_partitions():
+            if partition.end is not None and partition.end <= cutoff:
+                async with self._pool.acquire() as conn:
+                    await conn.execute(f'DROP TABLE {partition.name}')
+                self._periods.discard(partition.start)
+                dropped.append(partition.name)
+        return dropped
+
+
+class Storage(ABC):
+    """ Интерфейс хранилища страниц. Реализации: DB (PostgreSQL), SQLiteDB и SegmentDB (модуль storage).
+
+    Необязательные методы (поиск, граф ссылок, история загрузок, версии страниц) по умолчанию выбрасывают
+    NotImplementedError; реализованные возможности перечислены в FEATURES, чтобы команды проверяли их до начала работы.
+    """
+
+    FEATURES: FrozenSet[str] = frozenset()     # возможности хранилища: SEARCH, LINKS, HISTORY, VERSIONS, WORKERS
+
+    @abstractmethod
+    async def connect(self):
+        """ Открыть хранилище. """
+
+    @abstractmethod
+    async def close(self):
+        """ Закрыть хранилище. """
+
+    async def __aenter__(self):
+        """ При входе в контекстный менеджер открыть хранилище. """
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        """ При выходе из контекстного менеджера закрыть хранилище. """
+        await self.close()
+
+    @abstractmethod
+    def get_records(self, base_domain: str, limit: int = 50, offset: int = 0) -> AsyncIterator:
+        """ Получить записи (URL и заголовок), URL которых содержит базовый домен.
+
+        :param base_domain: базовый URL.
+        :type base_domain: str
+        :param limit: ограничение числа записей, defaults to 50
+        :type limit: int, optional
+        :param offset: смещение, defaults to 0
+        :type offset: int, optional
+        """
+
+    @abstractmethod
+    async def add_records(self, data: List[Tuple[str, str, str]]):
+        """ Добавить записи.
+
+        :param data: список кортежей, первый элемент в которых - URl, второй - заголовок, а третий - контент
+        (следующие элементы - необязательные поля RECORD_FIELDS)
+        :type data: List[Tuple[str, str, str]]
+        """
+
+    def search(self, base_domain: str, query: str, limit: int = 10, offset: int = 0) -> AsyncIterator:
+        """ Найти страницы по тексту.
+
+        :param base_domain: базовый URL.
+        :type base_domain: str
+        :param query: поисковый запрос
+        :type query: str
+        :param limit: ограничение числа записей, defaults to 10
+        :type limit: int, optional
+        :param offset: смещение, defaults to 0
+        :type offset: int, optional
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support full-text search')
+
+    def iter_pages(self, base_domain: str = '', columns: Sequence[str] = ('url', 'html'), raw: bool = False,
+                   batch_size: int = 500) -> AsyncIterator:
+        """ Последовательно прочитать страницы, URL которых содержит базовый домен.
+
+        :param base_domain: базовый URL, defaults to '' (все страницы)
+        :type base_domain: str, optional
+        :param columns: читаемые поля RECORD_FIELDS, defaults to ('url', 'html')
+        :type columns: Sequence[str], optional
+        :param raw: возвращать контент и текст байтами UTF-8 без декодирования, defaults to False
+        :type raw: bool, optional
+        :param batch_size: число записей, читаемых за одно обращение к хранилищу, defaults to 500
+        :type batch_size: int, optional
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support page streaming')
+
+    async def add_links(self, edges: List[Tuple[str, str]]):
+        """ Добавить ребра графа ссылок. Прежние исходящие ссылки страниц из edges заменяются новыми.
+
+        :param edges: список кортежей (URL страницы, URL ссылки)
+        :type edges: List[Tuple[str, str]]
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support link graph')
+
+    def get_links(self, base_domain: str) -> AsyncIterator:
+        """ Получить ребра графа ссылок (URL страницы, URL ссылки) страниц, URL которых содержит базовый домен.
+
+        :param base_domain: базовый URL.
+        :type base_domain: str
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support link graph')
+
+    async def get_ranks(self, base_domain: str) -> Dict[str, float]:
+        """ Получить ранги страниц, URL которых содержит базовый домен.
+
+        :param base_domain: базовый URL.
+        :type base_domain: str
+        :return: ранги по URL
+        :rtype: Dict[str, float]
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support link graph')
+
+    async def set_ranks(self, ranks: Dict[str, float], inlinks: Dict[str, int]):
+        """ Сохранить ранги страниц и число входящих ссылок.
+
+        :param ranks: ранги по URL
+        :type ranks: Dict[str, float]
+        :param inlinks: число входящих ссылок по URL
+        :type inlinks: Dict[str, int]
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support link graph')
+
+    async def add_fetches(self, fetches: List[Tuple[str, float, str]]):
+        """ Добавить загрузки страниц в историю. Признак изменения определяется сравнением хэша с хэшем предыдущей
+        загрузки страницы (для первой загрузки он не определен).
+
+        :param fetches: список кортежей (URL, время загрузки (Unix time), хэш контента)
+        :type fetches: List[Tuple[str, float, str]]
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support fetch history')
+
+    async def get_fetch_stats(self, base_domain: str) -> Dict[str, FetchStats]:
+        """ Получить сводки истории загрузок страниц, URL которых содержит базовый домен.
+
+        :param base_domain: базовый URL.
+        :type base_domain: str
+        :return: сводки по URL
+        :rtype: Dict[str, FetchStats]
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support fetch history')
+
+    async def add_versions(self, pages: List[Tuple[str, float, str]]):
+        """ Добавить версии страниц в историю версий. Версия, совпадающая с последней версией страницы, не
+        добавляется; новая версия хранится дельтой относительно предыдущей или полностью (модуль delta).
+
+        :param pages: список кортежей (URL, время загрузки (Unix time), HTML)
+        :type pages: List[Tuple[str, float, str]]
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support page versions')
+
+    async def get_versions(self, url: str) -> List[PageVersion]:
+        """ Получить сведения о версиях страницы.
+
+        :param url: URL страницы
+        :type url: str
+        :return: версии по возрастанию номера
+        :rtype: List[PageVersion]
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support page versions')
+
+    async def get_version(self, url: str, version: int = LATEST) -> Union[str, None]:
+        """ Получить HTML версии страницы.
+
+        :param url: URL страницы
+        :type url: str
+        :param version: номер версии, defaults to LATEST (последняя версия)
+        :type version: int, optional
+        :return: HTML или None, если такой версии нет
+        :rtype: Union[str, None]
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support page versions')
+
+
+class DB(Storage):
+
+    FEATURES = frozenset((SEARCH, LINKS, HISTORY, VERSIONS, WORKERS))
+
+    TEXT_SEARCH_CONFIG = 'simple'   # конфигурация полнотекстового поиска (simple не зависит от языка страниц)
+
+    # цепочка версии: версии страницы от последней ключевой версии, не новее заданной, до заданной
+    VERSION_CHAIN_QUERY = """
+    SELECT version, keyframe, data
+    FROM page_versions
+    WHERE url = $1 AND version <= $2 AND version >= coalesce((
+        SELECT max(version)
+        FROM page_versions
+        WHERE url = $1 AND keyframe AND version <= $2
+    ), 0)
+    ORDER BY version
+    """
+
+    _user: str                           # имя пользователя БД
+    _password: str                       # пароль пользователя БД
+    _database: str                       # имя БД
+    _host: str                           # хост БД
+    _port: int                           # порт БД
+    _options: PoolOptions                # параметры пула подключений
+    _pool: asyncpg.pool.Pool = None      # пул подключений БД
+    partitions: PartitionManager = None  # управление секционированием таблицы страниц
+    metrics: 'Metrics'                   # реестр метрик (None, если метрики не собираются)
+
+    def __init__(self, user: str, password: str, database: str, host: str = '127.0.0.1', port: int = 5432,
+                 options: PoolOptions = None, metrics: 'Metrics' = None):
         """ Инициализация клиента.
 
         :param user: имя пользователя БД
@@ -25,50 +628,146 @@ class DB:
         :type host: str, optional
         :param port: порт БД, defaults to 5432
         :type port: int, optional
+        :param options: параметры пула подключений, defaults to None (PoolOptions по умолчанию)
+        :type options: PoolOptions, optional
+        :param metrics: реестр метрик, в который записываются время ожидания подключения, время операций и число
+            подключений, defaults to None
+        :type metrics: Metrics, optional
         """
         self._user = user
         self._password = password
         self._database = database
         self._host = host
         self._port = port
+        self._options = options or PoolOptions()
+        self.metrics = metrics
+
+    @staticmethod
+    async def init_connection(conn: asyncpg.Connection):
+        """ Настроить подключение пула: значения jsonb передаются и возвращаются объектами Python.
+
+        :param conn: подключение
+        :type conn: asyncpg.Connection
+        """
+        await conn.set_type_codec('jsonb', encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+    @staticmethod
+    async def keep_session(conn: asyncpg.Connection):
+        """ Не сбрасывать состояние сессии при возврате подключения в пул (режим pgbouncer: сессия сервера не
+        принадлежит подключению, а запрос сброса - лишнее обращение к БД).
+
+        :param conn: подключение
+        :type conn: asyncpg.Connection
+        """
 
     async def connect(self):
         """ Подключиться к БД и сформировать пул подключений.
+
+        Пул открывает min_size подключений и добавляет новые по мере нужды до max_size, неиспользуемые дольше
+        max_idle секунд подключения закрываются. Запросы подготавливаются один раз на подключение и берутся из его
+        кэша (statement_cache_size) по тексту запроса, поэтому тексты запросов не меняются от вызова к вызову. В
+        режиме pgbouncer кэш отключается: при пулинге транзакций подготовленный запрос может оказаться в сессии
+        другого сервера.
         """
         if self._pool is not None:
             return
+        options = self._options
         self._pool = await asyncpg.create_pool(
             user=self._user,
             password=self._password,
             database=self._database,
             host=self._host,
             port=self._port,
-            min_size=2,
-            max_size=5
+            min_size=options.min_size,
+            max_size=options.max_size,
+            max_queries=options.max_queries,
+            max_inactive_connection_lifetime=options.max_idle,
+            statement_cache_size=0 if options.pgbouncer else options.statement_cache_size,
+            init=self.init_connection,
+            reset=self.keep_session if options.pgbouncer else None
         )
+        await self.migrate()
+        self.partitions = PartitionManager(self._pool)
+        await self.partitions.load()
+
+    async def migrate(self):
+        """ Дополнить схему БД, созданной прежними версиями: создать таблицу страниц, если ее нет, добавить
+        недостающие столбцы (ADDED_COLUMNS), таблицы и индексы (RELATIONS).
+
+        Схема дополняется под рекомендательной блокировкой (процессы обходчика подключаются одновременно). Запросы
+        выполняются только для отсутствующих столбцов и отношений, поэтому подключение к актуальной БД не берет
+        блокировок таблиц.
+        """
+        query = 'SELECT attname FROM pg_attribute WHERE attrelid = to_regclass($1) AND attnum > 0 AND NOT attisdropped'
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute('SELECT pg_advisory_xact_lock($1)', PartitionManager.LOCK_KEY)
+                columns = {row['attname'] for row in await conn.fetch(query, TABLE)}
+                if not columns:
+                    await conn.execute(FIRST_TABLE)
+                for column, column_type in ADDED_COLUMNS:
+                    if column not in columns:
+                        await conn.execute(f'ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS {column} {column_type}')
+                for name, ddl in RELATIONS:
+                    if not await conn.fetchval('SELECT to_regclass($1) IS NOT NULL', name):
+                        await conn.execute(ddl)
 
     async def close(self):
         """ Отключиться от БД и забыть пул подключений. """
         await self._pool.close()
         self._pool = None
 
-    async def __aenter__(self):
-        """ При входе в контекстный менеджер подключиться к БД и сформировать пул подключений.
+    @asynccontextmanager
+    async def acquire(self, operation: str) -> AsyncIterator[asyncpg.Connection]:
+        """ Получить подключение из пула на время операции.
+
+        Если метрики собираются, то учитываются время ожидания подключения (spider_db_acquire_seconds), время
+        операции (spider_db_query_seconds; для потокового чтения - вместе с обработкой записей) и число занятых и
+        свободных подключений пула.
 
-        :return: [description]
-        :rtype: [type]
+        :param operation: имя операции для метрик
+        :type operation: str
+        :yield: подключение
+        :rtype: Iterator[asyncpg.Connection]
         """
-        await self.connect()
-        return self
+        started = perf_counter()
+        async with self._pool.acquire() as conn:
+            acquired = perf_counter()
+            if self.metrics is not None:
+                self.metrics.observe('spider_db_acquire_seconds', acquired - started)
+                idle = self._pool.get_idle_size()
+                self.metrics.set('spider_db_connections', self._pool.get_size() - idle, state='busy')
+                self.metrics.set('spider_db_connections', idle, state='idle')
+            try:
+                yield conn
+            finally:
+                if self.metrics is not None:
+                    self.metrics.observe('spider_db_query_seconds', perf_counter() - acquired, operation=operation)
 
-    async def __aexit__(self, exc_type, exc, tb):
-        """ При выходе из контекстного менеджера отключиться от БД и забыть пул подключений. """
-        await self.close()
+    def domain_filter(self, base_domain: str, index: int) -> Tuple[str, tuple]:
+        """ Получить условие на столбец base_domain, по которому PostgreSQL читает только секцию домена.
+
+        Условие добавляется, если таблица секционирована по домену: тогда отбираются страницы регистрируемого домена
+        base_domain, URL которых содержат base_domain.
+
+        :param base_domain: базовый URL (хост, возможно с путем)
+        :type base_domain: str
+        :param index: номер параметра запроса для значения
+        :type index: int
+        :return: условие (пустое, если оно не нужно) и значение параметра
+        :rtype: Tuple[str, tuple]
+        """
+        scheme = self.partitions.scheme
+        domain = get_base_domain(f'//{base_domain}') if base_domain else ''
+        if scheme is None or not scheme.domain_partitions or not domain:
+            return '', ()
+        return f'AND base_domain = ${index}', (domain,)
 
     async def get_records(self, base_domain: str, limit: int = 50, offset: int = 0) -> AsyncIterator[asyncpg.Record]:
         """ Получить записи из БД.
 
         Из БД будут извлечены записи, такие, что базовый домен является подстрокой значения поля url записей.
+        Для таблицы, секционированной по домену, читается только секция регистрируемого домена.
 
         :param base_domain: базовый URL.
         :type base_domain: str
@@ -79,14 +778,15 @@ class DB:
         :yield: asyncpg.Record
         :rtype: Iterator[asyncpg.Record]
         """
-        query = """
+        condition, args = self.domain_filter(base_domain, 2)
+        query = f"""
         SELECT url, title
         FROM scrapped_data
-        WHERE url LIKE $1
+        WHERE url LIKE $1 {condition}
         """
-        async with self._pool.acquire() as conn:
+        async with self.acquire('get_records') as conn:
             async with conn.transaction():
-                cursor = await conn.cursor(query, f'%{base_domain}%')
+                cursor = await conn.cursor(query, f'%{base_domain}%', *args)
                 if offset:
                     await cursor.forward(offset)
                 for _ in range(limit):
@@ -99,20 +799,295 @@ class DB:
     async def add_records(self, data: List[Tuple[str, str, str]]):
         """ Добавить записи в БД.
 
+        Вместе с записью обновляется поисковый вектор tsv: слова заголовка имеют больший вес, чем слова текста.
+
+        Если таблица секционирована, то у записи заполняются базовый домен и дата обхода, по которым PostgreSQL
+        выбирает секцию. Страница хранится в одной строке: при повторной загрузке в другой день прежняя строка
+        удаляется в той же транзакции, и страница переходит в секцию текущего периода.
+
         :param data: список кортежей, первый элемент в которых - URl, второй - заголовок, а третий - контент
+        (следующие, необязательные - видимый текст страницы, извлеченные данные, канонический URL и список URL
+        перенаправлений; извлеченные данные и перенаправления хранятся в полях jsonb)
         :type data: List[Tuple[str, str, str]]
         """
-        query = """
+        scheme = self.partitions.scheme
+        columns, values = (', base_domain, crawled_on', ', $8, $9') if scheme is not None else ('', '')
+        query = f"""
         INSERT INTO scrapped_data
-        (url, title, html)
+        (url, title, html, text, extracted, canonical, redirects, tsv{columns})
+        VALUES (
+            $1, $2, $3, $4, $5, $6, $7,
+            setweight(to_tsvector('{self.TEXT_SEARCH_CONFIG}', coalesce($2, '')), 'A') ||
+            setweight(to_tsvector('{self.TEXT_SEARCH_CONFIG}', coalesce($4, '')), 'B'){values}
+        )
+        ON CONFLICT ({', '.join(scheme.keys) if scheme is not None else 'url'})
+        DO UPDATE SET
+        title = $2,
+        html = $3,
+        text = $4,
+        extracted = $5,
+        canonical = $6,
+        redirects = $7,
+        tsv = excluded.tsv
+        """
+        records = [complete_record(record) for record in data]
+        if scheme is None:
+            async with self.acquire('add_records') as conn:
+                await conn.executemany(query, records)
+            return
+
+        today = datetime.now(timezone.utc).date()
+        records = [record + (get_base_domain(record[0]), today) for record in records]
+        if scheme.interval:
+            await self.partitions.ensure(today)
+        async with self.acquire('add_records') as conn:
+            async with conn.transaction():
+                if scheme.interval:
+                    await conn.execute('DELETE FROM scrapped_data WHERE url = ANY($1::text[]) AND crawled_on < $2',
+                                       [record[0] for record in records], today)
+                await conn.executemany(query, records)
+
+    async def search(self, base_domain: str, query: str, limit: int = 10,
+                     offset: int = 0) -> AsyncIterator[asyncpg.Record]:
+        """ Найти страницы по тексту.
+
+        Используется GIN-индекс по полю tsv. Запрос разбирается websearch_to_tsquery (поддерживаются кавычки, or и
+        минус). Записи упорядочены по убыванию релевантности, фрагмент текста с найденными словами строится только для
+        страниц текущей выборки.
+
+        :param base_domain: базовый URL.
+        :type base_domain: str
+        :param query: поисковый запрос
+        :type query: str
+        :param limit: ограничение числа записей, defaults to 10
+        :type limit: int, optional
+        :param offset: смещение, defaults to 0
+        :type offset: int, optional
+        :yield: asyncpg.Record с полями url, title, rank и snippet
+        :rtype: Iterator[asyncpg.Record]
+        """
+        condition, args = self.domain_filter(base_domain, 5)
+        sql = f"""
+        SELECT url, title, rank,
+        ts_headline('{self.TEXT_SEARCH_CONFIG}', coalesce(text, ''), q, 'StartSel=[, StopSel=], MaxWords=30') AS snippet
+        FROM (
+            SELECT url, title, text, q, ts_rank_cd(tsv, q) AS rank
+            FROM scrapped_data, websearch_to_tsquery('{self.TEXT_SEARCH_CONFIG}', $2) AS q
+            WHERE tsv @@ q AND url LIKE $1 {condition}
+            ORDER BY rank DESC
+            LIMIT $3 OFFSET $4
+        ) AS hits
+        ORDER BY rank DESC
+        """
+        async with self.acquire('search') as conn:
+            for record in await conn.fetch(sql, f'%{base_domain}%', query, limit, offset, *args):
+                yield record
+
+    async def iter_pages(self, base_domain: str = '', columns: Sequence[str] = ('url', 'html'), raw: bool = False,
+                         batch_size: int = 500) -> AsyncIterator[asyncpg.Record]:
+        """ Последовательно прочитать страницы из БД.
+
+        Записи читаются серверным курсором пакетами по batch_size, поэтому память клиента не зависит от числа страниц.
+        Читаются только запрошенные столбцы. С raw=True контент и текст передаются как bytea (convert_to) и
+        возвращаются байтами без декодирования в строки.
+
+        :param base_domain: базовый URL, defaults to '' (все страницы)
+        :type base_domain: str, optional
+        :param columns: читаемые поля RECORD_FIELDS, defaults to ('url', 'html')
+        :type columns: Sequence[str], optional
+        :param raw: возвращать контент и текст байтами UTF-8, defaults to False
+        :type raw: bool, optional
+        :param batch_size: число записей в пакете курсора, defaults to 500
+        :type batch_size: int, optional
+        :raises ValueError: если запрошен неизвестный столбец
+        :yield: asyncpg.Record со столбцами columns в том же порядке
+        :rtype: Iterator[asyncpg.Record]
+        """
+        columns = check_columns(columns)
+        selected = ', '.join(
+            f"convert_to({column}, 'UTF8') AS {column}" if raw and column in RAW_COLUMNS else column
+            for column in columns
+        )
+        condition, args = self.domain_filter(base_domain, 2)
+        query = f"""
+        SELECT {selected}
+        FROM scrapped_data
+        WHERE url LIKE $1 {condition}
+        """
+        async with self.acquire('iter_pages') as conn:
+            async with conn.transaction():
+                async for record in conn.cursor(query, f'%{base_domain}%', *args, prefetch=batch_size):
+                    yield record
+
+    async def add_links(self, edges: List[Tuple[str, str]]):
+        """ Добавить ребра графа ссылок.
+
+        Прежние исходящие ссылки страниц удаляются, новые записываются через COPY одной транзакцией.
+
+        :param edges: список кортежей (URL страницы, URL ссылки)
+        :type edges: List[Tuple[str, str]]
+        """
+        edges = list(dict.fromkeys(edges))
+        sources = list({src for src, _ in edges})
+        async with self.acquire('add_links') as conn:
+            async with conn.transaction():
+                await conn.execute('DELETE FROM links WHERE src = ANY($1::text[])', sources)
+                await conn.copy_records_to_table('links', records=edges, columns=('src', 'dst'))
+
+    async def get_links(self, base_domain: str) -> AsyncIterator[asyncpg.Record]:
+        """ Получить ребра графа ссылок страниц, URL которых содержит базовый домен.
+
+        Ребра читаются курсором, поэтому граф не загружается в память целиком на стороне клиента БД.
+
+        :param base_domain: базовый URL.
+        :type base_domain: str
+        :yield: asyncpg.Record с полями src и dst
+        :rtype: Iterator[asyncpg.Record]
+        """
+        query = """
+        SELECT src, dst
+        FROM links
+        WHERE src LIKE $1
+        """
+        async with self.acquire('get_links') as conn:
+            async with conn.transaction():
+                async for record in conn.cursor(query, f'%{base_domain}%'):
+                    yield record
+
+    async def get_ranks(self, base_domain: str) -> Dict[str, float]:
+        """ Получить ранги страниц, URL которых содержит базовый домен.
+
+        :param base_domain: базовый URL.
+        :type base_domain: str
+        :return: ранги по URL
+        :rtype: Dict[str, float]
+        """
+        query = """
+        SELECT url, rank
+        FROM page_rank
+        WHERE url LIKE $1
+        """
+        async with self.acquire('get_ranks') as conn:
+            return {url: rank for url, rank in await conn.fetch(query, f'%{base_domain}%')}
+
+    async def set_ranks(self, ranks: Dict[str, float], inlinks: Dict[str, int]):
+        """ Сохранить ранги страниц и число входящих ссылок.
+
+        :param ranks: ранги по URL
+        :type ranks: Dict[str, float]
+        :param inlinks: число входящих ссылок по URL
+        :type inlinks: Dict[str, int]
+        """
+        query = """
+        INSERT INTO page_rank
+        (url, rank, inlinks)
         VALUES ($1, $2, $3)
         ON CONFLICT (url)
         DO UPDATE SET
-        title = $2,
-        html = $3
+        rank = $2,
+        inlinks = $3
         """
-        async with self._pool.acquire() as conn:
-            await conn.executemany(query, data)
+        async with self.acquire('set_ranks') as conn:
+            await conn.executemany(query, [(url, rank, inlinks.get(url, 0)) for url, rank in ranks.items()])
+
+    async def add_fetches(self, fetches: List[Tuple[str, float, str]]):
+        """ Добавить загрузки страниц в историю.
+
+        Признак изменения вычисляется в запросе по хэшу последней загрузки страницы (индекс по url и fetched_at).
+
+        :param fetches: список кортежей (URL, время загрузки (Unix time), хэш контента)
+        :type fetches: List[Tuple[str, float, str]]
+        """
+        query = """
+        INSERT INTO fetch_history
+        (url, fetched_at, hash, changed)
+        VALUES ($1, to_timestamp($2), $3, (
+            SELECT hash <> $3
+            FROM fetch_history
+            WHERE url = $1
+            ORDER BY fetched_at DESC
+            LIMIT 1
+        ))
+        """
+        async with self.acquire('add_fetches') as conn:
+            await conn.executemany(query, fetches)
+
+    async def get_fetch_stats(self, base_domain: str) -> Dict[str, FetchStats]:
+        """ Получить сводки истории загрузок страниц, URL которых содержит базовый домен.
+
+        :param base_domain: базовый URL.
+        :type base_domain: str
+        :return: сводки по URL
+        :rtype: Dict[str, FetchStats]
+        """
+        query = """
+        SELECT url, count(*), count(*) FILTER (WHERE changed),
+        extract(epoch FROM min(fetched_at))::float8, extract(epoch FROM max(fetched_at))::float8
+        FROM fetch_history
+        WHERE url LIKE $1
+        GROUP BY url
+        """
+        async with self.acquire('get_fetch_stats') as conn:
+            return {url: FetchStats(*stats) for url, *stats in await conn.fetch(query, f'%{base_domain}%')}
+
+    async def add_versions(self, pages: List[Tuple[str, float, str]]):
+        """ Добавить версии страниц в историю версий.
+
+        Для вычисления дельты последняя версия страницы восстанавливается по цепочке от последней ключевой версии
+        (не длиннее KEYFRAME_INTERVAL). Дельта вычисляется в пуле потоков, чтобы сравнение больших версий не
+        останавливало цикл событий. Страница обрабатывается в отдельной транзакции.
+
+        :param pages: список кортежей (URL, время загрузки (Unix time), HTML)
+        :type pages: List[Tuple[str, float, str]]
+        """
+        query = """
+        INSERT INTO page_versions
+        (url, version, fetched_at, keyframe, size, data)
+        VALUES ($1, $2, to_timestamp($3), $4, $5, $6)
+        """
+        async with self.acquire('add_versions') as conn:
+            for url, fetched_at, html in pages:
+                async with conn.transaction():
+                    chain = await conn.fetch(self.VERSION_CHAIN_QUERY, url, LATEST)
+                    previous = rebuild((record['keyframe'], record['data']) for record in chain)
+                    if previous == html:
+                        continue
+                    keyframe, data = await get_event_loop().run_in_executor(None, encode, previous, html, len(chain))
+                    version = chain[-1]['version'] + 1 if chain else 1
+                    await conn.execute(query, url, version, fetched_at, keyframe, len(html), data)
+
+    async def get_versions(self, url: str) -> List[PageVersion]:
+        """ Получить сведения о версиях страницы.
+
+        :param url: URL страницы
+        :type url: str
+        :return: версии по возрастанию номера
+        :rtype: List[PageVersion]
+        """
+        query = """
+        SELECT version, extract(epoch FROM fetched_at)::float8, keyframe, size, length(data)
+        FROM page_versions
+        WHERE url = $1
+        ORDER BY version
+        """
+        async with self.acquire('get_versions') as conn:
+            return [PageVersion(*record) for record in await conn.fetch(query, url)]
+
+    async def get_version(self, url: str, version: int = LATEST) -> Union[str, None]:
+        """ Получить HTML версии страницы: применить дельты цепочки к ее ключевой версии.
+
+        :param url: URL страницы
+        :type url: str
+        :param version: номер версии, defaults to LATEST (последняя версия)
+        :type version: int, optional
+        :return: HTML или None, если такой версии нет
+        :rtype: Union[str, None]
+        """
+        async with self.acquire('get_version') as conn:
+            chain = await conn.fetch(self.VERSION_CHAIN_QUERY, url, version)
+        if not chain or version != LATEST and chain[-1]['version'] != version:
+            return None
+        return rebuild((record['keyframe'], record['data']) for record in chain)
 
     async def execute(self, query: str, *args) -> Union[List[asyncpg.Record], None]:
         """ Выполнить запрос.
@@ -122,5 +1097,10 @@ class DB:
         :return: результат запроса
         :rtype: Union[List[asyncpg.Record], None]
         """
-        async with self._pool.acquire() as conn:
+        async with self.acquire('execute') as conn:
             return await conn.fetch(query, *args)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
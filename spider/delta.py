@@ -0,0 +1,183 @@
+import json
+import re
+import zlib
+from difflib import SequenceMatcher
+from time import perf_counter
+from typing import Iterable, List, NamedTuple, Tuple, Union
+
+KEYFRAME_INTERVAL = 16      # не больше стольких версий подряд хранятся дельтами, затем сохраняется полная версия
+LATEST = 2 ** 31 - 1        # номер версии, означающий последнюю версию страницы
+TOKEN_END = re.compile(r'(?<=[>\n])')   # границы фрагментов: после конца тэга и конца строки
+MAX_TOKENS = 20000          # для версий с большим числом фрагментов дельта не строится, сохраняется полная версия
+DIFF_TIMEOUT = 1.0          # время построения дельты в секундах, после которого сохраняется полная версия
+
+
+class PageVersion(NamedTuple):
+    """ Сведения о сохраненной версии страницы. """
+
+    version: int            # номер версии (начиная с 1)
+    fetched_at: float       # время загрузки (Unix time)
+    keyframe: bool          # версия хранится полностью, а не дельтой
+    size: int               # размер HTML версии в символах
+    stored: int             # размер хранимых данных в байтах
+
+
+def tokenize(text: str) -> List[str]:
+    """ Разбить HTML на фрагменты, которыми оперирует дельта.
+
+    :param text: HTML
+    :type text: str
+    :return: фрагменты, объединение которых дает исходный текст
+    :rtype: List[str]
+
+    >>> tokenize('<p>a</p>\\nb')
+    ['<p>', 'a</p>', '\\n', 'b']
+    """
+    return [token for token in TOKEN_END.split(text) if token]
+
+
+class DiffTimeout(Exception):
+    """ Время построения дельты истекло. """
+
+
+class DeadlineMatcher(SequenceMatcher):
+    """ Сравнение последовательностей, прерываемое по истечении времени.
+
+    Поиск совпадений SequenceMatcher в худшем случае квадратичен (например, если почти все фрагменты версии
+    изменились), поэтому время проверяется перед поиском каждого следующего совпадающего блока.
+    """
+
+    _deadline: float        # момент, после которого сравнение прерывается (perf_counter)
+
+    def __init__(self, a: List[str], b: List[str], timeout: float):
+        """ Инициализация сравнения. Фрагменты, встречающиеся чаще 1% раз, не используются как опорные (autojunk).
+
+        :param a: фрагменты базовой версии
+        :type a: List[str]
+        :param b: фрагменты новой версии
+        :type b: List[str]
+        :param timeout: время сравнения в секундах
+        :type timeout: float
+        """
+        self._deadline = perf_counter() + timeout
+        super().__init__(None, a, b)
+
+    def find_longest_match(self, *args, **kwargs):
+        if perf_counter() > self._deadline:
+            raise DiffTimeout
+        return super().find_longest_match(*args, **kwargs)
+
+
+def diff(base: str, text: str, timeout: float = DIFF_TIMEOUT) -> Union[bytes, None]:
+    """ Получить дельту текста относительно базовой версии.
+
+    Дельта - сжатый zlib список JSON, элементы которого - пары [начало, число фрагментов], копируемые из базовой
+    версии, и строки, вставляемые как есть.
+
+    :param base: базовая версия
+    :type base: str
+    :param text: новая версия
+    :type text: str
+    :param timeout: время построения дельты в секундах, defaults to DIFF_TIMEOUT
+    :type timeout: float, optional
+    :return: дельта или None, если в версиях больше MAX_TOKENS фрагментов или время истекло
+    :rtype: Union[bytes, None]
+
+    >>> base = '<html><body><p>one</p><p>two</p></body></html>'
+    >>> delta = diff(base, base.replace('two', '2'))
+    >>> json.loads(zlib.decompress(delta))
+    [[0, 5], '2</p>', [6, 2]]
+    >>> diff(base, base, timeout=0) is None
+    True
+    """
+    base_tokens, tokens = tokenize(base), tokenize(text)
+    if max(len(base_tokens), len(tokens)) > MAX_TOKENS:
+        return None
+    ops = []
+    try:
+        opcodes = DeadlineMatcher(base_tokens, tokens, timeout).get_opcodes()
+    except DiffTimeout:
+        return None
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            ops.append([i1, i2 - i1])
+        elif j2 > j1:
+            ops.append(''.join(tokens[j1:j2]))
+    return zlib.compress(json.dumps(ops, ensure_ascii=False, separators=(',', ':')).encode())
+
+
+def patch(base: str, delta: bytes) -> str:
+    """ Восстановить версию по базовой версии и дельте.
+
+    :param base: базовая версия
+    :type base: str
+    :param delta: дельта (результат diff)
+    :type delta: bytes
+    :return: версия
+    :rtype: str
+
+    >>> base = '<p>one</p>\\n<p>two</p>'
+    >>> patch(base, diff(base, '<p>zero</p>\\n<p>one</p>\\n'))
+    '<p>zero</p>\\n<p>one</p>\\n'
+    """
+    base_tokens = tokenize(base)
+    return ''.join(
+        op if isinstance(op, str) else ''.join(base_tokens[op[0]:op[0] + op[1]])
+        for op in json.loads(zlib.decompress(delta))
+    )
+
+
+def encode(previous: Union[str, None], text: str, since_keyframe: int) -> Tuple[bool, bytes]:
+    """ Подготовить новую версию к хранению: дельтой относительно предыдущей версии или полностью (ключевой версией).
+
+    Ключевая версия сохраняется для первой версии страницы, после KEYFRAME_INTERVAL версий подряд, хранимых
+    дельтами (так длина цепочки, которую нужно применить при чтении, ограничена), если дельта не меньше сжатого
+    текста и если дельту не удалось построить (слишком большая версия или истекло время сравнения). Вызов может занять
+    до DIFF_TIMEOUT секунд, поэтому хранилища выполняют его в пуле потоков.
+
+    :param previous: предыдущая версия (None, если ее нет)
+    :type previous: Union[str, None]
+    :param text: новая версия
+    :type text: str
+    :param since_keyframe: число версий, начиная с последней ключевой
+    :type since_keyframe: int
+    :return: признак ключевой версии и хранимые данные
+    :rtype: Tuple[bool, bytes]
+
+    >>> page = ''.join(f'<li>item {i}</li>\\n' for i in range(100))
+    >>> [encode(previous, page + '<li>new</li>', since_keyframe)[0]
+    ...  for previous, since_keyframe in ((None, 0), (page, 1), (page, KEYFRAME_INTERVAL), ('', 1))]
+    [True, False, True, True]
+    """
+    full = zlib.compress(text.encode())
+    if previous is None or since_keyframe >= KEYFRAME_INTERVAL:
+        return True, full
+    delta = diff(previous, text)
+    if delta is None or len(delta) >= len(full):
+        return True, full
+    return False, delta
+
+
+def rebuild(chain: Iterable[Tuple[bool, bytes]]) -> Union[str, None]:
+    """ Восстановить версию по цепочке от ключевой версии до нее.
+
+    :param chain: пары (признак ключевой версии, данные) по возрастанию номера версии
+    :type chain: Iterable[Tuple[bool, bytes]]
+    :return: версия (None, если цепочка пуста)
+    :rtype: Union[str, None]
+
+    >>> page = ''.join(f'<li>item {i}</li>\\n' for i in range(100))
+    >>> versions = [page, page + '<li>a</li>', page.replace('item 5<', 'five<') + '<li>a</li>']
+    >>> chain = [encode(previous, text, i) for i, (previous, text) in enumerate(zip([None] + versions, versions))]
+    >>> [keyframe for keyframe, _ in chain], rebuild(chain) == versions[-1], rebuild([])
+    ([True, False, False], True, None)
+    """
+    text = None
+    for keyframe, data in chain:
+        text = zlib.decompress(data).decode() if keyframe else patch(text, data)
+    return text
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
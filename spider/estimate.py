@@ -0,0 +1,224 @@
+from math import sqrt
+from random import Random
+from statistics import mean, stdev
+from typing import List, NamedTuple, Sequence
+
+Z = 1.96            # квантиль нормального распределения для 95% доверительного интервала
+CONFIDENCE = 0.95   # уровень доверия бутстреп-интервалов
+ROUNDS = 200        # число бутстреп-выборок
+SAMPLE = 100        # число страниц выборки одного уровня обхода
+
+
+class Interval(NamedTuple):
+    """ Оценка с доверительным интервалом. """
+
+    value: float            # точечная оценка
+    low: float              # нижняя граница интервала
+    high: float             # верхняя граница интервала
+
+
+class LevelSample(NamedTuple):
+    """ Выборка страниц одного уровня обхода. """
+
+    discovered: int                 # число найденных URL уровня (из них выбирались страницы выборки)
+    sampled: int                    # число загруженных страниц выборки
+    sources: List[List[int]]        # новые URL следующего уровня: номера страниц выборки, ссылающихся на каждый URL
+
+
+class SiteSample(NamedTuple):
+    """ Результат выборочного обхода сайта. """
+
+    levels: List[LevelSample]       # выборки уровней обхода, начиная с начальной страницы
+    sizes: List[int]                # размеры тел ответов загруженных HTML-страниц в байтах
+    non_html: int                   # число ответов с Content-Type, отличным от text/html
+    responses: int                  # число полученных ответов (HTML и не HTML)
+
+
+class SiteEstimate(NamedTuple):
+    """ Оценка размера сайта. """
+
+    levels: List[Interval]          # число страниц по уровням обхода
+    total: Interval                 # общее число страниц
+    page_size: Interval             # средний размер HTML-страницы в байтах
+    non_html: Interval              # доля URL, ответ по которым - не HTML
+
+
+def wilson(successes: int, trials: int, z: float = Z) -> Interval:
+    """ Оценить долю с интервалом Уилсона (в отличие от нормального приближения, интервал не выходит за [0, 1] и не
+    вырождается при доле 0 или 1).
+
+    :param successes: число успехов
+    :type successes: int
+    :param trials: число испытаний
+    :type trials: int
+    :param z: квантиль нормального распределения, defaults to Z
+    :type z: float, optional
+    :return: доля с интервалом (без испытаний - 0 с интервалом [0, 1])
+    :rtype: Interval
+
+    >>> [round(value, 3) for value in wilson(5, 100)]
+    [0.05, 0.022, 0.112]
+    >>> wilson(0, 0)
+    Interval(value=0.0, low=0.0, high=1.0)
+    """
+    if not trials:
+        return Interval(0.0, 0.0, 1.0)
+    share = successes / trials
+    denominator = 1 + z * z / trials
+    center = (share + z * z / (2 * trials)) / denominator
+    margin = z * sqrt(share * (1 - share) / trials + z * z / (4 * trials * trials)) / denominator
+    return Interval(share, max(center - margin, 0.0), min(center + margin, 1.0))
+
+
+def mean_interval(values: Sequence[float], z: float = Z) -> Interval:
+    """ Оценить среднее с доверительным интервалом в нормальном приближении.
+
+    :param values: значения
+    :type values: Sequence[float]
+    :param z: квантиль нормального распределения, defaults to Z
+    :type z: float, optional
+    :return: среднее с интервалом (для одного значения интервал вырожден, без значений - нули)
+    :rtype: Interval
+
+    >>> [round(value, 2) for value in mean_interval([10, 20, 30, 40])]
+    [25, 12.35, 37.65]
+    >>> mean_interval([])
+    Interval(value=0.0, low=0.0, high=0.0)
+    """
+    if not values:
+        return Interval(0.0, 0.0, 0.0)
+    value = mean(values)
+    margin = z * stdev(values) / sqrt(len(values)) if len(values) > 1 else 0.0
+    return Interval(value, max(value - margin, 0.0), value + margin)
+
+
+def next_level(parents: float, sampled: int, sources: List[List[int]], weights: Sequence[int] = None) -> float:
+    """ Оценить число URL следующего уровня обхода по ссылкам страниц выборки уровня.
+
+    Ссылка, найденная на нескольких страницах выборки (меню, подвал), скорее всего есть и на остальных страницах
+    уровня и считается один раз. Ссылка, найденная на одной странице, скорее всего есть только на ней, поэтому такие
+    ссылки масштабируются на весь уровень: умножаются на parents / sampled. Если уровень загружен целиком, оценка
+    равна числу найденных ссылок.
+
+    :param parents: оценка числа URL уровня
+    :type parents: float
+    :param sampled: число страниц выборки уровня
+    :type sampled: int
+    :param sources: для каждого нового URL - номера страниц выборки, ссылающихся на него
+    :type sources: List[List[int]]
+    :param weights: кратности страниц выборки в бутстреп-выборке, defaults to None (каждая страница один раз)
+    :type weights: Sequence[int], optional
+    :return: оценка числа URL следующего уровня
+    :rtype: float
+
+    >>> next_level(10, 2, [[0], [1], [0, 1]])     # две уникальные ссылки на пяти страницах каждая и общая ссылка
+    11.0
+    >>> next_level(10, 2, [[0], [1], [0, 1]], [2, 0])  # страница 0 выбрана дважды, страница 1 не выбрана
+    20.0
+    """
+    if not sampled:
+        return 0.0
+    scale = parents / sampled
+    size = 0.0
+    for pages in sources:
+        if weights is not None:
+            pages = [page for page in pages if weights[page]]
+        if len(pages) > 1:
+            size += 1
+        elif pages:
+            size += scale * (1 if weights is None else weights[pages[0]])
+    return size
+
+
+def level_sizes(levels: List[LevelSample], weights: List[Sequence[int]] = None) -> List[float]:
+    """ Оценить число URL каждого уровня обхода.
+
+    :param levels: выборки уровней обхода
+    :type levels: List[LevelSample]
+    :param weights: кратности страниц выборок уровней в бутстреп-выборке, defaults to None
+    :type weights: List[Sequence[int]], optional
+    :return: оценки числа URL уровней
+    :rtype: List[float]
+
+    >>> level_sizes([LevelSample(1, 1, [[0]] * 10), LevelSample(10, 2, [[0], [1], [0, 1]]), LevelSample(12, 2, [])])
+    [1.0, 10.0, 11.0]
+    """
+    sizes = [float(levels[0].discovered)] if levels else []
+    for index, level in enumerate(levels[:-1]):
+        sizes.append(next_level(sizes[-1], level.sampled, level.sources, None if weights is None else weights[index]))
+    return sizes
+
+
+def resample(size: int, rng: Random) -> List[int]:
+    """ Получить кратности элементов в бутстреп-выборке (выборке с возвращением того же размера).
+
+    :param size: размер выборки
+    :type size: int
+    :param rng: генератор случайных чисел
+    :type rng: Random
+    :return: кратности элементов (их сумма равна size)
+    :rtype: List[int]
+
+    >>> sum(resample(10, Random(0)))
+    10
+    """
+    weights = [0] * size
+    for _ in range(size):
+        weights[rng.randrange(size)] += 1
+    return weights
+
+
+def bounds(values: List[float], confidence: float = CONFIDENCE) -> tuple:
+    """ Получить перцентильный интервал значений.
+
+    :param values: значения (например, оценки по бутстреп-выборкам)
+    :type values: List[float]
+    :param confidence: уровень доверия, defaults to CONFIDENCE
+    :type confidence: float, optional
+    :return: нижняя и верхняя границы
+    :rtype: tuple
+
+    >>> bounds(list(range(101)))
+    (2, 98)
+    """
+    values = sorted(values)
+    tail = int((1 - confidence) / 2 * (len(values) - 1))
+    return values[tail], values[len(values) - 1 - tail]
+
+
+def estimate(site: SiteSample, rounds: int = ROUNDS, rng: Random = None) -> SiteEstimate:
+    """ Оценить размер сайта по выборочному обходу.
+
+    Интервалы числа страниц - перцентильные бутстреп-интервалы: страницы выборки каждого уровня выбираются с
+    возвращением, и оценки уровней пересчитываются, поэтому погрешность уровня переходит на следующие уровни.
+    Интервал среднего размера страницы - в нормальном приближении, доли не HTML - интервал Уилсона.
+
+    :param site: результат выборочного обхода
+    :type site: SiteSample
+    :param rounds: число бутстреп-выборок, defaults to ROUNDS
+    :type rounds: int, optional
+    :param rng: генератор случайных чисел, defaults to None (Random с начальным значением 0)
+    :type rng: Random, optional
+    :return: оценка числа страниц по уровням и всего, среднего размера страницы и доли не HTML
+    :rtype: SiteEstimate
+
+    >>> levels = [LevelSample(1, 1, [[0]] * 3), LevelSample(3, 3, [])]
+    >>> result = estimate(SiteSample(levels, [1000] * 4, 0, 4))
+    >>> result.levels
+    [Interval(value=1.0, low=1.0, high=1.0), Interval(value=3.0, low=3.0, high=3.0)]
+    >>> result.total, result.non_html.value
+    (Interval(value=4.0, low=4.0, high=4.0), 0.0)
+    """
+    rng = rng or Random(0)
+    point = level_sizes(site.levels)
+    replicates = [level_sizes(site.levels, [resample(level.sampled, rng) for level in site.levels])
+                  for _ in range(rounds)]
+    levels = [Interval(value, *bounds([replicate[index] for replicate in replicates]))
+              for index, value in enumerate(point)]
+    total = Interval(sum(point), *bounds([sum(replicate) for replicate in replicates]))
+    return SiteEstimate(levels, total, mean_interval(site.sizes), wilson(site.non_html, site.responses))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
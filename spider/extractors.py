@@ -0,0 +1,183 @@
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Union
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+INVISIBLE_TAGS = {'script', 'style', 'noscript', 'template'}    # тэги, текст которых не отображается
+EXTRACTORS: Dict[str, Callable[[BeautifulSoup, str], Any]] = {}   # зарегистрированные извлекатели по именам
+
+
+def extractor(name: str) -> Callable:
+    """ Декоратор, регистрирующий извлекатель данных страницы.
+
+    Извлекатель получает разобранную страницу и ее URL и возвращает значение, сериализуемое в JSON, или None, если
+    данных на странице нет.
+
+    :param name: имя извлекателя (ключ в словаре извлеченных данных)
+    :type name: str
+    :return: декоратор
+    :rtype: Callable
+    """
+    def register(func: Callable[[BeautifulSoup, str], Any]) -> Callable[[BeautifulSoup, str], Any]:
+        EXTRACTORS[name] = func
+        return func
+    return register
+
+
+def visible_text(element: Tag) -> str:
+    """ Получить видимый текст элемента (без скриптов, стилей и комментариев).
+
+    :param element: элемент
+    :type element: Tag
+    :return: текст, фрагменты которого разделены пробелами
+    :rtype: str
+
+    >>> visible_text(BeautifulSoup('<p>Hello,</p><script>x()</script><!-- c --><b> world </b>', 'lxml'))
+    'Hello, world'
+    """
+    strings = (
+        string.strip() for string in element.find_all(string=True)
+        if type(string) is NavigableString and string.parent.name not in INVISIBLE_TAGS
+    )
+    return ' '.join(string for string in strings if string)
+
+
+def meta_content(soup: BeautifulSoup, **attrs) -> Union[str, None]:
+    """ Получить значение content первого тэга <meta> с заданными атрибутами.
+
+    :param soup: разобранная страница
+    :type soup: BeautifulSoup
+    :return: значение без пробелов по краям или None
+    :rtype: Union[str, None]
+    """
+    tag = (soup.head or soup).find('meta', attrs=attrs)
+    content = tag.get('content') if tag is not None else None
+    return content.strip() if content else None
+
+
+@extractor('description')
+def description(soup: BeautifulSoup, url: str) -> Union[str, None]:
+    """ Описание страницы из <meta name="description">.
+
+    >>> description(BeautifulSoup('<meta name="description" content=" About ">', 'lxml'), 'https://example.com')
+    'About'
+    """
+    return meta_content(soup, name='description')
+
+
+@extractor('canonical')
+def canonical(soup: BeautifulSoup, url: str) -> Union[str, None]:
+    """ Канонический URL страницы из <link rel="canonical"> (абсолютный).
+
+    >>> canonical(BeautifulSoup('<link rel="canonical" href="/a">', 'lxml'), 'https://example.com/a?ref=1')
+    'https://example.com/a'
+    """
+    tag = (soup.head or soup).find('link', rel='canonical', href=True)
+    return urljoin(url, tag['href'].strip()) if tag is not None else None
+
+
+@extractor('language')
+def language(soup: BeautifulSoup, url: str) -> Union[str, None]:
+    """ Язык страницы из атрибута lang тэга <html> или <meta http-equiv="content-language">.
+
+    >>> language(BeautifulSoup('<html lang="ru-RU"><p>текст</p></html>', 'lxml'), 'https://example.com')
+    'ru-RU'
+    """
+    html = soup.find('html')
+    lang = html.get('lang') if html is not None else None
+    if lang and lang.strip():
+        return lang.strip()
+    return meta_content(soup, **{'http-equiv': 'content-language'})
+
+
+@extractor('opengraph')
+def opengraph(soup: BeautifulSoup, url: str) -> Union[Dict[str, str], None]:
+    """ Свойства OpenGraph из тэгов <meta property="og:...">; повторяющееся свойство берется первым.
+
+    >>> opengraph(BeautifulSoup('<meta property="og:title" content="T"><meta property="og:type" content="article">',
+    ...                         'lxml'), 'https://example.com')
+    {'title': 'T', 'type': 'article'}
+    """
+    properties = {}
+    for tag in (soup.head or soup).find_all('meta', property=True, content=True):
+        name = tag['property']
+        if name.startswith('og:'):
+            properties.setdefault(name[3:], tag['content'].strip())
+    return properties or None
+
+
+@extractor('main_text')
+def main_text(soup: BeautifulSoup, url: str) -> Union[str, None]:
+    """ Основной текст страницы: видимый текст <main>, <article> или элемента с role="main" (без навигации и
+    колонтитулов сайта). Если таких элементов нет, возвращается None: весь текст страницы уже хранится в поле text.
+
+    >>> main_text(BeautifulSoup('<nav>menu</nav><article><h1>T</h1><p>body</p></article>', 'lxml'), 'https://e.com')
+    'T body'
+    """
+    element = soup.find('main') or soup.find('article') or soup.find(attrs={'role': 'main'})
+    return (visible_text(element) or None) if element is not None else None
+
+
+class Pipeline:
+    """ Набор извлекателей, выполняемых над уже разобранной страницей.
+
+    Страница разбирается один раз (в Scrapper.scrape), все извлекатели работают с одним деревом. Результаты
+    записываются в хранилище вместе с записью страницы тем же пакетом add_records.
+    """
+
+    _extractors: List[Tuple[str, Callable[[BeautifulSoup, str], Any]]]  # извлекатели в порядке выполнения
+
+    def __init__(self, names: Sequence[str] = None):
+        """ Инициализация набора извлекателей.
+
+        :param names: имена зарегистрированных извлекателей, defaults to None (все зарегистрированные)
+        :type names: Sequence[str], optional
+        :raises ValueError: если извлекатель с таким именем не зарегистрирован
+        """
+        names = list(EXTRACTORS) if names is None else list(dict.fromkeys(names))
+        unknown = [name for name in names if name not in EXTRACTORS]
+        if unknown:
+            raise ValueError(f'unknown extractors: {", ".join(unknown)}')
+        self._extractors = [(name, EXTRACTORS[name]) for name in names]
+
+    @property
+    def names(self) -> List[str]:
+        """ Имена извлекателей в порядке выполнения. """
+        return [name for name, _ in self._extractors]
+
+    def run(self, soup: BeautifulSoup, url: str, stat: dict = None) -> Dict[str, Any]:
+        """ Выполнить извлекатели над страницей.
+
+        Ошибка одного извлекателя не мешает остальным: она учитывается в статистике (ключ extract_error, по именам
+        извлекателей), значение в результат не попадает.
+
+        :param soup: разобранная страница
+        :type soup: BeautifulSoup
+        :param url: URL страницы
+        :type url: str
+        :param stat: словарь статистики, defaults to None
+        :type stat: dict, optional
+        :return: извлеченные данные по именам извлекателей (значения None не включаются)
+        :rtype: Dict[str, Any]
+
+        >>> html = '<html lang="en"><head><meta name="description" content="d"></head><body>x</body></html>'
+        >>> Pipeline(['description', 'language', 'main_text']).run(BeautifulSoup(html, 'lxml'), 'https://e.com')
+        {'description': 'd', 'language': 'en'}
+        """
+        extracted = {}
+        for name, func in self._extractors:
+            try:
+                value = func(soup, url)
+            except Exception:
+                if stat is not None:
+                    errors = stat.setdefault('extract_error', {})
+                    errors[name] = errors.get(name, 0) + 1
+                continue
+            if value is not None:
+                extracted[name] = value
+        return extracted
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,542 @@
+import heapq
+import mmap
+import os
+import shutil
+import struct
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+from tempfile import mkdtemp
+from typing import Iterable, Iterator, List, Tuple, Union
+
+PRIORITY = struct.Struct('<d')      # приоритет записи сегмента (только в очереди с приоритетами)
+
+Entry = Tuple[float, int, str, int]     # запись очереди: (-приоритет, порядковый номер, URL, глубина)
+
+
+def fingerprint(url: str) -> int:
+    """ Получить 64-битный отпечаток URL.
+
+    :param url: URL
+    :type url: str
+    :return: отпечаток
+    :rtype: int
+
+    >>> fingerprint('https://example.com') == fingerprint('https://example.com') != fingerprint('https://example.org')
+    True
+    """
+    return int.from_bytes(blake2b(url.encode(), digest_size=8).digest(), 'little')
+
+
+def write_varint(buffer: bytearray, value: int):
+    """ Дописать неотрицательное целое в формате varint (по 7 бит в байте, младшие группы первыми).
+
+    :param buffer: буфер
+    :type buffer: bytearray
+    :param value: значение
+    :type value: int
+
+    >>> buffer = bytearray()
+    >>> write_varint(buffer, 5), write_varint(buffer, 300)
+    (None, None)
+    >>> bytes(buffer)
+    b'\\x05\\xac\\x02'
+    """
+    while value > 0x7f:
+        buffer.append(value & 0x7f | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data: Union[bytes, mmap.mmap], offset: int) -> Tuple[int, int]:
+    """ Прочитать целое в формате varint.
+
+    :param data: данные
+    :type data: Union[bytes, mmap.mmap]
+    :param offset: смещение начала значения
+    :type offset: int
+    :return: значение и смещение следующего за ним байта
+    :rtype: Tuple[int, int]
+
+    >>> read_varint(b'\\x05\\xac\\x02', 1)
+    (300, 3)
+    """
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def common_prefix(a: bytes, b: bytes) -> int:
+    """ Получить длину общего префикса двух строк байт.
+
+    Строки сравниваются как большие целые: номер старшего различающегося бита дает первый различающийся байт.
+
+    :param a: первая строка
+    :type a: bytes
+    :param b: вторая строка
+    :type b: bytes
+    :return: длина общего префикса
+    :rtype: int
+
+    >>> common_prefix(b'https://example.com/a', b'https://example.com/b'), common_prefix(b'abc', b'ab')
+    (20, 2)
+    """
+    length = min(len(a), len(b))
+    difference = int.from_bytes(a[:length], 'big') ^ int.from_bytes(b[:length], 'big')
+    return length - (difference.bit_length() + 7) // 8
+
+
+def encode_segment(entries: Iterable[Entry], prioritized: bool, chunk_size: int = 65536) -> Iterator[bytes]:
+    """ Закодировать записи очереди для сегмента на диске.
+
+    URL хранится в виде длины общего префикса с предыдущим URL сегмента и оставшегося суффикса (ссылки одной страницы
+    обычно отличаются только концом пути), порядковый номер - разностью с предыдущим номером, все целые - в формате
+    varint. Приоритет хранится, только если очередь упорядочена по приоритетам.
+
+    :param entries: записи в порядке извлечения
+    :type entries: Iterable[Entry]
+    :param prioritized: очередь упорядочена по приоритетам
+    :type prioritized: bool
+    :param chunk_size: размер фрагментов данных, defaults to 65536
+    :type chunk_size: int, optional
+    :return: фрагменты данных сегмента (сегмент не собирается в памяти целиком)
+    :rtype: Iterator[bytes]
+
+    >>> entries = [(0, 7, 'https://example.com/a', 2), (0, 8, 'https://example.com/b', 2)]
+    >>> data = b''.join(encode_segment(entries, False))
+    >>> len(data), decode_segment(data, False) == entries
+    (30, True)
+    """
+    buffer = bytearray()
+    previous_url, previous_seq = b'', 0
+    for key, seq, url, depth in entries:
+        url = url.encode()
+        shared = common_prefix(previous_url, url)
+        write_varint(buffer, shared)
+        write_varint(buffer, len(url) - shared)
+        buffer += url[shared:]
+        write_varint(buffer, depth)
+        delta = seq - previous_seq
+        write_varint(buffer, delta << 1 if delta >= 0 else (-delta << 1) - 1)
+        if prioritized:
+            buffer += PRIORITY.pack(key)
+        previous_url, previous_seq = url, seq
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def decode_entry(data: Union[bytes, mmap.mmap], offset: int, previous: Tuple[bytes, int],
+                 prioritized: bool) -> Tuple[Entry, int, Tuple[bytes, int]]:
+    """ Прочитать запись сегмента.
+
+    :param data: данные сегмента
+    :type data: Union[bytes, mmap.mmap]
+    :param offset: смещение записи
+    :type offset: int
+    :param previous: URL (в байтах) и порядковый номер предыдущей записи
+    :type previous: Tuple[bytes, int]
+    :param prioritized: очередь упорядочена по приоритетам
+    :type prioritized: bool
+    :return: запись, смещение следующей записи и URL с номером для чтения следующей записи
+    :rtype: Tuple[Entry, int, Tuple[bytes, int]]
+    """
+    previous_url, previous_seq = previous
+    shared, offset = read_varint(data, offset)
+    length, offset = read_varint(data, offset)
+    url = previous_url[:shared] + data[offset:offset + length]
+    offset += length
+    depth, offset = read_varint(data, offset)
+    delta, offset = read_varint(data, offset)
+    seq = previous_seq + (-(delta + 1 >> 1) if delta & 1 else delta >> 1)
+    key = 0
+    if prioritized:
+        key, = PRIORITY.unpack_from(data, offset)
+        offset += PRIORITY.size
+    return (key, seq, url.decode(), depth), offset, (url, seq)
+
+
+def decode_segment(data: bytes, prioritized: bool) -> List[Entry]:
+    """ Прочитать все записи сегмента.
+
+    :param data: данные сегмента
+    :type data: bytes
+    :param prioritized: очередь упорядочена по приоритетам
+    :type prioritized: bool
+    :return: записи в порядке извлечения
+    :rtype: List[Entry]
+    """
+    entries = []
+    offset, previous = 0, (b'', 0)
+    while offset < len(data):
+        entry, offset, previous = decode_entry(data, offset, previous, prioritized)
+        entries.append(entry)
+    return entries
+
+
+class UrlSet:
+    """ Компактное множество URL: хранятся 64-битные отпечатки, а не строки.
+
+    Отпечатки хранятся в нескольких отсортированных массивах-сериях (8 байт на URL) и небольшом множестве недавно
+    добавленных. Когда в множестве набирается MERGE_SIZE отпечатков, они сортируются в новую серию, и, как в двоичном
+    счетчике, серия сливается с предыдущими, пока они не больше нее. Поэтому серий O(log n), каждый отпечаток
+    сливается O(log n) раз, а слияние потоковое: пиковая память - сливаемые серии и их результат, без списков чисел
+    Python. Множество только пополняется: discard ничего не удаляет, потому что URL, перенесенный из очереди в
+    посещенные, для проверки новых ссылок остается известным.
+    """
+
+    MERGE_SIZE = 65536      # число недавно добавленных отпечатков, при достижении которого они образуют серию
+
+    _runs: List[array]      # отсортированные серии отпечатков по убыванию размера
+    _recent: set            # недавно добавленные отпечатки
+
+    def __init__(self, urls: Iterable[str] = ()):
+        """ Инициализация множества.
+
+        :param urls: начальные URL, defaults to ()
+        :type urls: Iterable[str], optional
+
+        >>> urls = UrlSet(['https://example.com'])
+        >>> urls |= {'https://example.com/1'}
+        >>> sorted({'https://example.com', 'https://example.com/2'} - urls), len(urls)
+        (['https://example.com/2'], 2)
+        """
+        self._runs = []
+        self._recent = set()
+        self.update(urls)
+
+    def __contains__(self, url: str) -> bool:
+        return self.find(fingerprint(url))
+
+    def __len__(self) -> int:
+        return sum(map(len, self._runs)) + len(self._recent)
+
+    def __ior__(self, urls: Iterable[str]) -> 'UrlSet':
+        self.update(urls)
+        return self
+
+    def __rsub__(self, urls: Iterable[str]) -> set:
+        return {url for url in urls if url not in self}
+
+    def find(self, value: int) -> bool:
+        """ Проверить, есть ли отпечаток в множестве.
+
+        :param value: отпечаток URL
+        :type value: int
+        :return: True, если отпечаток есть
+        :rtype: bool
+        """
+        if value in self._recent:
+            return True
+        for run in self._runs:
+            index = bisect_left(run, value)
+            if index < len(run) and run[index] == value:
+                return True
+        return False
+
+    def add(self, url: str) -> bool:
+        """ Добавить URL.
+
+        :param url: URL
+        :type url: str
+        :return: True, если URL добавлен, False, если он уже был в множестве
+        :rtype: bool
+        """
+        value = fingerprint(url)
+        if self.find(value):
+            return False
+        self._recent.add(value)
+        if len(self._recent) >= self.MERGE_SIZE:
+            self.merge()
+        return True
+
+    def merge(self):
+        """ Перенести недавно добавленные отпечатки в новую серию и слить ее с предыдущими сериями не больше нее.
+
+        >>> urls = UrlSet()
+        >>> urls.MERGE_SIZE = 2
+        >>> urls.update(f'https://example.com/{i}' for i in range(7))
+        >>> [len(run) for run in urls._runs], len(urls._recent)
+        ([4, 2], 1)
+        """
+        run = array('Q', sorted(self._recent))
+        self._recent = set()
+        while self._runs and len(self._runs[-1]) <= len(run):
+            run = array('Q', heapq.merge(self._runs.pop(), run))
+        self._runs.append(run)
+
+    def update(self, urls: Iterable[str]):
+        """ Добавить URL.
+
+        :param urls: URL
+        :type urls: Iterable[str]
+        """
+        for url in urls:
+            self.add(url)
+
+    def discard(self, url: str):
+        """ Ничего не делает: множество только пополняется (см. описание класса).
+
+        :param url: URL
+        :type url: str
+        """
+
+
+class Segment:
+    """ Сегмент очереди на диске: файл только для чтения, отображенный в память и читаемый по одной записи. """
+
+    path: str                       # путь к файлу
+    head: Union[Entry, None]        # текущая (первая непрочитанная) запись, None - сегмент прочитан
+    _file: object                   # открытый файл
+    _data: mmap.mmap                # отображение файла в память
+    _offset: int                    # смещение записи, следующей за текущей
+    _previous: Tuple[bytes, int]    # URL и номер текущей записи для чтения следующей
+    _prioritized: bool              # в записях хранятся приоритеты
+
+    @classmethod
+    def write(cls, path: str, entries: Iterable[Entry], prioritized: bool) -> 'Segment':
+        """ Записать сегмент и открыть его для чтения.
+
+        :param path: путь к файлу
+        :type path: str
+        :param entries: непустая последовательность записей в порядке извлечения
+        :type entries: Iterable[Entry]
+        :param prioritized: в записях хранятся приоритеты
+        :type prioritized: bool
+        :return: сегмент
+        :rtype: Segment
+        """
+        with open(path, 'wb') as file:
+            for chunk in encode_segment(entries, prioritized):
+                file.write(chunk)
+        return cls(path, prioritized)
+
+    def __init__(self, path: str, prioritized: bool):
+        """ Открыть сегмент.
+
+        :param path: путь к непустому файлу сегмента
+        :type path: str
+        :param prioritized: в записях хранятся приоритеты
+        :type prioritized: bool
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offset = 0
+        self._previous = (b'', 0)
+        self._prioritized = prioritized
+        self.head = None
+        self.advance()
+
+    def __iter__(self) -> Iterator[Entry]:
+        """ Прочитать оставшиеся записи (начиная с текущей). """
+        while self.head is not None:
+            entry = self.head
+            self.advance()
+            yield entry
+
+    @property
+    def size(self) -> int:
+        """ Размер файла сегмента в байтах. """
+        return 0 if self._data.closed else len(self._data)
+
+    def advance(self):
+        """ Перейти к следующей записи; после последней записи файл сегмента закрывается и удаляется. """
+        if self._offset >= len(self._data):
+            self.head = None
+            self.close()
+            return
+        self.head, self._offset, self._previous = decode_entry(self._data, self._offset, self._previous,
+                                                               self._prioritized)
+
+    def close(self):
+        """ Закрыть и удалить файл сегмента. """
+        if self._file.closed:
+            return
+        self._data.close()
+        self._file.close()
+        os.remove(self.path)
+
+
+class Frontier:
+    """ Очередь обхода с ограниченным расходом памяти.
+
+    В памяти хранится горячая часть очереди - не больше hot_size записей. При переполнении горячая часть сортируется,
+    и ее худшая половина записывается на диск сегментом - отсортированным файлом с компактно закодированными
+    записями, который больше не изменяется. При извлечении выбирается лучшая из первых записей горячей части и всех
+    сегментов (слияние отсортированных последовательностей), сегменты читаются через отображение в память по одной
+    записи, прочитанный сегмент удаляется. Поэтому записи извлекаются в точном порядке очереди: по убыванию
+    приоритета, при равных приоритетах (и в очереди без приоритетов) - в порядке добавления. Когда сегментов
+    становится больше MAX_SEGMENTS, меньшие из них сливаются, чтобы не расходовать дескрипторы файлов.
+
+    Очередь помнит отпечатки всех добавленных URL (UrlSet): повторно URL не добавляется.
+    """
+
+    HOT_SIZE = 100000       # число записей горячей части по умолчанию
+    MAX_SEGMENTS = 64       # число сегментов, при превышении которого они сливаются в один
+
+    directory: str                  # каталог сегментов
+    _owned: bool                    # каталог создан очередью и удаляется при закрытии
+    _hot_size: int                  # максимальное число записей в памяти
+    _prioritized: bool              # записи упорядочены по приоритетам
+    _hot: List[Entry]               # горячая часть (куча)
+    _segments: List[Segment]        # непрочитанные сегменты на диске
+    _heads: List[Tuple[float, int, Segment]]    # куча первых записей сегментов: (-приоритет, номер, сегмент)
+    _seq: int                       # порядковый номер следующей записи
+    _written: int                   # число записанных сегментов (для имен файлов)
+    _size: int                      # число записей в очереди
+    seen: UrlSet                    # отпечатки всех добавленных URL
+    stat: dict                      # статистика выгрузки на диск: сегменты, записи, байты, слияния сегментов
+
+    def __init__(self, directory: str = None, hot_size: int = HOT_SIZE, prioritized: bool = False):
+        """ Инициализация очереди.
+
+        :param directory: каталог сегментов, defaults to None (временный каталог, удаляемый при закрытии)
+        :type directory: str, optional
+        :param hot_size: максимальное число записей в памяти, defaults to HOT_SIZE
+        :type hot_size: int, optional
+        :param prioritized: извлекать записи по убыванию приоритета, а не в порядке добавления, defaults to False
+        :type prioritized: bool, optional
+        """
+        self._owned = directory is None
+        self.directory = mkdtemp(prefix='frontier-') if directory is None else directory
+        os.makedirs(self.directory, exist_ok=True)
+        self._hot_size = max(hot_size, 2)
+        self._prioritized = prioritized
+        self._hot = []
+        self._segments = []
+        self._heads = []
+        self._seq = 0
+        self._written = 0
+        self._size = 0
+        self.seen = UrlSet()
+        self.stat = {'segments': 0, 'spilled': 0, 'bytes': 0, 'compactions': 0}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.seen
+
+    def __enter__(self) -> 'Frontier':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def push(self, url: str, depth: int, priority: float = 0.0) -> bool:
+        """ Поставить URL в очередь.
+
+        :param url: URL
+        :type url: str
+        :param depth: уровень глубины обхода, с которым URL будет обработан
+        :type depth: int
+        :param priority: приоритет (учитывается, только если очередь упорядочена по приоритетам), defaults to 0.0
+        :type priority: float, optional
+        :return: True, если URL добавлен, False, если он уже добавлялся
+        :rtype: bool
+
+        >>> with Frontier(hot_size=4) as frontier:
+        ...     [frontier.push(f'https://example.com/{i}', 1) for i in (0, 1, 2, 3, 4, 0)]
+        ...     frontier.stat['segments'], [frontier.pop()[0][-1] for _ in range(len(frontier))], frontier.pop()
+        [True, True, True, True, True, False]
+        (1, ['0', '1', '2', '3', '4'], None)
+        """
+        if not self.seen.add(url):
+            return False
+        heapq.heappush(self._hot, (-priority if self._prioritized else 0, self._seq, url, depth))
+        self._seq += 1
+        self._size += 1
+        if len(self._hot) > self._hot_size:
+            self.spill()
+        return True
+
+    def pop(self) -> Union[Tuple[str, int], None]:
+        """ Извлечь первую запись очереди.
+
+        :return: URL и уровень глубины обхода или None, если очередь пуста
+        :rtype: Union[Tuple[str, int], None]
+
+        >>> with Frontier(hot_size=2, prioritized=True) as frontier:
+        ...     for i, priority in enumerate((0.1, 0.5, 0.3, 0.5, 0.9)):
+        ...         _ = frontier.push(f'https://example.com/{i}', i, priority)
+        ...     [frontier.pop() for _ in range(5)]
+        [('https://example.com/4', 4), ('https://example.com/1', 1), ('https://example.com/3', 3), \
+('https://example.com/2', 2), ('https://example.com/0', 0)]
+        """
+        if self._heads and (not self._hot or self._heads[0][:2] < self._hot[0][:2]):
+            segment = heapq.heappop(self._heads)[2]
+            _, _, url, depth = segment.head
+            segment.advance()
+            if segment.head is not None:
+                heapq.heappush(self._heads, (*segment.head[:2], segment))
+            else:
+                self._segments.remove(segment)
+        elif self._hot:
+            _, _, url, depth = heapq.heappop(self._hot)
+        else:
+            return None
+        self._size -= 1
+        return url, depth
+
+    def spill(self):
+        """ Записать худшую половину горячей части на диск новым сегментом. """
+        self._hot.sort()
+        middle = len(self._hot) // 2
+        entries = self._hot[middle:]
+        # отсортированный список является кучей
+        del self._hot[middle:]
+        self.add_segment(entries)
+        self.stat['spilled'] += len(entries)
+        if len(self._segments) > self.MAX_SEGMENTS:
+            self.compact()
+
+    def compact(self):
+        """ Слить меньшую половину сегментов в один (большие сегменты не переписываются при каждом слиянии). Записи
+        читаются и пишутся потоком, в памяти сегменты целиком не собираются.
+        """
+        self._segments.sort(key=lambda segment: segment.size)
+        middle = len(self._segments) // 2
+        merged = self._segments[:middle]
+        del self._segments[:middle]
+        self._heads = [head for head in self._heads if head[2] not in merged]
+        heapq.heapify(self._heads)
+        self.add_segment(heapq.merge(*merged))
+        self.stat['compactions'] += 1
+
+    def add_segment(self, entries: Iterable[Entry]):
+        """ Записать сегмент и добавить его в слияние.
+
+        :param entries: непустая последовательность записей в порядке извлечения
+        :type entries: Iterable[Entry]
+        """
+        path = os.path.join(self.directory, f'frontier-{os.getpid()}-{self._written:06d}.seg')
+        self._written += 1
+        segment = Segment.write(path, entries, self._prioritized)
+        self._segments.append(segment)
+        heapq.heappush(self._heads, (*segment.head[:2], segment))
+        self.stat['segments'] += 1
+        self.stat['bytes'] += segment.size
+
+    def close(self):
+        """ Удалить сегменты (и каталог, если он создан очередью). """
+        for segment in self._segments:
+            segment.close()
+        self._segments = []
+        self._heads = []
+        self._hot = []
+        self._size = 0
+        if self._owned:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,127 @@
+from array import array
+from typing import Dict, Iterable, Tuple
+
+
+class LinkGraph:
+    """ Граф ссылок в компактном представлении: URL заменены номерами, ребра хранятся в двух массивах. """
+
+    urls: list          # URL по номерам вершин
+    numbers: dict       # номер вершины по URL
+    sources: array      # начала ребер
+    targets: array      # концы ребер
+    out_degree: array   # число исходящих ссылок вершин
+
+    def __init__(self, edges: Iterable[Tuple[str, str]] = ()):
+        """ Инициализация графа.
+
+        :param edges: ребра (URL страницы, URL ссылки), defaults to ()
+        :type edges: Iterable[Tuple[str, str]], optional
+        """
+        self.urls = []
+        self.numbers = {}
+        self.sources = array('l')
+        self.targets = array('l')
+        self.out_degree = array('l')
+        for src, dst in edges:
+            self.add_edge(src, dst)
+
+    def node(self, url: str) -> int:
+        """ Получить номер вершины, добавив ее, если она отсутствует.
+
+        :param url: URL
+        :type url: str
+        :return: номер вершины
+        :rtype: int
+        """
+        number = self.numbers.get(url)
+        if number is None:
+            number = self.numbers[url] = len(self.urls)
+            self.urls.append(url)
+            self.out_degree.append(0)
+        return number
+
+    def add_edge(self, src: str, dst: str):
+        """ Добавить ребро. Петли не учитываются.
+
+        :param src: URL страницы
+        :type src: str
+        :param dst: URL ссылки
+        :type dst: str
+        """
+        if src == dst:
+            return
+        source = self.node(src)
+        self.sources.append(source)
+        self.targets.append(self.node(dst))
+        self.out_degree[source] += 1
+
+    def inlinks(self) -> Dict[str, int]:
+        """ Получить число входящих ссылок для каждой вершины.
+
+        :return: число входящих ссылок по URL
+        :rtype: Dict[str, int]
+        """
+        counts = [0] * len(self.urls)
+        for target in self.targets:
+            counts[target] += 1
+        return dict(zip(self.urls, counts))
+
+    def pagerank(self, previous: Dict[str, float] = None, damping: float = 0.85, tolerance: float = 1e-6,
+                 max_iterations: int = 100) -> Tuple[Dict[str, float], int]:
+        """ Вычислить PageRank степенным методом.
+
+        Каждая итерация - один проход по массивам ребер. Ранг страниц без исходящих ссылок равномерно
+        распределяется по всем вершинам. Если переданы ранги предыдущего расчета, итерации начинаются с них
+        (новые вершины получают средний ранг): после дообхода сайта граф меняется мало, и расчет сходится за
+        несколько итераций.
+
+        :param previous: ранги предыдущего расчета, defaults to None
+        :type previous: Dict[str, float], optional
+        :param damping: коэффициент затухания, defaults to 0.85
+        :type damping: float, optional
+        :param tolerance: порог сходимости (сумма модулей изменений рангов), defaults to 1e-6
+        :type tolerance: float, optional
+        :param max_iterations: максимальное число итераций, defaults to 100
+        :type max_iterations: int, optional
+        :return: ранги по URL (сумма рангов равна 1) и число выполненных итераций
+        :rtype: Tuple[Dict[str, float], int]
+
+        >>> ranks, _ = LinkGraph([('a', 'b'), ('b', 'c'), ('c', 'a')]).pagerank()
+        >>> [round(ranks[url], 3) for url in 'abc']
+        [0.333, 0.333, 0.333]
+        >>> ranks, _ = LinkGraph([('a', 'c'), ('b', 'c')]).pagerank()
+        >>> ranks['c'] > ranks['a'] == ranks['b']
+        True
+        """
+        size = len(self.urls)
+        if not size:
+            return {}, 0
+
+        if previous:
+            rank = [previous.get(url, 1 / size) for url in self.urls]
+            total = sum(rank)
+            rank = [value / total for value in rank]
+        else:
+            rank = [1 / size] * size
+
+        sources, targets, out_degree = self.sources, self.targets, self.out_degree
+        dangling = [number for number in range(size) if not out_degree[number]]
+
+        iteration = 0
+        for iteration in range(1, max_iterations + 1):
+            share = [damping * value / degree if degree else 0 for value, degree in zip(rank, out_degree)]
+            base = (1 - damping + damping * sum(rank[number] for number in dangling)) / size
+            new_rank = [base] * size
+            for source, target in zip(sources, targets):
+                new_rank[target] += share[source]
+            delta = sum(abs(new - old) for new, old in zip(new_rank, rank))
+            rank = new_rank
+            if delta < tolerance:
+                break
+
+        return dict(zip(self.urls, rank)), iteration
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
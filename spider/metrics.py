@@ -0,0 +1,225 @@
+import json
+import sys
+import time
+from asyncio import sleep
+from bisect import bisect_left
+from typing import Callable, Dict, List, TextIO, Tuple
+
+from aiohttp import web
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# описания метрик обходчика: имя -> (тип, описание, границы корзин гистограммы)
+DEFINITIONS = {
+    'spider_fetch_seconds': (HISTOGRAM, 'HTTP request latency by method', TIME_BUCKETS),
+    'spider_response_bytes': (HISTOGRAM, 'Size of downloaded HTML bodies', SIZE_BUCKETS),
+    'spider_responses_total': (COUNTER, 'HTTP responses by status code', None),
+    'spider_parse_seconds': (HISTOGRAM, 'HTML parsing time', TIME_BUCKETS),
+    'spider_flush_seconds': (HISTOGRAM, 'Latency of writing a batch of records to the database', TIME_BUCKETS),
+    'spider_flushed_records_total': (COUNTER, 'Records written to the database', None),
+    'spider_queue_depth': (GAUGE, 'Tasks scheduled but not finished yet', None),
+    'spider_in_flight': (GAUGE, 'Requests in progress by host', None),
+    'spider_db_acquire_seconds': (HISTOGRAM, 'Time spent waiting for a database pool connection', TIME_BUCKETS),
+    'spider_db_query_seconds': (HISTOGRAM, 'Database operation latency by operation', TIME_BUCKETS),
+    'spider_db_connections': (GAUGE, 'Database pool connections by state', None),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def quantile(buckets: Tuple[float, ...], counts: List[int], q: float) -> float:
+    """ Оценить квантиль гистограммы линейной интерполяцией внутри корзины.
+
+    :param buckets: верхние границы корзин
+    :type buckets: Tuple[float, ...]
+    :param counts: число наблюдений в каждой корзине (последний элемент - наблюдения больше последней границы)
+    :type counts: List[int]
+    :param q: уровень квантиля от 0 до 1
+    :type q: float
+    :return: оценка квантиля
+    :rtype: float
+
+    >>> quantile((1, 2, 4), [0, 10, 0, 0], 0.5)
+    1.5
+    >>> quantile((1, 2, 4), [0, 0, 0, 3], 0.99)
+    4
+    """
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if seen + count >= rank and count:
+            if i == len(buckets):
+                return buckets[-1]
+            lower = buckets[i - 1] if i else 0
+            return lower + (buckets[i] - lower) * (rank - seen) / count
+        seen += count
+    return buckets[-1]
+
+
+class Metrics:
+
+    _values: Dict[str, Dict[Labels, float]]         # значения счетчиков и измерителей
+    _histograms: Dict[str, Dict[Labels, list]]      # гистограммы: [число в корзинах, сумма, число наблюдений]
+
+    def __init__(self):
+        """ Инициализация реестра метрик. """
+        self._values = {}
+        self._histograms = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        """ Увеличить счетчик или измеритель.
+
+        :param name: имя метрики
+        :type name: str
+        :param value: приращение, defaults to 1
+        :type value: float, optional
+        """
+        series = self._values.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str):
+        """ Установить значение измерителя.
+
+        :param name: имя метрики
+        :type name: str
+        :param value: значение
+        :type value: float
+        """
+        self._values.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, value: float, **labels: str):
+        """ Добавить наблюдение в гистограмму.
+
+        :param name: имя метрики
+        :type name: str
+        :param value: наблюдаемое значение
+        :type value: float
+        """
+        buckets = DEFINITIONS[name][2]
+        series = self._histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+        histogram[0][bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+    def render(self) -> str:
+        """ Сформировать текстовое представление метрик в формате Prometheus/OpenMetrics.
+
+        :return: метрики
+        :rtype: str
+        """
+        lines = []
+        for name, (kind, description, buckets) in DEFINITIONS.items():
+            if name not in self._values and name not in self._histograms:
+                continue
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, value in self._values.get(name, {}).items():
+                lines.append(f'{name}{self._format_labels(key)} {value}')
+            for key, (counts, total, count) in self._histograms.get(name, {}).items():
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{self._format_labels(key + (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{name}_sum{self._format_labels(key)} {total}')
+                lines.append(f'{name}_count{self._format_labels(key)} {count}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> dict:
+        """ Получить текущие значения метрик в виде словаря (для JSON-журнала).
+
+        Для гистограмм приводятся число наблюдений, сумма и оценки p50/p95/p99.
+
+        :return: значения метрик
+        :rtype: dict
+        """
+        result = {}
+        for name, series in self._values.items():
+            result[name] = {self._format_key(key): value for key, value in series.items()}
+        for name, series in self._histograms.items():
+            buckets = DEFINITIONS[name][2]
+            result[name] = {
+                self._format_key(key): {
+                    'count': count,
+                    'sum': total,
+                    'p50': quantile(buckets, counts, 0.5),
+                    'p95': quantile(buckets, counts, 0.95),
+                    'p99': quantile(buckets, counts, 0.99),
+                }
+                for key, (counts, total, count) in series.items()
+            }
+        return result
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """ Обработчик HTTP-запроса метрик.
+
+        :param request: запрос
+        :type request: web.Request
+        :return: ответ с метриками
+        :rtype: web.Response
+        """
+        return web.Response(text=self.render(), content_type='text/plain')
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 9100) -> web.AppRunner:
+        """ Запустить HTTP-сервер, отдающий метрики по адресу /metrics.
+
+        :param host: адрес, defaults to '127.0.0.1'
+        :type host: str, optional
+        :param port: порт, defaults to 9100
+        :type port: int, optional
+        :return: запущенный сервер (для остановки вызвать cleanup)
+        :rtype: web.AppRunner
+        """
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    async def log(self, interval: float, extra: Callable[[], dict] = None, stream: TextIO = None):
+        """ Периодически выводить метрики строками JSON.
+
+        :param interval: период вывода в секундах
+        :type interval: float
+        :param extra: функция, возвращающая дополнительные данные для строки журнала, defaults to None
+        :type extra: Callable[[], dict], optional
+        :param stream: поток вывода, defaults to sys.stderr
+        :type stream: TextIO, optional
+        """
+        stream = stream or sys.stderr
+        while True:
+            await sleep(interval)
+            line = {'ts': time.time(), 'metrics': self.snapshot()}
+            if extra is not None:
+                line.update(extra())
+            stream.write(json.dumps(line) + '\n')
+            stream.flush()
+
+    @staticmethod
+    def _format_labels(key: Labels) -> str:
+        if not key:
+            return ''
+        return '{' + ','.join(f'{name}="{value}"' for name, value in key) + '}'
+
+    @staticmethod
+    def _format_key(key: Labels) -> str:
+        return ','.join(f'{name}={value}' for name, value in key)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
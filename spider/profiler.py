@@ -0,0 +1,215 @@
+import cProfile
+import resource
+import time
+from array import array
+from asyncio import sleep
+from types import SimpleNamespace
+from typing import Dict, List, Sequence, Tuple
+
+from aiohttp import ClientSession, TraceConfig
+
+# порядок этапов в отчете
+STAGES = ('dns', 'connect', 'head', 'get', 'decode', 'parse', 'text', 'extract', 'links', 'flush')
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    """ Получить перцентиль выборки (метод ближайшего ранга).
+
+    :param samples: отсортированная выборка
+    :type samples: Sequence[float]
+    :param q: уровень от 0 до 100
+    :type q: float
+    :return: перцентиль
+    :rtype: float
+
+    >>> percentile([1, 2, 3, 4], 50)
+    2
+    >>> percentile(list(range(1, 101)), 99)
+    99
+    >>> percentile([5], 95)
+    5
+    """
+    if not samples:
+        return 0.0
+    rank = max(int(q * len(samples) / 100 + 0.5) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+def rss() -> int:
+    """ Получить текущий размер резидентной памяти процесса в байтах (0, если недоступен). """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return 0
+
+
+def peak_rss() -> int:
+    """ Получить пиковый размер резидентной памяти процесса в байтах. """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Stage:
+
+    __slots__ = ('_samples', '_started')
+
+    _samples: array     # выборка длительностей этапа
+    _started: float     # момент начала измерения
+
+    def __init__(self, samples: array):
+        self._samples = samples
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._samples.append(time.perf_counter() - self._started)
+
+
+class StageProfiler:
+
+    _samples: Dict[str, array]              # длительности этапов по именам
+    _memory: List[Tuple[float, int]]        # замеры памяти: (время от начала, RSS в байтах)
+    _cprofile: cProfile.Profile             # профайлер вызовов (None, если не используется)
+    _started: float                         # момент создания профайлера
+
+    def __init__(self, trace: bool = False):
+        """ Инициализация профайлера этапов обработки страниц.
+
+        В отличие от tracemalloc, замер этапа стоит два вызова perf_counter, поэтому профайлер практически не влияет
+        на скорость разбора страниц.
+
+        :param trace: дополнительно собирать профиль вызовов cProfile, defaults to False
+        :type trace: bool, optional
+        """
+        self._samples = {}
+        self._memory = []
+        self._cprofile = cProfile.Profile() if trace else None
+        self._started = time.perf_counter()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    def stage(self, name: str) -> Stage:
+        """ Получить контекстный менеджер, замеряющий длительность этапа.
+
+        :param name: имя этапа
+        :type name: str
+        :return: контекстный менеджер
+        :rtype: Stage
+        """
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples[name] = array('d')
+        return Stage(samples)
+
+    def record(self, name: str, seconds: float):
+        """ Добавить замер длительности этапа.
+
+        :param name: имя этапа
+        :type name: str
+        :param seconds: длительность в секундах
+        :type seconds: float
+        """
+        self._samples.setdefault(name, array('d')).append(seconds)
+
+    def samples(self, name: str) -> Sequence[float]:
+        """ Получить замеры этапа в порядке поступления.
+
+        :param name: имя этапа
+        :type name: str
+        :return: замеры в секундах
+        :rtype: Sequence[float]
+        """
+        return self._samples.get(name, ())
+
+    def trace_config(self) -> TraceConfig:
+        """ Получить конфигурацию трассировки aiohttp, замеряющую разрешение имен и установку соединений.
+
+        :return: конфигурация трассировки для ClientSession(trace_configs=[...])
+        :rtype: TraceConfig
+        """
+        def on_start(name: str):
+            async def handler(session: ClientSession, context: SimpleNamespace, params):
+                setattr(context, name, time.perf_counter())
+            return handler
+
+        def on_end(name: str):
+            async def handler(session: ClientSession, context: SimpleNamespace, params):
+                self.record(name, time.perf_counter() - getattr(context, name))
+            return handler
+
+        # разрешение имени происходит внутри установки соединения, поэтому моменты начала хранятся раздельно
+        config = TraceConfig()
+        config.on_dns_resolvehost_start.append(on_start('dns'))
+        config.on_dns_resolvehost_end.append(on_end('dns'))
+        config.on_connection_create_start.append(on_start('connect'))
+        config.on_connection_create_end.append(on_end('connect'))
+        return config
+
+    async def sample_memory(self, interval: float):
+        """ Периодически замерять размер резидентной памяти процесса.
+
+        :param interval: период замеров в секундах
+        :type interval: float
+        """
+        while True:
+            self._memory.append((time.perf_counter() - self._started, rss()))
+            await sleep(interval)
+
+    def stop(self, trace_path: str = None):
+        """ Остановить профиль вызовов и сохранить его в файл (формат pstats).
+
+        :param trace_path: путь к файлу профиля вызовов, defaults to None
+        :type trace_path: str, optional
+        """
+        if self._cprofile is None:
+            return
+        self._cprofile.disable()
+        if trace_path:
+            self._cprofile.dump_stats(trace_path)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """ Получить статистику по этапам: число замеров, суммарное время и перцентили p50/p95/p99.
+
+        :return: статистика по этапам
+        :rtype: Dict[str, Dict[str, float]]
+        """
+        names = [name for name in STAGES if name in self._samples]
+        names += sorted(name for name in self._samples if name not in STAGES)
+        result = {}
+        for name in names:
+            samples = sorted(self._samples[name])
+            result[name] = {
+                'count': len(samples),
+                'total': sum(samples),
+                'p50': percentile(samples, 50),
+                'p95': percentile(samples, 95),
+                'p99': percentile(samples, 99),
+            }
+        if self._memory:
+            result['memory'] = {'samples': len(self._memory), 'peak_rss': max(value for _, value in self._memory)}
+        return result
+
+    def format_report(self) -> str:
+        """ Сформировать текстовую таблицу статистики по этапам (время в миллисекундах).
+
+        :return: таблица
+        :rtype: str
+        """
+        report = self.report()
+        memory = report.pop('memory', None)
+        lines = [f'{"stage":<10}{"count":>10}{"total, s":>12}{"p50, ms":>10}{"p95, ms":>10}{"p99, ms":>10}']
+        for name, row in report.items():
+            lines.append(
+                f'{name:<10}{row["count"]:>10}{row["total"]:>12.3f}'
+                f'{row["p50"] * 1000:>10.2f}{row["p95"] * 1000:>10.2f}{row["p99"] * 1000:>10.2f}'
+            )
+        if memory is not None:
+            lines.append(f'memory: {memory["samples"]} samples, peak RSS {memory["peak_rss"]} bytes')
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
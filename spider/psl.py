@@ -0,0 +1,146 @@
+import ipaddress
+import os
+from functools import lru_cache
+from typing import Iterable
+
+PSL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'public_suffix_list.dat')
+PRIVATE_SECTION = '// ===BEGIN PRIVATE DOMAINS==='    # начало раздела частных доменов (github.io, blogspot.com и т.д.)
+
+
+def is_ip(host: str) -> bool:
+    """ Проверить, является ли хост IP-адресом.
+
+    :param host: хост (IPv6 может быть в квадратных скобках)
+    :type host: str
+    :return: True, если хост - IP-адрес
+    :rtype: bool
+
+    >>> is_ip('127.0.0.1'), is_ip('[::1]'), is_ip('example.com')
+    (True, True, False)
+    """
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+    except ValueError:
+        return False
+    return True
+
+
+class PublicSuffixList:
+    """ Список публичных суффиксов (https://publicsuffix.org): домены, в которых регистрируют домены третьи лица. """
+
+    _rules: set         # обычные правила (co.uk)
+    _wildcards: set     # правила-шаблоны без префикса '*.' (*.ck -> ck)
+    _exceptions: set    # исключения без префикса '!' (!www.ck -> www.ck)
+
+    def __init__(self, lines: Iterable[str], private: bool = True):
+        """ Инициализация списка.
+
+        Правила с символами не из ASCII добавляются и в исходном виде, и в виде punycode.
+
+        :param lines: строки файла списка
+        :type lines: Iterable[str]
+        :param private: учитывать раздел частных доменов, defaults to True
+        :type private: bool, optional
+        """
+        self._rules = set()
+        self._wildcards = set()
+        self._exceptions = set()
+        for line in lines:
+            line = line.strip()
+            if line.startswith(PRIVATE_SECTION) and not private:
+                break
+            if not line or line.startswith('//'):
+                continue
+            rules = {line.lower()}
+            if not line.isascii():
+                try:
+                    rules.add(line.encode('idna').decode('ascii'))
+                except UnicodeError:
+                    pass
+            for rule in rules:
+                if rule.startswith('!'):
+                    self._exceptions.add(rule[1:])
+                elif rule.startswith('*.'):
+                    self._wildcards.add(rule[2:])
+                else:
+                    self._rules.add(rule)
+
+    @classmethod
+    def load(cls, path: str = PSL_PATH, private: bool = True) -> 'PublicSuffixList':
+        """ Загрузить список из файла.
+
+        :param path: путь к файлу, defaults to PSL_PATH (список, поставляемый с обходчиком)
+        :type path: str, optional
+        :param private: учитывать раздел частных доменов, defaults to True
+        :type private: bool, optional
+        :return: список
+        :rtype: PublicSuffixList
+        """
+        with open(path, encoding='utf-8') as file:
+            return cls(file, private)
+
+    def public_suffix(self, host: str) -> str:
+        """ Получить публичный суффикс хоста по алгоритму publicsuffix.org (правило по умолчанию - '*').
+
+        :param host: хост в нижнем регистре
+        :type host: str
+        :return: публичный суффикс
+        :rtype: str
+
+        >>> psl = PublicSuffixList(['uk', 'co.uk', '*.ck', '!www.ck'])
+        >>> psl.public_suffix('news.bbc.co.uk'), psl.public_suffix('a.b.ck'), psl.public_suffix('www.ck')
+        ('co.uk', 'b.ck', 'ck')
+        >>> psl.public_suffix('example.com')
+        'com'
+        """
+        labels = host.strip('.').split('.')
+        for index in range(len(labels)):
+            candidate = '.'.join(labels[index:])
+            if candidate in self._exceptions:
+                return '.'.join(labels[index + 1:])
+            if candidate in self._rules:
+                return candidate
+            if index + 1 < len(labels) and '.'.join(labels[index + 1:]) in self._wildcards:
+                return candidate
+        return labels[-1]
+
+    def registrable_domain(self, host: str) -> str:
+        """ Получить регистрируемый домен хоста: публичный суффикс и одна метка перед ним.
+
+        IP-адреса, хосты из одной метки (localhost) и сами публичные суффиксы возвращаются без изменений.
+
+        :param host: хост
+        :type host: str
+        :return: регистрируемый домен
+        :rtype: str
+
+        >>> psl = PublicSuffixList(['uk', 'co.uk', 'com', 'github.io'])
+        >>> psl.registrable_domain('news.bbc.co.uk'), psl.registrable_domain('up.example.com')
+        ('bbc.co.uk', 'example.com')
+        >>> psl.registrable_domain('user.github.io'), psl.registrable_domain('co.uk')
+        ('user.github.io', 'co.uk')
+        >>> psl.registrable_domain('127.0.0.1'), psl.registrable_domain('localhost')
+        ('127.0.0.1', 'localhost')
+        """
+        host = host.lower().strip('.')
+        if '.' not in host or is_ip(host):
+            return host
+        suffix = self.public_suffix(host)
+        if suffix == host:
+            return host
+        return '.'.join(host.split('.')[-suffix.count('.') - 2:])
+
+
+@lru_cache(maxsize=None)
+def default_list() -> PublicSuffixList:
+    """ Получить список, поставляемый с обходчиком. Файл читается при первом вызове.
+
+    :return: список
+    :rtype: PublicSuffixList
+    """
+    return PublicSuffixList.load()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
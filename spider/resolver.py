@@ -0,0 +1,213 @@
+import socket
+from asyncio import Future, Semaphore, ensure_future, shield
+from ipaddress import ip_address
+from time import monotonic
+from typing import Dict, Iterable, List, Tuple, Union
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+
+Addresses = List[dict]      # адреса хоста в формате резолверов aiohttp (словари с ключами host, port, family и т.д.)
+
+
+def is_ip(host: str) -> bool:
+    """ Проверить, является ли хост IP-адресом (такие хосты не разрешаются).
+
+    :param host: хост
+    :type host: str
+    :return: True, если хост - IPv4 или IPv6 адрес
+    :rtype: bool
+
+    >>> is_ip('127.0.0.1'), is_ip('::1'), is_ip('example.com')
+    (True, True, False)
+    """
+    try:
+        ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+class CachingResolver(AbstractResolver):
+    """ Резолвер с общим кэшем и опережающим разрешением имен хостов.
+
+    Разрешение выполняет резолвер aiohttp по умолчанию (асинхронный на aiodns, если он установлен, иначе getaddrinfo в
+    пуле потоков). Результаты хранятся ttl секунд, ошибки - negative_ttl секунд. Одновременные запросы одного хоста
+    объединяются в один запрос к DNS, число запросов к DNS ограничено max_lookups.
+
+    Скраппер вызывает prefetch для хостов новых ссылок, поэтому к моменту первого запроса имя обычно уже разрешено, а
+    ссылки на хосты, имя которых не разрешилось, отбрасываются, не занимая места в лимитах запросов. Резолвер
+    передается в TCPConnector (с use_dns_cache=False: кэшем управляет резолвер).
+    """
+
+    TTL = 300.0             # время хранения адресов хоста в секундах
+    NEGATIVE_TTL = 60.0     # время хранения ошибки разрешения имени в секундах
+    MAX_LOOKUPS = 32        # число одновременных запросов к DNS
+    MAX_HOSTS = 10000       # число хостов в кэше, при превышении которого удаляются устаревшие записи
+
+    _resolver: AbstractResolver     # резолвер, выполняющий запросы к DNS
+    _ttl: float                     # время хранения адресов
+    _negative_ttl: float            # время хранения ошибок
+    _cache: Dict[str, Tuple[float, Union[Addresses, OSError]]]     # результаты по хостам: (срок, адреса или ошибка)
+    _lookups: Dict[str, Future]     # выполняющиеся запросы к DNS по хостам
+    _semaphore: Semaphore           # ограничение числа одновременных запросов к DNS
+    stat: dict                      # статистика: попадания в кэш, запросы к DNS, ошибки, опережающие запросы
+
+    def __init__(self, resolver: AbstractResolver = None, ttl: float = TTL, negative_ttl: float = NEGATIVE_TTL,
+                 max_lookups: int = MAX_LOOKUPS):
+        """ Инициализация резолвера. Создается в работающем цикле событий.
+
+        :param resolver: резолвер, выполняющий запросы к DNS, defaults to None (резолвер aiohttp по умолчанию)
+        :type resolver: AbstractResolver, optional
+        :param ttl: время хранения адресов хоста в секундах, defaults to TTL
+        :type ttl: float, optional
+        :param negative_ttl: время хранения ошибки разрешения имени в секундах, defaults to NEGATIVE_TTL
+        :type negative_ttl: float, optional
+        :param max_lookups: число одновременных запросов к DNS, defaults to MAX_LOOKUPS
+        :type max_lookups: int, optional
+        """
+        self._resolver = resolver or DefaultResolver()
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._cache = {}
+        self._lookups = {}
+        self._semaphore = Semaphore(max_lookups)
+        self.stat = {'hits': 0, 'lookups': 0, 'failures': 0, 'prefetched': 0}
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> Addresses:
+        """ Разрешить имя хоста (метод резолвера aiohttp).
+
+        Имена разрешаются для всех семейств адресов, адреса нужного семейства выбираются из результата.
+
+        :param host: хост
+        :type host: str
+        :param port: порт, defaults to 0
+        :type port: int, optional
+        :param family: семейство адресов, defaults to socket.AF_INET
+        :type family: int, optional
+        :raises OSError: имя не разрешено (ошибка берется из кэша до истечения negative_ttl) или у хоста нет адресов
+            этого семейства
+        :return: адреса с заданным портом
+        :rtype: Addresses
+        """
+        addresses = [
+            dict(address, port=port) for address in await self.lookup(host)
+            if family == socket.AF_UNSPEC or address['family'] == family
+        ]
+        if not addresses:
+            raise OSError(f'no addresses of family {family} for {host}')
+        return addresses
+
+    async def lookup(self, host: str) -> Addresses:
+        """ Получить адреса хоста из кэша или запросом к DNS.
+
+        :param host: хост
+        :type host: str
+        :raises OSError: имя не разрешено
+        :return: адреса всех семейств (порт - 0)
+        :rtype: Addresses
+        """
+        cached = self._cache.get(host)
+        if cached is not None and cached[0] > monotonic():
+            self.stat['hits'] += 1
+            if isinstance(cached[1], OSError):
+                raise cached[1].with_traceback(None)
+            return cached[1]
+        # отмена одного из ожидающих не отменяет общий запрос
+        return await shield(self.start(host))
+
+    def start(self, host: str) -> Future:
+        """ Получить выполняющийся запрос к DNS для хоста или начать новый.
+
+        :param host: хост
+        :type host: str
+        :return: запрос (его результат - адреса хоста)
+        :rtype: Future
+        """
+        lookup = self._lookups.get(host)
+        if lookup is None:
+            lookup = self._lookups[host] = ensure_future(self._lookup(host))
+        return lookup
+
+    async def _lookup(self, host: str) -> Addresses:
+        try:
+            async with self._semaphore:
+                self.stat['lookups'] += 1
+                try:
+                    addresses = await self._resolver.resolve(host, 0, socket.AF_UNSPEC)
+                except OSError as error:
+                    self.stat['failures'] += 1
+                    self.store(host, error, self._negative_ttl)
+                    raise
+                self.store(host, addresses, self._ttl)
+                return addresses
+        finally:
+            self._lookups.pop(host, None)
+
+    def store(self, host: str, result: Union[Addresses, OSError], ttl: float):
+        """ Сохранить результат в кэше, удалив устаревшие записи, если кэш слишком большой.
+
+        :param host: хост
+        :type host: str
+        :param result: адреса или ошибка
+        :type result: Union[Addresses, OSError]
+        :param ttl: время хранения в секундах
+        :type ttl: float
+        """
+        now = monotonic()
+        if len(self._cache) >= self.MAX_HOSTS:
+            self._cache = {key: value for key, value in self._cache.items() if value[0] > now}
+        self._cache[host] = (now + ttl, result)
+
+    def check(self, host: str) -> Union[bool, None]:
+        """ Узнать результат разрешения имени без запроса к DNS.
+
+        :param host: хост
+        :type host: str
+        :return: True - имя разрешено, False - имя не разрешается, None - результат неизвестен (или устарел)
+        :rtype: Union[bool, None]
+        """
+        cached = self._cache.get(host)
+        if cached is None or cached[0] <= monotonic():
+            return None
+        return not isinstance(cached[1], OSError)
+
+    async def ensure(self, host: str) -> bool:
+        """ Дождаться разрешения имени хоста (IP-адреса не разрешаются).
+
+        :param host: хост
+        :type host: str
+        :return: True, если имя разрешено
+        :rtype: bool
+        """
+        if not host or is_ip(host):
+            return True
+        try:
+            await self.lookup(host)
+        except OSError:
+            return False
+        return True
+
+    def prefetch(self, hosts: Iterable[str]):
+        """ Начать разрешение имен хостов, результат которого еще неизвестен. Результат попадает в кэш, ошибки
+        не выбрасываются.
+
+        :param hosts: хосты
+        :type hosts: Iterable[str]
+        """
+        for host in hosts:
+            if not host or is_ip(host) or host in self._lookups or self.check(host) is not None:
+                continue
+            self.stat['prefetched'] += 1
+            self.start(host).add_done_callback(lambda lookup: lookup.cancelled() or lookup.exception())
+
+    async def close(self):
+        """ Отменить выполняющиеся запросы и закрыть резолвер, выполняющий запросы к DNS. """
+        for lookup in list(self._lookups.values()):
+            lookup.cancel()
+        await self._resolver.close()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,126 @@
+import heapq
+from hashlib import blake2b
+from math import exp, log
+from typing import Dict, List, NamedTuple, Union
+
+DAY = 24 * 60 * 60          # сутки в секундах
+DEFAULT_RATE = 1 / DAY      # частота изменений страницы без истории: раз в сутки
+MIN_RATE = 1 / (30 * DAY)   # нижняя граница частоты: страница, не менявшаяся при загрузках, все же проверяется
+HORIZON = DAY               # период, на который планируется свежесть страниц: интервал между запусками refresh
+
+
+class FetchStats(NamedTuple):
+    """ Сводка истории загрузок страницы. """
+
+    fetches: int            # число загрузок
+    changes: int            # число загрузок, при которых контент отличался от предыдущего
+    first_fetched: float    # время первой загрузки (Unix time)
+    last_fetched: float     # время последней загрузки (Unix time)
+
+
+def content_hash(text: str) -> str:
+    """ Получить хэш контента страницы для сравнения загрузок.
+
+    :param text: видимый текст страницы (разметка, скрипты и идентификаторы сессий в тэгах не влияют на хэш)
+    :type text: str
+    :return: хэш в шестнадцатеричном виде
+    :rtype: str
+
+    >>> content_hash('Hello, world') == content_hash('Hello, world'), len(content_hash(''))
+    (True, 32)
+    """
+    return blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def change_rate(stats: FetchStats) -> Union[float, None]:
+    """ Оценить частоту изменений страницы (изменений в секунду) по истории загрузок.
+
+    Изменения считаются пуассоновским процессом, наблюдаемым только в моменты загрузок: если между двумя загрузками
+    страница менялась несколько раз, видно одно изменение. Используется оценка Cho и Garcia-Molina
+    -log((n - X + 0.5) / (n + 0.5)) / I, где n - число интервалов между загрузками, X - число интервалов с
+    изменениями, I - средний интервал. В отличие от X / (n * I), она не занижает частоту часто меняющихся страниц и
+    конечна, даже если страница менялась при каждой загрузке.
+
+    :param stats: сводка истории загрузок
+    :type stats: FetchStats
+    :return: частота изменений или None, если загрузок меньше двух
+    :rtype: Union[float, None]
+
+    >>> round(change_rate(FetchStats(11, 5, 0, 10 * DAY)) * DAY, 3)
+    0.647
+    >>> round(change_rate(FetchStats(11, 10, 0, 10 * DAY)) * DAY, 3), change_rate(FetchStats(1, 0, 0, 0))
+    (3.045, None)
+    """
+    intervals = stats.fetches - 1
+    span = stats.last_fetched - stats.first_fetched
+    if intervals < 1 or span <= 0:
+        return None
+    return -log((intervals - stats.changes + 0.5) / (intervals + 0.5)) / (span / intervals)
+
+
+def freshness_gain(rate: float, age: float, horizon: float = HORIZON) -> float:
+    """ Ожидаемый выигрыш свежести от загрузки страницы сейчас.
+
+    Выигрыш - вероятность того, что сохраненная копия устарела (1 - exp(-rate * age)), умноженная на среднюю долю
+    времени горизонта, в течение которой свежая копия останется актуальной ((1 - exp(-rate * horizon)) /
+    (rate * horizon)). Поэтому сначала загружаются давно не загружавшиеся страницы, а страницы, которые меняются
+    намного чаще горизонта, откладываются: их копия устареет почти сразу, и запрос мало что дает.
+
+    :param rate: частота изменений (в секунду)
+    :type rate: float
+    :param age: время с последней загрузки в секундах
+    :type age: float
+    :param horizon: горизонт планирования в секундах, defaults to HORIZON
+    :type horizon: float, optional
+    :return: выигрыш от 0 до 1
+    :rtype: float
+
+    >>> daily = freshness_gain(1 / DAY, DAY)
+    >>> daily > freshness_gain(1 / (365 * DAY), DAY), daily > freshness_gain(24 / DAY, DAY)
+    (True, True)
+    """
+    if rate <= 0:
+        return 0.0
+    stale = 1 - exp(-rate * max(age, 0))
+    return stale * (1 - exp(-rate * horizon)) / (rate * horizon)
+
+
+def select(history: Dict[str, FetchStats], budget: int, now: float, horizon: float = HORIZON) -> List[str]:
+    """ Выбрать страницы для повторной загрузки в пределах бюджета запросов.
+
+    Страницам с одной загрузкой назначается средняя частота изменений страниц с историей (или DEFAULT_RATE, если
+    истории нет ни у одной страницы), частота не опускается ниже MIN_RATE.
+
+    :param history: сводки истории загрузок по URL
+    :type history: Dict[str, FetchStats]
+    :param budget: число страниц
+    :type budget: int
+    :param now: текущее время (Unix time)
+    :type now: float
+    :param horizon: горизонт планирования в секундах, defaults to HORIZON
+    :type horizon: float, optional
+    :return: URL по убыванию выигрыша свежести
+    :rtype: List[str]
+
+    >>> history = {
+    ...     'https://example.com': FetchStats(5, 4, 0, 4 * DAY),             # меняется почти каждый день
+    ...     'https://example.com/old': FetchStats(5, 0, 0, 4 * DAY),         # не менялась
+    ...     'https://example.com/new': FetchStats(1, 0, 4 * DAY, 4 * DAY),   # загружалась один раз
+    ... }
+    >>> select(history, 2, 5 * DAY)
+    ['https://example.com/new', 'https://example.com']
+    """
+    rates = {url: change_rate(stats) for url, stats in history.items()}
+    known = [rate for rate in rates.values() if rate is not None]
+    default = sum(known) / len(known) if known else DEFAULT_RATE
+    gains = (
+        (freshness_gain(max(default if rate is None else rate, MIN_RATE), now - history[url].last_fetched, horizon),
+         url)
+        for url, rate in rates.items()
+    )
+    return [url for _, url in heapq.nlargest(budget, gains)]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,157 @@
+import re
+from fnmatch import translate
+from functools import lru_cache
+from typing import Pattern, Sequence, Tuple, Union
+
+try:
+    from .urls import get_base_domain
+except ImportError:
+    from urls import get_base_domain
+
+URL_PATTERN = re.compile(r'(?i)(?:https?)://([^/?#]*)([^?#]*)')    # схема, сетевое расположение и путь
+REGEX_PREFIX = 're:'    # префикс правила-регулярного выражения (проверяется весь URL)
+
+
+def get_host(netloc: str) -> str:
+    """ Получить хост из сетевого расположения URL: без имени пользователя и порта, в нижнем регистре.
+
+    :param netloc: сетевое расположение
+    :type netloc: str
+    :return: хост
+    :rtype: str
+
+    >>> get_host('User@WWW.Example.com:8080'), get_host('[::1]:8080')
+    ('www.example.com', '[::1]')
+    """
+    host = netloc.rpartition('@')[2].lower()
+    if host.startswith('['):
+        return host[:host.find(']') + 1]
+    return host.partition(':')[0]
+
+
+def compile_rules(patterns: Sequence[str]) -> Tuple[Union[Pattern, None], Tuple[str, ...], Union[Pattern, None]]:
+    """ Скомпилировать правила в один шаблон хостов, кортеж префиксов пути и одно регулярное выражение.
+
+    Правило, начинающееся с 're:', - регулярное выражение, которое ищется во всем URL; правило, начинающееся с '/', -
+    префикс пути; остальные правила - шаблоны хоста в синтаксисе fnmatch (*.example.com).
+
+    :param patterns: правила
+    :type patterns: Sequence[str]
+    :return: шаблон хостов, префиксы пути и регулярное выражение (None, если правил этого вида нет)
+    :rtype: Tuple[Union[Pattern, None], Tuple[str, ...], Union[Pattern, None]]
+
+    >>> hosts, prefixes, regex = compile_rules(['*.example.com', '/news/', 're:page=[0-9]+$'])
+    >>> bool(hosts.match('www.example.com')), bool(hosts.match('example.org')), prefixes, regex.pattern
+    (True, False, ('/news/',), '(?:page=[0-9]+$)')
+    """
+    hosts, prefixes, regexes = [], [], []
+    for pattern in patterns:
+        if pattern.startswith(REGEX_PREFIX):
+            regexes.append(f'(?:{pattern[len(REGEX_PREFIX):]})')
+        elif pattern.startswith('/'):
+            prefixes.append(pattern)
+        else:
+            hosts.append(translate(pattern.lower()))
+    return (
+        re.compile('|'.join(hosts)) if hosts else None,
+        tuple(prefixes),
+        re.compile('|'.join(regexes)) if regexes else None,
+    )
+
+
+class Scope:
+    """ Область обхода: какие URL обходчик может загружать.
+
+    По умолчанию в область входят регистрируемый домен начального URL (по списку публичных суффиксов) и его
+    поддомены. Правила включения и исключения компилируются при создании области; решение по хосту запоминается в
+    LRU-кэше, поэтому для большинства ссылок проверка сводится к одному регулярному выражению и поиску в словаре.
+    """
+
+    base_domain: str                    # регистрируемый домен начального URL
+    _url: str                           # URL начала обхода
+    _include: list                      # исходные правила включения
+    _exclude: list                      # исходные правила исключения
+    _cache_size: int                    # размер кэша решений по хостам
+    _include_hosts: Pattern             # шаблон хостов, заменяющий базовый домен (None, если не задан)
+    _include_prefixes: Tuple[str, ...]  # префиксы пути, один из которых должен совпасть
+    _include_regex: Pattern             # регулярное выражение, которое должно найтись в URL
+    _exclude_hosts: Pattern             # шаблон исключенных хостов
+    _exclude_prefixes: Tuple[str, ...]  # исключенные префиксы пути
+    _exclude_regex: Pattern             # регулярное выражение исключенных URL
+
+    def __init__(self, url: str, include: Sequence[str] = (), exclude: Sequence[str] = (), cache_size: int = 4096):
+        """ Инициализация области обхода.
+
+        :param url: URL начала обхода
+        :type url: str
+        :param include: правила включения (шаблоны хоста, префиксы пути, 're:<регулярное выражение>'). Шаблоны хоста
+            заменяют базовый домен; если заданы префиксы или регулярные выражения, URL должен совпасть хотя бы с одним
+            из них, defaults to ()
+        :type include: Sequence[str], optional
+        :param exclude: правила исключения того же вида: URL, совпавший с любым из них, не входит в область,
+            defaults to ()
+        :type exclude: Sequence[str], optional
+        :param cache_size: число хостов, решения по которым запоминаются, defaults to 4096
+        :type cache_size: int, optional
+        """
+        self.base_domain = get_base_domain(url)
+        self._url = url
+        self._include = list(include)
+        self._exclude = list(exclude)
+        self._cache_size = cache_size
+        self._include_hosts, self._include_prefixes, self._include_regex = compile_rules(include)
+        self._exclude_hosts, self._exclude_prefixes, self._exclude_regex = compile_rules(exclude)
+        self.allows_netloc = lru_cache(maxsize=cache_size)(self._allows_netloc)
+
+    def __reduce__(self):
+        # скомпилированные правила и кэш не передаются между процессами: область создается заново
+        return type(self), (self._url, self._include, self._exclude, self._cache_size)
+
+    def _allows_netloc(self, netloc: str) -> bool:
+        host = get_host(netloc)
+        if self._exclude_hosts is not None and self._exclude_hosts.match(host):
+            return False
+        if self._include_hosts is not None:
+            return self._include_hosts.match(host) is not None
+        return host == self.base_domain or host.endswith('.' + self.base_domain)
+
+    def allows(self, url: str) -> bool:
+        """ Проверить, входит ли абсолютный URL в область обхода. Допускаются только схемы http и https.
+
+        :param url: URL
+        :type url: str
+        :return: True, если URL входит в область
+        :rtype: bool
+
+        >>> scope = Scope('https://news.bbc.co.uk', exclude=['/sport/', 're:[?&]page='])
+        >>> scope.allows('https://www.bbc.co.uk/news'), scope.allows('https://www.itv.co.uk/')
+        (True, False)
+        >>> scope.allows('https://bbc.co.uk/sport/1'), scope.allows('https://bbc.co.uk/?page=2')
+        (False, False)
+        >>> scope.allows('mailto:news@bbc.co.uk'), scope.allows('https://evilbbc.co.uk')
+        (False, False)
+        >>> scope = Scope('https://example.com', include=['example.com', 'docs.example.org', '/api/'])
+        >>> scope.allows('https://example.com/api/v1'), scope.allows('https://docs.example.org/api/')
+        (True, True)
+        >>> scope.allows('https://www.example.com/api/'), scope.allows('https://example.com/blog')
+        (False, False)
+        """
+        match = URL_PATTERN.match(url)
+        if match is None or not self.allows_netloc(match.group(1)):
+            return False
+        path = match.group(2) or '/'
+        if self._exclude_prefixes and path.startswith(self._exclude_prefixes):
+            return False
+        if self._exclude_regex is not None and self._exclude_regex.search(url):
+            return False
+        if not self._include_prefixes and self._include_regex is None:
+            return True
+        return bool(
+            self._include_prefixes and path.startswith(self._include_prefixes)
+            or self._include_regex is not None and self._include_regex.search(url)
+        )
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
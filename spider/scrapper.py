@@ -1,11 +1,91 @@
 import sys
-from asyncio import Task, gather, sleep, TimeoutError
-from typing import List, Tuple, Union
+from asyncio import FIRST_COMPLETED, Task, gather, sleep, TimeoutError, wait
+from contextlib import nullcontext
+from random import Random
+from time import perf_counter, time
+from typing import Dict, List, NamedTuple, Sequence, Set, Tuple, Union, TYPE_CHECKING
 from urllib.parse import urljoin, urlparse
 
 from aiohttp import ClientSession
 from aiohttp.client_exceptions import ClientError
 from bs4 import BeautifulSoup, Tag
+from yarl import URL
+
+try:
+    from .estimate import SAMPLE, LevelSample, SiteSample
+    from .extractors import Pipeline, canonical, visible_text
+    from .frontier import Frontier, UrlSet
+    from .resolver import CachingResolver
+    from .revisit import content_hash
+    from .scope import Scope
+    from .throttle import NullSlot, Slot, Throttle
+    from .traps import TrapDetector
+    from .urls import doctor, get_base_domain, rel2abs, resolve_links
+except ImportError:
+    from estimate import SAMPLE, LevelSample, SiteSample
+    from extractors import Pipeline, canonical, visible_text
+    from frontier import Frontier, UrlSet
+    from resolver import CachingResolver
+    from revisit import content_hash
+    from scope import Scope
+    from throttle import NullSlot, Slot, Throttle
+    from traps import TrapDetector
+    from urls import doctor, get_base_domain, rel2abs, resolve_links
+
+if TYPE_CHECKING:
+    try:
+        from .db import DB
+        from .metrics import Metrics
+        from .profiler import StageProfiler
+    except ImportError:
+        from db import DB
+        from metrics import Metrics
+        from profiler import StageProfiler
+
+NO_STAGE = nullcontext()    # заглушка замера этапа, если профайлер не используется
+NO_SLOT = NullSlot()        # заглушка места запроса, если регулятор одновременных запросов не используется
+NOINDEX = 'noindex'         # директива robots: страницу не сохранять
+NOFOLLOW = 'nofollow'       # директива robots: ссылки страницы не обходить
+
+
+class Fetched(NamedTuple):
+    """ Полученная страница. """
+
+    content: str            # HTML
+    url: str                # конечный URL ответа (после перенаправлений)
+    redirects: List[str]    # URL цепочки перенаправлений, начиная с запрошенного (пустой, если их не было)
+    robots: str             # значение заголовка X-Robots-Tag
+    size: int               # размер тела ответа в байтах
+
+
+class CrawlLimits(NamedTuple):
+    """ Пределы обхода: после достижения любого из них новые страницы не загружаются. """
+
+    max_time: float = None  # длительность обхода в секундах
+    max_pages: int = None   # число загружаемых страниц
+    max_bytes: int = None   # объем тел ответов в байтах
+
+    def exceeded(self, elapsed: float, pages: int, size: int) -> Union[str, None]:
+        """ Проверить пределы.
+
+        :param elapsed: время с начала обхода в секундах
+        :type elapsed: float
+        :param pages: число страниц, загрузка которых начата
+        :type pages: int
+        :param size: объем полученных тел ответов в байтах
+        :type size: int
+        :return: имя достигнутого предела (max_time, max_pages или max_bytes) или None
+        :rtype: Union[str, None]
+
+        >>> limits = CrawlLimits(max_pages=10, max_bytes=1000)
+        >>> limits.exceeded(3600, 9, 999), limits.exceeded(1, 10, 0), limits.exceeded(1, 0, 1000)
+        (None, 'max_pages', 'max_bytes')
+        """
+        for name, value in (('max_time', elapsed), ('max_pages', pages), ('max_bytes', size)):
+            limit = getattr(self, name)
+            if limit is not None and value >= limit:
+                return name
+        return None
 
 
 class Scrapper:
@@ -14,95 +94,92 @@ class Scrapper:
     SLEEP_TIME = 0.5    # время между попытками подключения
     TIMEOUT = 3         # таймаут подключения
     FLUSH_SIZE = 100    # число записей, при достижении которого данные записываются в базу
+    CONCURRENCY = 100   # число страниц, обрабатываемых одновременно при обходе через очередь обхода
 
-    _base_domain: str                   # домен второго уровня, с которым происходит работа
-    _scrapped_urls: set                 # множество URl, контент которых получен (или была попытка получения)
-    _known_urls: set                    # множество URl, которые находятся в очереди на обработку
+    _scope: Scope                       # область обхода (базовый домен и правила включения и исключения)
+    _scrapped_urls: Union[set, UrlSet]  # множество URl, контент которых получен (или была попытка получения)
+    _known_urls: Union[set, UrlSet]     # множество URl, которые находятся в очереди на обработку
     _session: ClientSession             # клиент, отправляющий запросы
     _db: 'DB'                           # клиент БД
-    _data: List[Tuple[str, str, str]]   # данные для записи в БД
+    _data: List[tuple]                  # данные для записи в БД (кортежи с полями RECORD_FIELDS)
+    _metrics: 'Metrics'                 # реестр метрик (None, если метрики не собираются)
+    _profiler: 'StageProfiler'          # профайлер этапов (None, если профилирование выключено)
+    _edges: List[Tuple[str, str]]       # ребра графа ссылок для записи в БД (None, если граф не сохраняется)
+    _fetches: List[Tuple[str, float, str]]  # загрузки для истории в БД (None, если история не сохраняется)
+    _versions: List[Tuple[str, float, str]]  # версии страниц для записи в БД (None, если версии не сохраняются)
+    _priorities: Dict[str, float]       # приоритеты URL: ссылки с большим приоритетом ставятся в очередь раньше
+    _pipeline: Pipeline                 # извлекатели данных страниц (None, если данные не извлекаются)
+    _traps: TrapDetector                # детектор ловушек обходчика (None, если ловушки не отслеживаются)
+    _throttle: Throttle                 # регулятор числа одновременных запросов (None - число не ограничено)
+    _frontier: Frontier                 # очередь обхода (None - ссылки обходятся рекурсивно задачами asyncio)
+    _resolver: CachingResolver          # резолвер с кэшем и опережающим разрешением имен (None - не используется)
+    _limits: CrawlLimits                # пределы обхода (None - обход не ограничен)
+    _started: float                     # момент начала обхода (perf_counter)
+    _pages: int = 0                     # число страниц, загрузка которых начата
+    _bytes: int = 0                     # объем полученных тел ответов в байтах
+    stopped: str = None                 # причина остановки обхода: достигнутый предел или signal (None - обход идет)
     _total: int = 1                     # общее число задач
     _done: int = 0                      # число выполненных задач
     _message: str = ''                  # статус-сообщение
     stat: dict                          # словарь со статистикой задач
 
-    @staticmethod
-    def doctor(url: str) -> str:
-        """ Простая нормализация домена (убирает фрагмент и завершающий слэш).
+    # функции работы с URL вынесены в модуль urls, чтобы команды без обхода не импортировали aiohttp и bs4
+    doctor = staticmethod(doctor)
+    get_base_domain = staticmethod(get_base_domain)
+    rel2abs = staticmethod(rel2abs)
 
-        :param url: входной URL
-        :type url: str
-        :return: нормализованный URL
-        :rtype: str
-
-        >>> Scrapper.doctor('https://example.com#frag')
-        'https://example.com'
-        >>> Scrapper.doctor('https://example.com/')
-        'https://example.com'
-        >>> Scrapper.doctor('https://example.com/#frag')
-        'https://example.com'
-        >>> Scrapper.doctor('https://example.com')
-        'https://example.com'
+    @staticmethod
+    def get_robots(soup: BeautifulSoup, header: str = '') -> Set[str]:
+        """ Получить директивы robots страницы из тэгов <meta name="robots"> и заголовка X-Robots-Tag.
+
+        Директивы заголовка, относящиеся к конкретному обходчику (googlebot: noindex), не учитываются, директива none
+        равнозначна noindex и nofollow.
+
+        :param soup: разобранная страница
+        :type soup: BeautifulSoup
+        :param header: значение заголовка X-Robots-Tag, defaults to ''
+        :type header: str, optional
+        :return: директивы в нижнем регистре
+        :rtype: Set[str]
+
+        >>> soup = BeautifulSoup('<meta name="Robots" content="NoIndex, follow">', 'lxml')
+        >>> sorted(Scrapper.get_robots(soup)), sorted(Scrapper.get_robots(soup, 'none, googlebot: noarchive'))
+        (['follow', 'noindex'], ['follow', 'nofollow', 'noindex'])
         """
-        if '#' in url:
-            url = url[:url.find('#')]
-        url = url.strip('/')
-        return url
+        values = [header] + [
+            tag.get('content', '') for tag in (soup.head or soup).find_all('meta', attrs={'name': True})
+            if tag['name'].lower() == 'robots'
+        ]
+        directives = set()
+        for value in values:
+            for directive in value.lower().split(','):
+                directive = directive.strip()
+                if directive == 'none':
+                    directives.update((NOINDEX, NOFOLLOW))
+                elif directive and ':' not in directive:
+                    directives.add(directive)
+        return directives
 
     @staticmethod
-    def get_base_domain(url: str) -> str:
-        """ Получить домен второго уровня для URL.
+    def get_text(soup: BeautifulSoup) -> str:
+        """ Получить видимый текст страницы (текст тела страницы без скриптов, стилей и комментариев).
 
-        :param url: URL
-        :type url: str
-        :return: домен второго уровня
+        :param soup: разобранная страница
+        :type soup: BeautifulSoup
+        :return: текст, фрагменты которого разделены пробелами
         :rtype: str
 
-        >>> Scrapper.get_base_domain('https://up.example.com')
-        'example.com'
-        >>> Scrapper.get_base_domain('https://example.com/')
-        'example.com'
-        >>> Scrapper.get_base_domain('https://example.com/some/path')
-        'example.com'
-        >>> Scrapper.get_base_domain('https://example.com/some/path/')
-        'example.com'
-        >>> Scrapper.get_base_domain('https://example.com/some/path/?key=value')
-        'example.com'
-        >>> Scrapper.get_base_domain('https://example.com/some/path/?key=value#frag')
-        'example.com'
-        """
-        url = urlparse(url)
-        netloc = url.netloc
-        return netloc.split('.', netloc.count('.') - 1)[-1]
-
-    @staticmethod
-    def rel2abs(path: str, base: str) -> str:
-        """ Сформировать абсолютную ссылку из относительной.
-
-        :param path: относительный путь
-        :type path: str
-        :param base: базовый URL
-        :type base: str
-        :return: абсолютная ссылка
-        :rtype: str
-        >>> Scrapper.rel2abs('/some/path', 'https://up.example.com')
-        'https://up.example.com/some/path'
-        >>> Scrapper.rel2abs('/some/path', 'https://example.com/')
-        'https://example.com/some/path'
-        >>> Scrapper.rel2abs('/some/path', 'https://example.com/another/path')
-        'https://example.com/some/path'
-        >>> Scrapper.rel2abs('/some/path', 'https://example.com/another/path/')
-        'https://example.com/some/path'
-        >>> Scrapper.rel2abs('/some/path', 'https://example.com/another/path/?key=value')
-        'https://example.com/some/path'
-        >>> Scrapper.rel2abs('/some/path', 'https://example.com/another/path/?key=value#frag')
-        'https://example.com/some/path'
+        >>> html = '<html><title>t</title><body><p>Hello,</p><script>x()</script><!-- c --><b> world </b></body></html>'
+        >>> Scrapper.get_text(BeautifulSoup(html, 'lxml'))
+        'Hello, world'
         """
-        base = urlparse(base)
-        base = '://'.join((base.scheme, base.netloc))
-        return urljoin(base, path)
+        return visible_text(soup.body or soup)
 
-    def __init__(self, url: str, session: ClientSession, db: 'DB'):
+    def __init__(self, url: str, session: ClientSession, db: 'DB', metrics: 'Metrics' = None,
+                 profiler: 'StageProfiler' = None, store_links: bool = False, priorities: Dict[str, float] = None,
+                 scope: Scope = None, pipeline: Pipeline = None, traps: TrapDetector = None,
+                 throttle: Throttle = None, history: bool = False, versions: bool = False,
+                 frontier: Frontier = None, resolver: CachingResolver = None, limits: CrawlLimits = None):
         """ Инициализация скраппера.
 
         :param url: URL, с которого начинается обход. На основе этого URL будет получен базовый домен
@@ -111,46 +188,132 @@ class Scrapper:
         :type session: ClientSession
         :param db: клиент для работы с БД
         :type db: DB
+        :param metrics: реестр метрик, defaults to None
+        :type metrics: Metrics, optional
+        :param profiler: профайлер этапов обработки страниц, defaults to None
+        :type profiler: StageProfiler, optional
+        :param store_links: сохранять граф ссылок (ссылки извлекаются и на страницах последнего уровня обхода),
+            defaults to False
+        :type store_links: bool, optional
+        :param priorities: приоритеты URL (например, PageRank предыдущего обхода), defaults to None
+        :type priorities: Dict[str, float], optional
+        :param scope: область обхода, defaults to None (регистрируемый домен URL и его поддомены)
+        :type scope: Scope, optional
+        :param pipeline: извлекатели данных страниц (описание, канонический URL, OpenGraph и т.д.), результаты
+            записываются в поле extracted, defaults to None
+        :type pipeline: Pipeline, optional
+        :param traps: детектор ловушек обходчика (календари, идентификаторы сессий, бесконечные пути), defaults to None
+        :type traps: TrapDetector, optional
+        :param throttle: регулятор числа одновременных запросов по хостам и в целом, defaults to None (число не
+            ограничено)
+        :type throttle: Throttle, optional
+        :param history: сохранять историю загрузок (время и хэш текста страницы) для планирования повторных
+            загрузок, defaults to False
+        :type history: bool, optional
+        :param versions: сохранять версии HTML страниц (дельтами относительно предыдущих версий), defaults to False
+        :type versions: bool, optional
+        :param frontier: очередь обхода, ограничивающая расход памяти (обход запускается методом crawl), множества
+            посещенных и известных URL хранят отпечатки вместо строк, defaults to None
+        :type frontier: Frontier, optional
+        :param resolver: резолвер сессии: имена хостов новых ссылок разрешаются заранее, ссылки на хосты, имя которых
+            не разрешается, отбрасываются, defaults to None
+        :type resolver: CachingResolver, optional
+        :param limits: пределы времени, числа страниц и объема загрузки: после достижения предела загружаемые страницы
+            обрабатываются, новые не загружаются, defaults to None
+        :type limits: CrawlLimits, optional
         """
-        self._base_domain = self.get_base_domain(url)
-        self._scrapped_urls = set()
-        self._known_urls = set()
+        self._scope = scope or Scope(url)
+        self._frontier = frontier
+        self._scrapped_urls = set() if frontier is None else UrlSet()
+        self._known_urls = set() if frontier is None else frontier.seen
         self._session = session
         self._db = db
         self._data = []
+        self._metrics = metrics
+        self._profiler = profiler
+        self._edges = [] if store_links else None
+        self._fetches = [] if history else None
+        self._versions = [] if versions else None
+        self._priorities = priorities or {}
+        self._pipeline = pipeline
+        self._traps = traps
+        self._throttle = throttle
+        self._resolver = resolver
+        self._limits = limits
+        self._started = perf_counter()
         self.stat = {}
 
     def clear_message(self):
         """ Вспомогательный метод для очистки статусного сообщения. """
+        if not self._message:
+            return
         sys.stdout.write('\b' * len(self._message))
         sys.stdout.flush()
 
     def print_message(self):
-        """ Вспомогательный метод для вывода статусного сообщения. """
+        """ Вспомогательный метод для вывода статусного сообщения.
+
+        Сообщение выводится только в терминал: в журналах контейнеров строка с возвратами каретки бесполезна, для них
+        предназначен JSON-журнал метрик.
+        """
+        if self._metrics is not None:
+            self._metrics.set('spider_queue_depth', self._total - self._done)
+        if not sys.stdout.isatty():
+            return
         self.clear_message()
         self._message = f'{self._done}/{self._total} ({self._done/self._total:.2%}) tasks done.'
         sys.stdout.write(self._message)
         sys.stdout.flush()
 
+    def progress(self) -> Tuple[int, int]:
+        """ Получить число выполненных задач и общее число задач.
+
+        :return: (выполнено, всего)
+        :rtype: Tuple[int, int]
+        """
+        return self._done, self._total
+
+    def stage(self, name: str):
+        """ Получить контекстный менеджер, замеряющий длительность этапа обработки.
+
+        :param name: имя этапа
+        :type name: str
+        :return: контекстный менеджер
+        """
+        if self._profiler is None:
+            return NO_STAGE
+        return self._profiler.stage(name)
+
+    def slot(self, url: str) -> Union[Slot, NullSlot]:
+        """ Получить место для запроса в лимитах регулятора. Решения регулятора учитываются в статистике (ключ
+        throttle).
+
+        :param url: URL запроса
+        :type url: str
+        :return: асинхронный контекстный менеджер; статус ответа записывается в его атрибут status
+        :rtype: Union[Slot, NullSlot]
+        """
+        if self._throttle is None:
+            return NO_SLOT
+        return self._throttle.slot(urlparse(url).netloc, self.stat)
+
     def is_subdomain(self, url: str) -> bool:
-        """ Проверка того, что URL относится к базовому домену или его поддомену.
+        """ Проверка того, что URL входит в область обхода (по умолчанию - относится к базовому домену или его
+        поддомену).
 
         :param url: URL
         :type url: str
-        :return: True, если URL относится к базовому домену или его поддомену, иначе False
+        :return: True, если URL входит в область обхода, иначе False
         :rtype: bool
         """
-        url = urlparse(url)
-        if not url.netloc.endswith(self._base_domain):
-            return False
-        prefix = url.netloc[:-len(self._base_domain)]
-        if not prefix:
-            return True
-        return prefix[-1] == '.'
+        return self._scope.allows(url)
 
-    async def get_content(self, url: str) -> Union[str, None]:
+    async def get_content(self, url: str) -> Union[Fetched, None]:
         """ Получить контент, соответствующий URL.
 
+        Перенаправления выполняются и для HEAD, и для GET; вместе с контентом возвращаются конечный URL и цепочка
+        перенаправлений.
+
         Если Content-Type страницы не является text/html, то возвращается None.
         Если при получении контента произошла ошибка UnicodeDecodeError, то возвращается None.
         Если после нескольких попыток не удалось получить контент (были вызваны исключения ServerConnectionError или
@@ -158,23 +321,41 @@ class Scrapper:
 
         :param url: URL
         :type url: str
-        :return: HTML, относящийся к URL или None
-        :rtype: Union[str, None]
+        :return: HTML, относящийся к URL, конечный URL, перенаправления и X-Robots-Tag или None
+        :rtype: Union[Fetched, None]
         """
+        if self._metrics is None:
+            return await self._get_content(url)
+
+        host = urlparse(url).netloc
+        self._metrics.inc('spider_in_flight', host=host)
+        try:
+            return await self._get_content(url)
+        finally:
+            self._metrics.inc('spider_in_flight', -1, host=host)
+
+    async def _get_content(self, url: str) -> Union[Fetched, None]:
 
         # проверяем тип контента
         for attempt in range(self.MAX_ATTEMPTS):
 
             try:
-                async with self._session.head(url, timeout=self.TIMEOUT) as head:
-                    content_type = head.headers.get('Content-Type', '')
-                    if not content_type.startswith('text/html'):
-                        self.stat['wrong_content_type'] = self.stat.get('wrong_content_type', {})
-                        wrong_content_type = self.stat['wrong_content_type']
-                        wrong_content_type[content_type] = wrong_content_type.get(content_type, 0) + 1
+                # время ответа замеряется после получения места: ожидание в очереди регулятора в него не входит
+                async with self.slot(url) as slot:
+                    if attempt == 0 and not self.admit():
                         return None
-                    else:
-                        break
+                    started = perf_counter()
+                    async with self._session.head(url, timeout=self.TIMEOUT, allow_redirects=True) as head:
+                        slot.status = head.status
+                        self.observe_response('HEAD', head.status, started)
+                        content_type = head.headers.get('Content-Type', '')
+                if not content_type.startswith('text/html'):
+                    self.stat['wrong_content_type'] = self.stat.get('wrong_content_type', {})
+                    wrong_content_type = self.stat['wrong_content_type']
+                    wrong_content_type[content_type] = wrong_content_type.get(content_type, 0) + 1
+                    return None
+                else:
+                    break
 
             except (ClientError, TimeoutError):
                 if attempt < self.MAX_ATTEMPTS - 1:
@@ -188,12 +369,28 @@ class Scrapper:
         for attempt in range(self.MAX_ATTEMPTS):
 
             try:
-                async with self._session.get(url, timeout=self.TIMEOUT) as response:
-                    try:
-                        return await response.text()
-                    except UnicodeDecodeError:
-                        self.stat['unicode_decode_error'] = self.stat.get('unicode_decode_error', 0) + 1
-                        return None
+                async with self.slot(url) as slot:
+                    started = perf_counter()
+                    async with self._session.get(url, timeout=self.TIMEOUT) as response:
+                        slot.status = response.status
+                        try:
+                            body = await response.read()
+                            self._bytes += len(body)
+                            self.observe_response('GET', response.status, started)
+                            if self._metrics is not None:
+                                self._metrics.observe('spider_response_bytes', len(body))
+                            with self.stage('decode'):
+                                content = body.decode(response.get_encoding())
+                            final = str(response.url)
+                            redirects = [str(hop.url) for hop in response.history]
+                            # ответ из кэша не хранит цепочку перенаправлений, известен только конечный URL
+                            if not redirects and final != str(URL(url)):
+                                redirects = [url]
+                            return Fetched(content, final if redirects else url, redirects,
+                                           response.headers.get('X-Robots-Tag', ''), len(body))
+                        except UnicodeDecodeError:
+                            self.stat['unicode_decode_error'] = self.stat.get('unicode_decode_error', 0) + 1
+                            return None
 
             except (ClientError, TimeoutError):
                 if attempt < self.MAX_ATTEMPTS - 1:
@@ -202,12 +399,50 @@ class Scrapper:
         self.stat['connection_error'] = self.stat.get('connection_error', 0) + 1
         return None
 
+    def observe_response(self, method: str, status: int, started: float):
+        """ Учесть в метриках и профайлере время ответа и его статус.
+
+        :param method: HTTP-метод
+        :type method: str
+        :param status: статус ответа
+        :type status: int
+        :param started: момент отправки запроса (perf_counter)
+        :type started: float
+        """
+        elapsed = perf_counter() - started
+        if self._profiler is not None:
+            self._profiler.record(method.lower(), elapsed)
+        if self._metrics is None:
+            return
+        self._metrics.observe('spider_fetch_seconds', elapsed, method=method)
+        self._metrics.inc('spider_responses_total', method=method, status=str(status))
+
     async def flush(self):
         """ Записать данные в БД. """
         if len(self._data):
             flushed_data = self._data
             self._data = []
-            await self._db.add_records(flushed_data)
+            started = perf_counter()
+            with self.stage('flush'):
+                await self._db.add_records(flushed_data)
+            if self._metrics is not None:
+                self._metrics.observe('spider_flush_seconds', perf_counter() - started)
+                self._metrics.inc('spider_flushed_records_total', len(flushed_data))
+        if self._edges:
+            flushed_edges = self._edges
+            self._edges = []
+            with self.stage('flush'):
+                await self._db.add_links(flushed_edges)
+        if self._fetches:
+            flushed_fetches = self._fetches
+            self._fetches = []
+            with self.stage('flush'):
+                await self._db.add_fetches(flushed_fetches)
+        if self._versions:
+            flushed_versions = self._versions
+            self._versions = []
+            with self.stage('flush'):
+                await self._db.add_versions(flushed_versions)
 
     async def scrape(self, url: str, depth: int = 0):
         """ Получить контент страницы.
@@ -227,57 +462,398 @@ class Scrapper:
             self.stat['scrapped'] = self.stat.get('scrapped', 0) + 1
             return
 
+        # после остановки обхода новые страницы не загружаются, уже загружаемые обрабатываются до конца
+        if self.check_limits():
+            self._done += 1
+            self.stat['skipped'] = self.stat.get('skipped', 0) + 1
+            return
+
         # переносим URL из множества URL, находящихся в очереди в множество посещенных URL
         self._scrapped_urls.add(url)
         self._known_urls.discard(url)
 
+        # имя хоста разрешается до получения места у регулятора: хост, имя которого не разрешается, места не занимает
+        if self._resolver is not None and not await self._resolver.ensure(urlparse(url).hostname):
+            self.stat['unresolved'] = self.stat.get('unresolved', 0) + 1
+            self._done += 1
+            return
+
         # получаем контент
-        content = await self.get_content(url)
+        response = await self.get_content(url)
 
         # если контент не получен, то завершаем выполнение задачи
-        if not content:
+        if response is None or not response.content:
             self._done += 1
             return
+        content = response.content
+
+        # если запрос перенаправлен, то страница хранится под конечным URL. Конечный URL отмечается посещенным, чтобы
+        # ссылки на него не загружались повторно; если он уже посещен или вне области обхода, страница пропускается
+        if response.redirects:
+            final_url = self.doctor(response.url)
+            if final_url != url:
+                if not self.is_subdomain(final_url):
+                    self.stat['redirected_out'] = self.stat.get('redirected_out', 0) + 1
+                    self._done += 1
+                    return
+                if final_url in self._scrapped_urls:
+                    self.stat['duplicate'] = self.stat.get('duplicate', 0) + 1
+                    self._done += 1
+                    return
+                self._scrapped_urls.add(final_url)
+                self._known_urls.discard(final_url)
+                url = final_url
 
         # запускаем парсер контента, извлекает заголовок
-        soup = BeautifulSoup(content, 'lxml')
+        started = perf_counter()
+        with self.stage('parse'):
+            soup = BeautifulSoup(content, 'lxml')
+        if self._metrics is not None:
+            self._metrics.observe('spider_parse_seconds', perf_counter() - started)
+
+        # канонический URL отмечается посещенным, чтобы его псевдонимы не загружались и не сохранялись повторно.
+        # Если канонический URL уже посещен, то страница - его дубликат, и она пропускается
+        canonical_url = canonical(soup, url)
+        if canonical_url is not None:
+            canonical_url = self.doctor(canonical_url)
+            if canonical_url != url and self.is_subdomain(canonical_url):
+                if canonical_url in self._scrapped_urls:
+                    self.stat['duplicate'] = self.stat.get('duplicate', 0) + 1
+                    self._done += 1
+                    return
+                self._scrapped_urls.add(canonical_url)
+                self._known_urls.discard(canonical_url)
+
+        robots = self.get_robots(soup, response.robots)
+
         title = soup.title
         if title is None:
             title = ''
         else:
             title = title.text
 
-        # добавляем данные для запись в БД
-        self._data.append((url, title, content))
+        # извлекаем видимый текст для полнотекстового поиска
+        with self.stage('text'):
+            text = self.get_text(soup)
+
+        # запоминаем загрузку: изменение определяется при записи в БД сравнением с хэшем предыдущей загрузки
+        if self._fetches is not None:
+            self._fetches.append((url, time(), content_hash(f'{title}\n{text}')))
+
+        # извлекаем данные страницы из того же дерева, страница повторно не разбирается
+        extracted = None
+        if self._pipeline is not None:
+            with self.stage('extract'):
+                extracted = self._pipeline.run(soup, url, self.stat)
+
+        # новизна текста учитывается для шаблона URL страницы: почти одинаковые страницы выдают ловушку
+        if self._traps is not None:
+            self._traps.observe(url, text)
+
+        # добавляем данные для запись в БД (страница с директивой noindex не сохраняется)
+        if NOINDEX in robots:
+            self.stat['noindex'] = self.stat.get('noindex', 0) + 1
+        else:
+            self._data.append((url, title, content, text, extracted, canonical_url, response.redirects or None))
+            if self._versions is not None:
+                self._versions.append((url, time(), content))
 
         # если данных достаточно много, записываем из в БД
         if len(self._data) >= self.FLUSH_SIZE:
             await self.flush()
 
+        # ссылки страницы с директивой nofollow не обходятся и не попадают в граф ссылок
+        if NOFOLLOW in robots:
+            self.stat['nofollow'] = self.stat.get('nofollow', 0) + 1
+            depth = 0
+            links = []
+
         # если требуется обход в глубину, то парсим ссылки и ставим задачи
+        # если сохраняется граф ссылок, то ссылки нужны и на последнем уровне обхода
+        elif depth > 0 or self._edges is not None:
+            with self.stage('links'):
+                links = self.extract_links(soup, url)
+            if self._edges is not None:
+                self._edges.extend((url, link) for link in links if link != url)
+
         if depth > 0:
 
-            links = (tag for tag in soup.find_all('a'))
-            links = (self.check_link(tag, url) for tag in links)
-            links = {link for link in links if link is not None}
+            links = set(links)
             links -= self._scrapped_urls
             links -= self._known_urls
+            links = self.check_traps(links)
+            links = self.route(links, depth - 1)
+            links = self.check_hosts(links)
 
             soup = None
 
             if links:
                 self._total += len(links)
-                self._known_urls ^= links
-                links = (Task(self.scrape(link, depth-1)) for link in links)
-                await gather(*links)
+                # очередь обхода сама запоминает добавленные URL, ссылки обработает crawl
+                if self._frontier is not None:
+                    for link in links:
+                        self._frontier.push(link, depth - 1, self._priorities.get(link, 0))
+                else:
+                    self._known_urls ^= links
+                    if self._priorities:
+                        links = sorted(links, key=lambda link: self._priorities.get(link, 0), reverse=True)
+                    links = (Task(self.scrape(link, depth-1)) for link in links)
+                    await gather(*links)
 
         # задача выполнена, обновляем статусное сообщение
         self.stat['done'] = self.stat.get('done', 0) + 1
         self._done += 1
         self.print_message()
 
+    def check_traps(self, links: Set[str]) -> Set[str]:
+        """ Отбросить новые ссылки, похожие на ловушки обходчика.
+
+        Число отброшенных ссылок учитывается в статистике (ключ trapped, по причинам).
+
+        :param links: множество новых ссылок
+        :type links: Set[str]
+        :return: множество ссылок, которые можно поставить в очередь
+        :rtype: Set[str]
+        """
+        if self._traps is None:
+            return links
+        accepted = set()
+        for link in links:
+            reason = self._traps.check(link)
+            if reason is None:
+                accepted.add(link)
+            else:
+                trapped = self.stat.setdefault('trapped', {})
+                trapped[reason] = trapped.get(reason, 0) + 1
+        return accepted
+
+    def check_limits(self) -> bool:
+        """ Проверить, остановлен ли обход (сигналом или достижением предела обхода).
+
+        :return: True, если обход остановлен
+        :rtype: bool
+        """
+        if self.stopped is None and self._limits is not None:
+            self.stop(self._limits.exceeded(perf_counter() - self._started, self._pages, self._bytes))
+        return self.stopped is not None
+
+    def admit(self) -> bool:
+        """ Проверить, можно ли начать загрузку страницы, и учесть ее в пределе числа страниц.
+
+        Вызывается, когда место для первого запроса страницы получено: между проверкой и учетом нет ожидания, поэтому
+        одновременные загрузки не превышают предел числа страниц, а страницы, ждавшие места в очереди регулятора, не
+        загружаются после остановки.
+
+        :return: True, если загрузку можно начать
+        :rtype: bool
+        """
+        if self.check_limits():
+            self.stat['skipped'] = self.stat.get('skipped', 0) + 1
+            return False
+        self._pages += 1
+        return True
+
+    def stop(self, reason: Union[str, None] = 'signal'):
+        """ Остановить обход: новые страницы не загружаются, загружаемые обрабатываются до конца. Первая причина
+        остановки записывается в статистику (ключ stopped).
+
+        :param reason: причина остановки (None - не останавливать), defaults to 'signal'
+        :type reason: Union[str, None], optional
+        """
+        if reason is None or self.stopped is not None:
+            return
+        self.stopped = reason
+        self.stat['stopped'] = reason
+
+    def summary(self) -> dict:
+        """ Получить сводку обхода.
+
+        :return: число загруженных страниц, объем тел ответов в байтах, длительность в секундах, причина остановки
+            (None, если обход завершен полностью) и статистика
+        :rtype: dict
+        """
+        return {'pages': self._pages, 'bytes': self._bytes, 'seconds': round(perf_counter() - self._started, 3),
+                'stopped': self.stopped, 'stat': self.stat}
+
+    def check_hosts(self, links: Set[str]) -> Set[str]:
+        """ Отбросить ссылки на хосты, имя которых не разрешается, и начать разрешение имен новых хостов.
+
+        Число отброшенных ссылок учитывается в статистике (ключ unresolved).
+
+        :param links: множество новых ссылок
+        :type links: Set[str]
+        :return: множество ссылок, которые можно поставить в очередь
+        :rtype: Set[str]
+        """
+        if self._resolver is None:
+            return links
+        accepted = set()
+        hosts = set()
+        for link in links:
+            host = urlparse(link).hostname
+            if self._resolver.check(host) is False:
+                self.stat['unresolved'] = self.stat.get('unresolved', 0) + 1
+            else:
+                accepted.add(link)
+                hosts.add(host)
+        self._resolver.prefetch(hosts)
+        return accepted
+
+    async def crawl(self, url: str, depth: int = 0, concurrency: int = CONCURRENCY):
+        """ Обойти сайт.
+
+        Без очереди обхода вызывается scrape: задачи для ссылок создаются сразу, и при большом обходе память
+        расходуется на задачи и множества URL. С очередью обхода ссылки только ставятся в очередь (лишнее выгружается на
+        диск), а страницы обрабатывают не больше concurrency задач одновременно.
+
+        :param url: URL начала обхода
+        :type url: str
+        :param depth: уровень глубины обхода, defaults to 0
+        :type depth: int, optional
+        :param concurrency: число страниц, обрабатываемых одновременно (только с очередью обхода),
+            defaults to CONCURRENCY
+        :type concurrency: int, optional
+        """
+        if self._frontier is None:
+            await self.scrape(url, depth)
+            return
+        self._frontier.push(url, depth)
+        tasks = set()
+        try:
+            while tasks or len(self._frontier) and self.stopped is None:
+                while len(tasks) < concurrency and len(self._frontier) and self.stopped is None:
+                    tasks.add(Task(self.scrape(*self._frontier.pop())))
+                done, tasks = await wait(tasks, return_when=FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+        # после остановки оставшиеся в очереди URL не загружаются
+        if len(self._frontier):
+            self.stat['skipped'] = self.stat.get('skipped', 0) + len(self._frontier)
+            self._done += len(self._frontier)
+
+    async def revisit(self, urls: Sequence[str]):
+        """ Повторно загрузить страницы, не обходя их ссылки.
+
+        :param urls: URL страниц
+        :type urls: Sequence[str]
+        """
+        self._total = self._done + len(urls)
+        await gather(*(self.scrape(url) for url in urls))
+
+    async def sample(self, url: str, depth: int = 0, size: int = SAMPLE, rng: Random = None) -> SiteSample:
+        """ Выборочно обойти сайт для оценки его размера (модуль estimate).
+
+        Уровни обходятся по очереди: с уровня загружается случайная выборка не больше size страниц, ссылки страниц
+        выборки, не найденные на предыдущих уровнях, образуют следующий уровень. Данные в БД не записываются.
+
+        :param url: URL начала обхода
+        :type url: str
+        :param depth: уровень глубины обхода, defaults to 0
+        :type depth: int, optional
+        :param size: число страниц выборки уровня, defaults to SAMPLE
+        :type size: int, optional
+        :param rng: генератор случайных чисел, defaults to None
+        :type rng: Random, optional
+        :return: выборки уровней, размеры HTML-страниц и число ответов не HTML
+        :rtype: SiteSample
+        """
+        rng = rng or Random()
+        level = [url]
+        seen = {url}
+        levels = []
+        sizes = []
+        for remaining in range(depth, -1, -1):
+            picked = rng.sample(level, size) if len(level) > size else level
+            self._total = self._done + len(picked)
+            pages = await gather(*(self.probe(link, remaining > 0) for link in picked))
+            # для каждой новой ссылки запоминаются страницы выборки, на которых она найдена
+            sources = {}
+            for index, page in enumerate(pages):
+                if page is None:
+                    continue
+                sizes.append(page[0])
+                for link in page[1]:
+                    if link not in seen:
+                        sources.setdefault(link, []).append(index)
+            levels.append(LevelSample(len(level), len(picked), list(sources.values())))
+            if not sources:
+                break
+            level = list(sources)
+            seen.update(level)
+        non_html = sum(self.stat.get('wrong_content_type', {}).values())
+        return SiteSample(levels, sizes, non_html, non_html + len(sizes))
+
+    async def probe(self, url: str, links: bool = True) -> Union[Tuple[int, List[str]], None]:
+        """ Загрузить страницу выборки и получить ее ссылки. Страница не сохраняется, ссылки страницы с директивой
+        nofollow не учитываются.
+
+        :param url: URL
+        :type url: str
+        :param links: получить ссылки страницы, defaults to True
+        :type links: bool, optional
+        :return: размер тела ответа и ссылки или None, если HTML не получен
+        :rtype: Union[Tuple[int, List[str]], None]
+        """
+        response = await self.get_content(url)
+        self._done += 1
+        self.print_message()
+        if response is None or not response.content:
+            return None
+        if response.redirects and not self.is_subdomain(self.doctor(response.url)):
+            self.stat['redirected_out'] = self.stat.get('redirected_out', 0) + 1
+            return None
+        if not links:
+            return response.size, []
+        soup = BeautifulSoup(response.content, 'lxml')
+        if NOFOLLOW in self.get_robots(soup, response.robots):
+            self.stat['nofollow'] = self.stat.get('nofollow', 0) + 1
+            return response.size, []
+        return response.size, self.extract_links(soup, response.url)
+
+    def route(self, links: Set[str], depth: int) -> Set[str]:
+        """ Распределить новые ссылки между обработчиками.
+
+        Возвращает ссылки, которые должны быть обработаны этим скраппером. По умолчанию обрабатываются все ссылки,
+        наследники (например, шардированный скраппер) могут передать часть ссылок другим процессам.
+
+        :param links: множество новых ссылок
+        :type links: Set[str]
+        :param depth: уровень глубины обхода, с которым ссылки будут обработаны
+        :type depth: int
+        :return: множество ссылок для локальной обработки
+        :rtype: Set[str]
+        """
+        return links
+
+    def extract_links(self, soup: BeautifulSoup, url: str) -> List[str]:
+        """ Получить ссылки страницы, входящие в область обхода.
+
+        Значения href всех тэгов <a> обрабатываются одним вызовом resolve_links: относительные ссылки дополняются
+        относительно тэга <base href> (если он есть) или URL страницы, повторы отбрасываются.
+
+        :param soup: разобранная страница
+        :type soup: BeautifulSoup
+        :param url: URL страницы
+        :type url: str
+        :return: нормализованные ссылки без повторов в порядке появления на странице
+        :rtype: List[str]
+
+        >>> html = '<base href="/docs/"><a href="a">1</a><a href="/b#x">2</a><a href="a/">3</a><a href="//x.org/">4</a>'
+        >>> scrapper = Scrapper('https://example.com', None, None)
+        >>> scrapper.extract_links(BeautifulSoup(html, 'lxml'), 'https://example.com')
+        ['https://example.com/docs/a', 'https://example.com/b']
+        """
+        base = (soup.head or soup).find('base', href=True)
+        base = urljoin(url, base['href'].strip()) if base is not None else url
+        # фильтр атрибута в find_all заметно медленнее, чем проверка значения в resolve_links
+        hrefs = [tag.get('href') for tag in soup.find_all('a')]
+        return resolve_links(hrefs, base, self._scope.allows)
+
     def check_link(self, tag: Tag, url: str) -> Union[str, None]:
-        """ Получить текст ссылки тэга.
+        """ Получить текст ссылки тэга (по одной ссылке; обход использует пакетный extract_links).
 
         :param tag: тэг
         :type tag: Tag
@@ -293,11 +869,12 @@ class Scrapper:
         if not link:
             return None
 
-        # если ссылка относительная, то дополняем ее, если нет - проверяем, что она относится к базовому домену или
-        # его поддомену. Если проверка провалена, возвращаем None.
+        # если ссылка относительная, то дополняем ее. Затем проверяем, что она входит в область обхода (относительная
+        # ссылка может быть исключена правилом пути, а ссылка вида //host/path ведет на другой хост).
+        # Если проверка провалена, возвращаем None.
         if link.startswith('/'):
             link = self.rel2abs(link, url)
-        elif not self.is_subdomain(link):
+        if not self.is_subdomain(link):
             return None
 
         # нормализуем ссылку
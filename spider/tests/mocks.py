@@ -1,3 +1,5 @@
+import asyncio
+import socket
 from typing import List, Tuple, Dict, Callable, Union
 from abc import ABC
 
@@ -5,13 +7,28 @@ from abc import ABC
 class DBMock:
 
     records: List[Tuple[str, str, str]]
+    links: List[Tuple[str, str]]
+    fetches: List[Tuple[str, float, str]]
+    versions: List[Tuple[str, float, str]]
 
     def __init__(self):
         self.records = []
+        self.links = []
+        self.fetches = []
+        self.versions = []
 
     async def add_records(self, data: List[Tuple[str, str, str]]):
         self.records += list(data)
 
+    async def add_links(self, edges: List[Tuple[str, str]]):
+        self.links += list(edges)
+
+    async def add_fetches(self, fetches: List[Tuple[str, float, str]]):
+        self.fetches += list(fetches)
+
+    async def add_versions(self, pages: List[Tuple[str, float, str]]):
+        self.versions += list(pages)
+
 
 class AsyncContextManagerInterface(ABC):
 
@@ -24,20 +41,37 @@ class AsyncContextManagerInterface(ABC):
 
 class HeaderMock(AsyncContextManagerInterface):
 
+    status: int = 200
     headers: Dict[str, str]
 
     def __init__(self, headers: Dict[str, str]):
         self.headers = headers
 
 
+class HistoryMock:
+
+    url: str
+
+    def __init__(self, url: str):
+        self.url = url
+
+
 class GetMock(AsyncContextManagerInterface):
 
+    status: int = 200
     text_value: str
     text_action: Callable
+    url: str
+    history: Tuple[HistoryMock, ...]
+    headers: Dict[str, str]
 
-    def __init__(self, text_value: str = None, text_action: Callable = None):
+    def __init__(self, text_value: str = None, text_action: Callable = None, url: str = None,
+                 history: List[str] = (), headers: Dict[str, str] = None):
         self.text_value = text_value
         self.text_action = text_action
+        self.url = url
+        self.history = tuple(HistoryMock(hop) for hop in history)
+        self.headers = headers or {}
 
     async def text(self):
         if self.text_action:
@@ -45,12 +79,24 @@ class GetMock(AsyncContextManagerInterface):
         else:
             return self.text_value
 
+    async def read(self):
+        if self.text_action:
+            self.text_action()
+        else:
+            return self.text_value.encode()
+
+    def get_encoding(self):
+        return 'utf-8'
+
 
 HEAD_ACTION = 'head_action'
 HEAD_VALUE = 'head_value'
 GET_ACTION = 'get_action'
 TEXT_ACTION = 'text_action'
 TEXT_VALUE = 'text_value'
+URL_VALUE = 'url_value'            # конечный URL ответа на GET (по умолчанию - запрошенный)
+HISTORY_VALUE = 'history_value'    # URL перенаправлений ответа на GET
+GET_HEADERS = 'get_headers'        # заголовки ответа на GET
 
 
 class SessionMock:
@@ -60,7 +106,7 @@ class SessionMock:
     def __init__(self, urls: Dict[str, Dict[str, Union[str, Callable]]]):
         self.urls = urls
 
-    def head(self, url: str, timeout: int) -> HeaderMock:
+    def head(self, url: str, timeout: int, allow_redirects: bool = False) -> HeaderMock:
         assert url in self.urls
         url = self.urls[url]
         if HEAD_ACTION in url:
@@ -70,8 +116,28 @@ class SessionMock:
 
     def get(self, url: str, timeout: int) -> GetMock:
         assert url in self.urls
-        url = self.urls[url]
-        if GET_ACTION in url:
-            return url[GET_ACTION]()
+        value = self.urls[url]
+        if GET_ACTION in value:
+            return value[GET_ACTION]()
         else:
-            return GetMock(url.get(TEXT_VALUE), url.get(TEXT_ACTION))
+            return GetMock(value.get(TEXT_VALUE), value.get(TEXT_ACTION), value.get(URL_VALUE, url),
+                           value.get(HISTORY_VALUE, ()), value.get(GET_HEADERS))
+
+
+class ResolverMock:
+
+    calls: list
+
+    def __init__(self):
+        self.calls = []
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> list:
+        self.calls.append(host)
+        await asyncio.sleep(0.01)
+        if host.startswith('bad.'):
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return [{'hostname': host, 'host': '127.0.0.1', 'port': port, 'family': socket.AF_INET, 'proto': 0,
+                 'flags': 0}]
+
+    async def close(self):
+        pass
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+from tempfile import TemporaryDirectory
+
+from aiohttp import ClientSession, web
+
+from spider.api import CANCELLED, DONE, Api
+from spider.benchmark import SyntheticSite
+from spider.storage import SQLiteDB
+
+from .fixtures import async_test
+
+PORT = 8767
+SITE_PORT = 8768
+
+###########
+# УТИЛИТЫ #
+###########
+
+
+async def serve_site(site: SyntheticSite) -> web.AppRunner:
+    runner = web.AppRunner(site.application())
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', SITE_PORT).start()
+    return runner
+
+
+##############################
+# АСИНХРОННЫЕ ФУНКЦИИ ТЕСТОВ #
+##############################
+
+@async_test
+async def test_get():
+
+    records = [(f'https://example.com/{i}', f'title{i}', f'html{i}') for i in range(5)]
+    records += [('https://another.org', 'another', 'html')]
+
+    with TemporaryDirectory() as directory:
+        storage = SQLiteDB(os.path.join(directory, 'spider.db'))
+        async with storage as db:
+            await db.add_records(records)
+
+        runner = await Api(storage).serve(port=PORT)
+        try:
+            async with ClientSession() as session:
+
+                async with session.get(f'http://127.0.0.1:{PORT}/get', params={'url': 'https://up.example.com'}) as r:
+                    assert r.status == 200
+                    assert await r.json() == {
+                        'records': [{'url': 'https://example.com/0', 'title': 'title0'}], 'next': 1
+                    }
+
+                params = {'url': 'https://example.com', 'n': '10', 'offset': '3'}
+                async with session.get(f'http://127.0.0.1:{PORT}/get', params=params) as r:
+                    result = await r.json()
+                    assert [record['url'] for record in result['records']] == [
+                        'https://example.com/3', 'https://example.com/4'
+                    ]
+                    assert result['next'] is None
+
+                async with session.get(f'http://127.0.0.1:{PORT}/get', params={'n': '1'}) as r:
+                    assert r.status == 400
+
+                async with session.get(f'http://127.0.0.1:{PORT}/get', params={'url': 'x', 'n': '-1'}) as r:
+                    assert r.status == 400
+        finally:
+            await runner.cleanup()
+
+
+@async_test
+async def test_jobs():
+
+    site = await serve_site(SyntheticSite(pages=20, fanout=3, page_size=500))
+    with TemporaryDirectory() as directory:
+        runner = await Api(SQLiteDB(os.path.join(directory, 'spider.db'))).serve(port=PORT)
+        try:
+            async with ClientSession() as session:
+
+                job = {'url': f'http://127.0.0.1:{SITE_PORT}/p/0', 'depth': 2}
+                async with session.post(f'http://127.0.0.1:{PORT}/jobs', json=job) as r:
+                    assert r.status == 201
+                    job_id = (await r.json())['id']
+
+                async with session.get(f'http://127.0.0.1:{PORT}/jobs/{job_id}/progress?interval=0.01') as r:
+                    lines = [json.loads(line) async for line in r.content]
+                assert lines[-1]['status'] == DONE
+                assert all(line['status'] != DONE for line in lines[:-1])
+                assert lines[-1]['done'] == lines[-1]['total'] > 1
+                assert lines[-1]['stat']['done'] == lines[-1]['done']
+
+                params = {'url': f'http://127.0.0.1:{SITE_PORT}', 'n': '100'}
+                async with session.get(f'http://127.0.0.1:{PORT}/get', params=params) as r:
+                    assert len((await r.json())['records']) == lines[-1]['done']
+
+                async with session.get(f'http://127.0.0.1:{PORT}/jobs') as r:
+                    assert [job['id'] for job in (await r.json())['jobs']] == [job_id]
+
+                async with session.get(f'http://127.0.0.1:{PORT}/jobs/unknown') as r:
+                    assert r.status == 404
+
+                async with session.post(f'http://127.0.0.1:{PORT}/jobs', json={'depth': 1}) as r:
+                    assert r.status == 400
+        finally:
+            await runner.cleanup()
+            await site.cleanup()
+
+
+@async_test
+async def test_cancel_job():
+
+    site = await serve_site(SyntheticSite(pages=20, fanout=3, page_size=500, latency=0.2))
+    with TemporaryDirectory() as directory:
+        runner = await Api(SQLiteDB(os.path.join(directory, 'spider.db'))).serve(port=PORT)
+        try:
+            async with ClientSession() as session:
+
+                job = {'url': f'http://127.0.0.1:{SITE_PORT}/p/0', 'depth': 5}
+                async with session.post(f'http://127.0.0.1:{PORT}/jobs', json=job) as r:
+                    job_id = (await r.json())['id']
+
+                await asyncio.sleep(0.5)
+                async with session.delete(f'http://127.0.0.1:{PORT}/jobs/{job_id}') as r:
+                    result = await r.json()
+                assert result['status'] == CANCELLED
+                assert result['done'] < result['total']
+        finally:
+            await runner.cleanup()
+            await site.cleanup()
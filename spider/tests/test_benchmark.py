@@ -0,0 +1,55 @@
+from spider.benchmark import SyntheticSite, bench_links, run
+
+from .fixtures import async_test
+
+##################
+# ФУНКЦИИ ТЕСТОВ #
+##################
+
+
+def test_site_kinds():
+
+    site = SyntheticSite(error_rate=0.1, non_html_ratio=0.2)
+    kinds = [site.kind(i) for i in range(1, 1001)]
+    assert 50 < kinds.count('error') < 150
+    assert 150 < kinds.count('binary') < 250
+    assert site.kind(0) == 'html'
+    assert kinds == [SyntheticSite(error_rate=0.1, non_html_ratio=0.2).kind(i) for i in range(1, 1001)]
+
+
+def test_site_render():
+
+    site = SyntheticSite(pages=10, fanout=3, page_size=500)
+    html = site.render(1)
+    assert html.count('<a href="/p/') == 3
+    assert 450 < len(html) < 600
+    assert html == site.render(1)
+    assert html != SyntheticSite(pages=10, fanout=3, page_size=500, seed=1).render(1)
+
+
+def test_bench_links():
+
+    result = bench_links(links=100, repeat=1)
+
+    assert result['pages'] == 5
+    # из 10 видов ссылок в область обхода не входят 3 (другой хост, mailto и фрагмент), повторы отбрасываются
+    assert result['links_found'] == 5 * 61 + 4
+    assert result['per_tag_seconds'] > 0 and result['batch_seconds'] > 0
+
+
+##############################
+# АСИНХРОННЫЕ ФУНКЦИИ ТЕСТОВ #
+##############################
+
+@async_test
+async def test_run():
+
+    site = SyntheticSite(pages=30, fanout=5, page_size=2000)
+    result = await run(site, depth=10, interval=0.1, port=8766)
+
+    assert result['storage'] == 'memory'
+    assert 0 < result['pages'] <= 30
+    assert result['pages'] == result['stat']['done']
+    assert result['pages_per_second'] > 0
+    assert result['get']['count'] == result['pages']
+    assert result['peak_rss'] > 0
@@ -0,0 +1,134 @@
+import os
+from tempfile import TemporaryDirectory
+
+from aiohttp import ClientSession, web
+
+from spider.cache import CachedSession
+
+from .fixtures import async_test
+
+PORT = 8769
+
+###########
+# УТИЛИТЫ #
+###########
+
+
+class Site:
+
+    requests: list  # запросы: (метод, путь, If-None-Match)
+
+    def __init__(self):
+        self.requests = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests.append((request.method, request.path, request.headers.get('If-None-Match')))
+        page = request.match_info['page']
+        if page == 'fresh':
+            return web.Response(text='<html>fresh</html>', content_type='text/html',
+                                headers={'Cache-Control': 'max-age=3600'})
+        if page == 'etag':
+            if request.headers.get('If-None-Match') == '"v1"':
+                return web.Response(status=304, headers={'ETag': '"v1"'})
+            return web.Response(text='<html>etag</html>', content_type='text/html', headers={'ETag': '"v1"'})
+        if page == 'private':
+            return web.Response(text='<html>private</html>', content_type='text/html',
+                                headers={'Cache-Control': 'no-store'})
+        return web.Response(text=f'<html>{"x" * 1000}{page}</html>', content_type='text/html')
+
+    async def serve(self) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_route('*', '/{page}', self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', PORT).start()
+        return runner
+
+
+async def fetch(session: CachedSession, method: str, page: str) -> str:
+    request = session.get if method == 'GET' else session.head
+    async with request(f'http://127.0.0.1:{PORT}/{page}', timeout=3) as response:
+        body = await response.read()
+        return response.status, response.headers.get('Content-Type'), body.decode(response.get_encoding())
+
+
+##############################
+# АСИНХРОННЫЕ ФУНКЦИИ ТЕСТОВ #
+##############################
+
+@async_test
+async def test_freshness_and_revalidation():
+
+    site = Site()
+    runner = await site.serve()
+    try:
+        with TemporaryDirectory() as directory:
+            async with CachedSession(ClientSession(), directory) as session:
+
+                assert await fetch(session, 'GET', 'fresh') == (200, 'text/html; charset=utf-8', '<html>fresh</html>')
+                assert await fetch(session, 'GET', 'fresh') == (200, 'text/html; charset=utf-8', '<html>fresh</html>')
+                # на HEAD отвечают заголовки свежего ответа на GET
+                assert (await fetch(session, 'HEAD', 'fresh'))[1] == 'text/html; charset=utf-8'
+                assert site.requests == [('GET', '/fresh', None)]
+
+                assert (await fetch(session, 'GET', 'etag'))[2] == '<html>etag</html>'
+                assert (await fetch(session, 'GET', 'etag'))[2] == '<html>etag</html>'
+                assert site.requests[-2:] == [('GET', '/etag', None), ('GET', '/etag', '"v1"')]
+
+                await fetch(session, 'GET', 'private')
+                await fetch(session, 'GET', 'private')
+                assert site.requests[-2:] == [('GET', '/private', None), ('GET', '/private', None)]
+
+                assert session.stat == {'miss': 4, 'stored': 2, 'hit': 2, 'revalidated': 1}
+
+            # кэш сохраняется на диске
+            async with CachedSession(ClientSession(), directory) as session:
+                assert (await fetch(session, 'GET', 'fresh'))[2] == '<html>fresh</html>'
+                assert session.stat == {'hit': 1}
+    finally:
+        await runner.cleanup()
+
+
+@async_test
+async def test_replay():
+
+    site = Site()
+    with TemporaryDirectory() as directory:
+
+        runner = await site.serve()
+        try:
+            async with CachedSession(ClientSession(), directory) as session:
+                await fetch(session, 'GET', 'page')
+                await fetch(session, 'HEAD', 'other')
+        finally:
+            await runner.cleanup()
+
+        # сайт остановлен: ответы воспроизводятся из кэша, отсутствующие в кэше запросы получают 504
+        async with CachedSession(None, directory, replay=True) as session:
+            assert (await fetch(session, 'GET', 'page'))[2] == f'<html>{"x" * 1000}page</html>'
+            assert (await fetch(session, 'HEAD', 'other'))[:2] == (200, 'text/html; charset=utf-8')
+            assert (await fetch(session, 'GET', 'missing'))[0] == 504
+            assert session.stat == {'hit': 2, 'miss': 1}
+
+
+@async_test
+async def test_eviction():
+
+    site = Site()
+    runner = await site.serve()
+    try:
+        with TemporaryDirectory() as directory:
+            async with CachedSession(ClientSession(), directory, max_size=60) as session:
+                for page in ('a', 'b', 'c'):
+                    await fetch(session, 'GET', page)
+                await fetch(session, 'GET', 'fresh')
+                assert session.stat['evicted'] > 0
+
+            bodies = [name for _, _, names in os.walk(directory) for name in names if name.endswith('.gz')]
+            assert len(bodies) == 1
+
+            async with CachedSession(None, directory, replay=True) as session:
+                assert (await fetch(session, 'GET', 'fresh'))[0] == 200
+                assert (await fetch(session, 'GET', 'a'))[0] == 504
+    finally:
+        await runner.cleanup()
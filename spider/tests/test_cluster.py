@@ -0,0 +1,118 @@
+import multiprocessing
+from argparse import Namespace
+from queue import Queue
+from tempfile import TemporaryDirectory
+
+from spider.cluster import SHARD_BY_HOST, SHARD_BY_URL, ShardedScrapper, run_cluster, shard_of
+from spider.db import WORKERS
+from spider.spider import SHARD_KEYS, storage_features
+
+from .fixtures import async_test
+from .mocks import DBMock, SessionMock
+from .test_scrapper import load_page
+
+###########
+# УТИЛИТЫ #
+###########
+
+
+def make_urls(count: int) -> dict:
+    urls = {}
+    for i in range(count):
+        urls[f'https://example.com/{i}'] = {
+            'head_value': {'Content-Type': 'text/html'},
+            'text_value': load_page(str(i))
+        }
+    return urls
+
+
+##################
+# ФУНКЦИИ ТЕСТОВ #
+##################
+
+def test_shard_of():
+
+    urls = [f'https://{i}.example.com/{i}' for i in range(100)]
+    for shards in range(1, 5):
+        for url in urls:
+            assert 0 <= shard_of(url, shards) < shards
+            assert shard_of(url, shards) == shard_of(url, shards, SHARD_BY_HOST)
+            assert 0 <= shard_of(url, shards, SHARD_BY_URL) < shards
+
+    assert len({shard_of(url, 4) for url in urls}) > 1
+
+
+def test_cli_shard_keys():
+
+    assert SHARD_KEYS == (SHARD_BY_HOST, SHARD_BY_URL)
+
+
+def test_cli_workers_feature():
+
+    # несколько процессов требуют хранилища, допускающего одновременную запись
+    options = dict(command='load', links=False, prioritize=False, history=False, versions=False)
+    assert WORKERS in storage_features(Namespace(workers=2, **options))
+    assert WORKERS not in storage_features(Namespace(workers=1, **options))
+
+
+##############################
+# АСИНХРОННЫЕ ФУНКЦИИ ТЕСТОВ #
+##############################
+
+@async_test
+async def test_host_sharding_keeps_host_local():
+
+    urls = make_urls(3)
+    url = 'https://example.com/2'
+    index = shard_of(url, 2)
+    queues = [Queue(), Queue()]
+    pending = multiprocessing.Value('i', 1)
+
+    scrapper = ShardedScrapper(url, SessionMock(urls), DBMock(), index, queues, pending)
+    await scrapper.scrape_routed(url, 2)
+
+    assert pending.value == 0
+    assert all(queue.empty() for queue in queues)
+    assert scrapper.stat['done'] == 3
+
+
+@async_test
+async def test_url_sharding_routes_links():
+
+    urls = make_urls(2)
+    url = 'https://example.com/1'
+    link = 'https://example.com/0'
+    shards = 4
+    index = shard_of(url, shards, SHARD_BY_URL)
+    owner = shard_of(link, shards, SHARD_BY_URL)
+    assert index != owner
+    queues = [Queue() for _ in range(shards)]
+    pending = multiprocessing.Value('i', 1)
+    db_mock = DBMock()
+
+    scrapper = ShardedScrapper(url, SessionMock(urls), db_mock, index, queues, pending, SHARD_BY_URL)
+    await scrapper.scrape_routed(url, 1)
+    await scrapper.flush()
+
+    assert pending.value == 1
+    assert queues[owner].get_nowait() == (link, 0)
+    assert all(queue.empty() for queue in queues)
+
+    assert len(db_mock.records) == 1
+    assert db_mock.records[0][0] == url
+
+    await scrapper.scrape_routed(link, 0)
+    assert pending.value == 0
+
+
+@async_test
+async def test_cluster_rejects_segment_storage():
+
+    # процессы дописывали бы одни и те же файлы сегментов, и смещения в индексах оказались бы неверными
+    with TemporaryDirectory() as directory:
+        try:
+            await run_cluster('https://example.com', 1, 2, f'warc://{directory}')
+        except ValueError:
+            pass
+        else:
+            assert False
@@ -1,9 +1,12 @@
 import asyncio
+from datetime import datetime, timedelta, timezone
 from typing import Iterable, Tuple
 
 from asyncpg import Record
 
-from spider.db import DB
+from spider.db import DB, Partitioning, PoolOptions, period_start
+from spider.metrics import Metrics
+from spider.revisit import FetchStats
 
 from .fixtures import async_test
 
@@ -22,15 +25,31 @@ async def setup_module(module=None):
     query = 'CREATE SCHEMA IF NOT EXISTS spider'
     async with DB(USER, PASSWORD, DATABASE, HOST) as db:
         await db.execute(query)
-    query = 'CREATE TABLE IF NOT EXISTS scrapped_data (url TEXT PRIMARY KEY, title TEXT, html TEXT)'
+    queries = [
+        'CREATE TABLE IF NOT EXISTS scrapped_data '
+        '(url TEXT PRIMARY KEY, title TEXT, html TEXT, text TEXT, extracted JSONB, canonical TEXT, redirects JSONB, '
+        'tsv TSVECTOR)',
+        'CREATE INDEX IF NOT EXISTS scrapped_data_tsv_idx ON scrapped_data USING GIN (tsv)',
+        'CREATE TABLE IF NOT EXISTS links (src TEXT, dst TEXT, PRIMARY KEY (src, dst))',
+        'CREATE TABLE IF NOT EXISTS page_rank (url TEXT PRIMARY KEY, rank DOUBLE PRECISION, inlinks INTEGER)',
+        'CREATE TABLE IF NOT EXISTS fetch_history (url TEXT, fetched_at TIMESTAMPTZ, hash TEXT, changed BOOLEAN)',
+        'CREATE INDEX IF NOT EXISTS fetch_history_url_idx ON fetch_history (url, fetched_at)',
+        'CREATE TABLE IF NOT EXISTS page_versions (url TEXT, version INTEGER, fetched_at TIMESTAMPTZ, '
+        'keyframe BOOLEAN, size INTEGER, data BYTEA, PRIMARY KEY (url, version))'
+    ]
     async with DB(USER, PASSWORD, DATABASE, HOST) as db:
-        await db.execute(query)
+        for query in queries:
+            await db.execute(query)
 
 
 @async_test
 async def teardown_module(module=None):
     queries = [
         'DROP TABLE scrapped_data',
+        'DROP TABLE links',
+        'DROP TABLE page_rank',
+        'DROP TABLE fetch_history',
+        'DROP TABLE page_versions',
         'DROP SCHEMA spider'
     ]
     async with DB(USER, PASSWORD, DATABASE, HOST) as db:
@@ -207,3 +226,248 @@ async def test_get_many_records():
         assert len(test_records - records) == 0
 
         await truncate_table(db)
+
+
+@async_test
+async def test_search():
+
+    records = [
+        ('https://example.com/0', 'Spiders', 'html0', 'spiders weave webs'),
+        ('https://example.com/1', 'Webs', 'html1', 'a web of links between spiders and pages'),
+        ('https://example.com/2', 'Crawlers', 'html2', 'crawlers follow links'),
+        ('https://another.org/0', 'Spiders', 'html3', 'spiders everywhere'),
+    ]
+
+    async with DB(USER, PASSWORD, DATABASE, HOST) as db:
+
+        await db.add_records(records)
+
+        test_records = [test_record async for test_record in db.search('example.com', 'spiders')]
+        urls = [test_record['url'] for test_record in test_records]
+        assert urls == ['https://example.com/0', 'https://example.com/1']
+        assert '[spiders]' in test_records[0]['snippet']
+
+        test_records = [test_record async for test_record in db.search('example.com', 'spiders', 1, 1)]
+        assert [test_record['url'] for test_record in test_records] == ['https://example.com/1']
+
+        test_records = [test_record async for test_record in db.search('example.com', 'links -crawlers')]
+        assert [test_record['url'] for test_record in test_records] == ['https://example.com/1']
+
+        test_records = [test_record async for test_record in db.search('example.com', 'ants')]
+        assert len(test_records) == 0
+
+        await truncate_table(db)
+
+
+@async_test
+async def test_links_and_ranks():
+
+    async with DB(USER, PASSWORD, DATABASE, HOST) as db:
+
+        await db.add_links([('https://example.com/0', 'https://example.com/1'),
+                            ('https://example.com/0', 'https://example.com/2'),
+                            ('https://example.com/1', 'https://example.com/0')])
+        await db.add_links([('https://example.com/0', 'https://example.com/2'),
+                            ('https://example.com/0', 'https://example.com/2')])
+
+        test_links = sorted([(r['src'], r['dst']) async for r in db.get_links('example.com')])
+        assert test_links == [('https://example.com/0', 'https://example.com/2'),
+                              ('https://example.com/1', 'https://example.com/0')]
+
+        await db.set_ranks({'https://example.com/0': 0.5, 'https://example.com/2': 0.25}, {'https://example.com/0': 1})
+        await db.set_ranks({'https://example.com/0': 0.75}, {})
+        assert await db.get_ranks('example.com') == {'https://example.com/0': 0.75, 'https://example.com/2': 0.25}
+
+        await db.execute('TRUNCATE links, page_rank')
+
+
+@async_test
+async def test_iter_pages():
+
+    records = [(f'https://{i}.example.com', f'title{i}', f'<html>{i}</html>', f'text{i}') for i in range(7)]
+
+    async with DB(USER, PASSWORD, DATABASE, HOST) as db:
+
+        await db.add_records(records)
+
+        test_records = [tuple(r) async for r in db.iter_pages('example.com', ('url', 'title'), batch_size=3)]
+        assert sorted(test_records) == sorted(record[:2] for record in records)
+
+        test_records = [tuple(r) async for r in db.iter_pages('0.example.com', ('html', 'text'), raw=True)]
+        assert test_records == [(b'<html>0</html>', b'text0')]
+
+        await truncate_table(db)
+
+
+@async_test
+async def test_extracted():
+
+    records = [
+        ('https://example.com/0', 'title0', 'html0', 'text0', {'description': 'd', 'opengraph': {'type': 'article'}}),
+        ('https://example.com/1', 'title1', 'html1'),
+        ('https://example.com/2', 'title2', 'html2', 'text2', None, 'https://example.com/1', ['https://example.com/r']),
+    ]
+
+    async with DB(USER, PASSWORD, DATABASE, HOST) as db:
+
+        await db.add_records(records)
+
+        test_records = sorted([tuple(r) async for r in db.iter_pages('example.com', ('url', 'extracted'))])
+        assert test_records == [
+            ('https://example.com/0', {'description': 'd', 'opengraph': {'type': 'article'}}),
+            ('https://example.com/1', None),
+            ('https://example.com/2', None),
+        ]
+
+        test_records = [tuple(r) async for r in db.iter_pages('example.com/2', ('canonical', 'redirects'))]
+        assert test_records == [('https://example.com/1', ['https://example.com/r'])]
+
+        await truncate_table(db)
+
+
+@async_test
+async def test_fetch_history():
+
+    async with DB(USER, PASSWORD, DATABASE, HOST) as db:
+
+        await db.add_fetches([('https://example.com/0', 100.0, 'a'), ('https://example.com/1', 100.0, 'a')])
+        await db.add_fetches([('https://example.com/0', 200.0, 'b'), ('https://example.com/1', 200.0, 'a')])
+        await db.add_fetches([('https://example.com/0', 300.0, 'b'), ('https://another.org', 300.0, 'a')])
+
+        # первая загрузка не считается изменением
+        assert await db.get_fetch_stats('example.com') == {
+            'https://example.com/0': FetchStats(3, 1, 100.0, 300.0),
+            'https://example.com/1': FetchStats(2, 0, 100.0, 200.0),
+        }
+
+        await db.execute('TRUNCATE fetch_history')
+
+
+@async_test
+async def test_page_versions():
+
+    pages = [''.join(f'<li>item {i} of version {version}</li>\n' if i == version else f'<li>item {i}</li>\n'
+                     for i in range(100)) for version in range(20)]
+
+    async with DB(USER, PASSWORD, DATABASE, HOST) as db:
+
+        for i, page in enumerate(pages):
+            await db.add_versions([('https://example.com', 100.0 * i, page), ('https://example.com', 100.0 * i, page)])
+
+        # повтор последней версии не сохраняется, ключевые версии перемежаются цепочками дельт
+        versions = await db.get_versions('https://example.com')
+        assert [version.version for version in versions] == list(range(1, 21))
+        assert [version.version for version in versions if version.keyframe] == [1, 17]
+        assert versions[1].fetched_at == 100.0 and versions[1].stored < versions[0].stored
+        assert sum(version.stored for version in versions) < sum(map(len, pages)) / 10
+
+        for i, page in enumerate(pages):
+            assert await db.get_version('https://example.com', i + 1) == page
+        assert await db.get_version('https://example.com') == pages[-1]
+        assert await db.get_version('https://example.com', 21) is None
+        assert await db.get_version('https://another.org') is None
+
+        await db.execute('TRUNCATE page_versions')
+
+
+@async_test
+async def test_partitioning():
+
+    records = [('https://example.com/0', 'title0', 'html0', 'spiders weave webs'),
+               ('https://another.org/0', 'title1', 'html1', 'spiders everywhere')]
+    today = datetime.now(timezone.utc).date()
+    past = period_start(today, 'month') - timedelta(days=1)
+
+    async with DB(USER, PASSWORD, DATABASE, HOST) as db:
+
+        # пустая несекционированная таблица заменяется секционированной
+        await db.partitions.create(Partitioning('month', 4))
+        await db.add_records(records)
+        assert [tuple(r) async for r in db.get_records('example.com')] == [('https://example.com/0', 'title0')]
+        assert [r['url'] async for r in db.search('another.org', 'spiders')] == ['https://another.org/0']
+
+        # страница, загруженная в прошлом периоде, при повторной загрузке переходит в секцию текущего периода
+        await db.partitions.ensure(past)
+        await db.execute('UPDATE scrapped_data SET crawled_on = $1 WHERE url = $2', past, 'https://example.com/0')
+        await db.add_records(records[:1])
+        rows = await db.execute('SELECT url, crawled_on FROM scrapped_data ORDER BY url')
+        assert [tuple(row) for row in rows] == [('https://another.org/0', today), ('https://example.com/0', today)]
+
+        partitions = await db.partitions.list_partitions()
+        starts = [period_start(past, 'month'), period_start(today, 'month')]
+        assert [partition.start for partition in partitions] == starts
+
+        # срок хранения соблюдается удалением секций прошедших периодов
+        await db.execute('UPDATE scrapped_data SET crawled_on = $1 WHERE url = $2', past, 'https://another.org/0')
+        assert await db.partitions.drop_before(today) == [partitions[0].name]
+        assert [r['url'] async for r in db.iter_pages('', ('url',))] == ['https://example.com/0']
+
+    # схема читается из комментария к таблице; затем восстанавливается несекционированная таблица
+    async with DB(USER, PASSWORD, DATABASE, HOST) as db:
+        assert db.partitions.scheme == Partitioning('month', 4)
+        await db.execute('DROP TABLE scrapped_data')
+        await db.execute('CREATE TABLE scrapped_data (url TEXT PRIMARY KEY, title TEXT, html TEXT, text TEXT, '
+                         'extracted JSONB, canonical TEXT, redirects JSONB, tsv TSVECTOR)')
+        await db.execute('CREATE INDEX scrapped_data_tsv_idx ON scrapped_data USING GIN (tsv)')
+
+
+@async_test
+async def test_pgbouncer_mode_and_metrics():
+
+    records = [(f'https://{i}.example.com', f'title{i}', f'html{i}') for i in range(3)]
+    metrics = Metrics()
+
+    async with DB(USER, PASSWORD, DATABASE, HOST, options=PoolOptions(min_size=1, max_size=2, pgbouncer=True),
+                  metrics=metrics) as db:
+
+        await asyncio.gather(*(db.add_records([record]) for record in records))
+        test_records = [record2tuple(test_record) async for test_record in db.get_records('example.com', 10)]
+        assert sorted(test_records) == sorted(record[:2] for record in records)
+
+        snapshot = metrics.snapshot()
+        assert snapshot['spider_db_acquire_seconds']['']['count'] == 4
+        assert snapshot['spider_db_query_seconds']['operation=add_records']['count'] == 3
+        assert snapshot['spider_db_query_seconds']['operation=get_records']['count'] == 1
+        assert snapshot['spider_db_connections']['state=busy'] >= 1
+
+        await truncate_table(db)
+
+
+@async_test
+async def test_migrate_old_schema():
+
+    records = [('https://example.com/0', 'title0', 'html0', 'spiders weave webs', {'description': 'd'},
+                'https://example.com/', ['https://example.com/r'])]
+
+    # таблица первой версии схемы, созданная прежним init_db.sh
+    async with DB(USER, PASSWORD, DATABASE, HOST) as db:
+        await db.execute('DROP TABLE scrapped_data')
+        await db.execute('CREATE TABLE scrapped_data (url TEXT PRIMARY KEY, title TEXT, html TEXT)')
+        await db.execute("INSERT INTO scrapped_data VALUES ('https://example.com/1', 'title1', 'html1')")
+        await db.execute('DROP TABLE links, page_rank, fetch_history, page_versions')
+
+    # недостающие столбцы, таблицы и индексы добавляются при подключении, повторное подключение ничего не меняет
+    for _ in range(2):
+        async with DB(USER, PASSWORD, DATABASE, HOST) as db:
+            await db.add_records(records)
+            assert [r['url'] async for r in db.search('example.com', 'spiders')] == ['https://example.com/0']
+            test_records = [record2tuple(test_record) async for test_record in db.get_records('example.com')]
+            assert sorted(test_records) == [('https://example.com/0', 'title0'), ('https://example.com/1', 'title1')]
+            test_records = sorted([tuple(r) async for r in db.iter_pages('example.com', ('url', 'extracted'))])
+            assert test_records == [('https://example.com/0', {'description': 'd'}), ('https://example.com/1', None)]
+            test_records = [tuple(r) async for r in db.iter_pages('example.com/0', ('canonical', 'redirects'))]
+            assert test_records == [('https://example.com/', ['https://example.com/r'])]
+            await db.add_links([('https://example.com/0', 'https://example.com/1')])
+            await db.set_ranks({'https://example.com/1': 0.5}, {'https://example.com/1': 1})
+            assert await db.get_ranks('example.com') == {'https://example.com/1': 0.5}
+            await db.add_fetches([('https://example.com/0', 100.0, 'a')])
+            await db.add_versions([('https://example.com/0', 100.0, 'html0')])
+
+    async with DB(USER, PASSWORD, DATABASE, HOST) as db:
+        for index in ('scrapped_data_tsv_idx', 'fetch_history_url_idx'):
+            rows = await db.execute('SELECT to_regclass($1) IS NOT NULL', index)
+            assert rows[0][0]
+        assert await db.get_version('https://example.com/0') == 'html0'
+        assert await db.get_fetch_stats('example.com') == {'https://example.com/0': FetchStats(2, 0, 100.0, 100.0)}
+        await truncate_table(db)
+        await db.execute('TRUNCATE links, page_rank, fetch_history, page_versions')
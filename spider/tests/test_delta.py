@@ -0,0 +1,62 @@
+import random
+from time import perf_counter
+
+from spider.delta import DIFF_TIMEOUT, diff, encode, rebuild
+
+###########
+# УТИЛИТЫ #
+###########
+
+
+def make_page(seed: int, rows: int = 1500) -> str:
+    rng = random.Random(seed)
+    body = ''.join(f'<div class="item"><a href="/p/{rng.randrange(10 ** 6)}">title {rng.randrange(10 ** 6)}</a>'
+                   f'<span>{rng.randrange(1000)}</span></div>\n' for _ in range(rows))
+    return f'<html><body>{body}</body></html>'
+
+
+##################
+# ФУНКЦИИ ТЕСТОВ #
+##################
+
+
+def test_large_edited_page():
+
+    page = make_page(0, 2500)
+    edited = list(page)
+    rng = random.Random(1)
+    for _ in range(50):
+        edited[rng.randrange(len(edited))] = 'X'
+    edited = ''.join(edited)
+
+    # небольшие правки большой страницы хранятся дельтой
+    started = perf_counter()
+    keyframe, data = encode(page, edited, 1)
+    assert perf_counter() - started < DIFF_TIMEOUT
+    assert not keyframe and rebuild([encode(None, page, 0), (keyframe, data)]) == edited
+
+
+def test_large_rewritten_page():
+
+    page, rewritten = make_page(0, 2500), make_page(1, 2500)
+    assert len(page) > 170000
+
+    # полностью переписанная страница сохраняется ключевой версией за ограниченное время
+    started = perf_counter()
+    keyframe, data = encode(page, rewritten, 1)
+    assert perf_counter() - started < DIFF_TIMEOUT + 1
+    assert keyframe and rebuild([(keyframe, data)]) == rewritten
+
+
+def test_diff_limits():
+
+    # частые фрагменты (в худшем случае сравнение квадратично) прерываются по времени
+    rng = random.Random(0)
+    vocabulary = [f'<t{i}>' for i in range(150)]
+    base, text = (''.join(rng.choice(vocabulary) for _ in range(19000)) for _ in range(2))
+    started = perf_counter()
+    assert diff(base, text, timeout=0.05) is None
+    assert perf_counter() - started < 1
+
+    # для версий с большим числом фрагментов дельта не строится
+    assert diff('<p>' * 30000, '<p>' * 30001) is None
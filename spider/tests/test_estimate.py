@@ -0,0 +1,34 @@
+from random import Random
+
+from spider.estimate import LevelSample, SiteSample, estimate, level_sizes
+
+##################
+# ФУНКЦИИ ТЕСТОВ #
+##################
+
+
+def test_full_sample():
+
+    # все страницы уровней загружены: оценка равна числу найденных URL, интервалы вырождены
+    levels = [LevelSample(1, 1, [[0]] * 4), LevelSample(4, 4, [[0, 1, 2, 3]] + [[i] for i in range(4)]),
+              LevelSample(5, 5, [])]
+    result = estimate(SiteSample(levels, [100, 200, 300], 1, 4))
+
+    assert [level.value for level in result.levels] == [1, 4, 5]
+    assert all(level.low == level.value == level.high for level in result.levels)
+    assert result.total.value == 10
+    assert result.page_size.value == 200 and result.page_size.low < 200 < result.page_size.high
+    assert result.non_html.value == 0.25 and 0 < result.non_html.low < 0.25 < result.non_html.high < 1
+
+
+def test_partial_sample():
+
+    # уровень из 1000 страниц, у каждой по 10 уникальных ссылок и общее меню из 5 ссылок
+    sources = [[index] for index in range(100) for _ in range(10)] + [list(range(100))] * 5
+    levels = [LevelSample(1, 1, [[0]] * 1000), LevelSample(1000, 100, sources), LevelSample(1005, 100, [])]
+
+    assert level_sizes(levels) == [1, 1000, 10005]
+    result = estimate(SiteSample(levels, [], 0, 0), rounds=50, rng=Random(0))
+    assert result.levels[2].low <= 10005 <= result.levels[2].high
+    assert result.total.low <= 11006 <= result.total.high
+    assert result.page_size.value == 0 and result.non_html.high == 1
@@ -0,0 +1,93 @@
+import heapq
+import os
+import random
+import tracemalloc
+from tempfile import TemporaryDirectory
+
+from spider.frontier import Frontier, UrlSet
+
+##################
+# ФУНКЦИИ ТЕСТОВ #
+##################
+
+
+def test_fifo_spill():
+
+    urls = [f'https://example.com/section/{i % 7}/item-{i}' for i in range(1000)]
+
+    with TemporaryDirectory() as directory:
+        frontier = Frontier(directory, hot_size=50)
+        for url in urls:
+            assert frontier.push(url, 2)
+        assert not frontier.push(urls[0], 2)
+
+        # горячая часть ограничена, остальное выгружено на диск компактнее строк URL
+        assert len(frontier._hot) <= 50 and len(frontier) == 1000
+        assert frontier.stat['spilled'] > 900 and frontier.stat['bytes'] < sum(map(len, urls)) / 2
+        assert [frontier.pop() for _ in urls] == [(url, 2) for url in urls]
+        assert frontier.pop() is None
+
+        # прочитанные сегменты удаляются, каталог, заданный снаружи, остается
+        assert os.listdir(directory) == []
+        frontier.close()
+        assert os.path.isdir(directory)
+
+
+def test_priority_order():
+
+    rng = random.Random(0)
+    frontier = Frontier(hot_size=16, prioritized=True)
+    frontier.MAX_SEGMENTS = 4
+    expected, popped, expected_popped = [], [], []
+
+    # извлечение вперемешку с добавлением, слияние сегментов не нарушает порядок
+    for i in range(2000):
+        priority = rng.choice((0.0, 0.5, 1.0)) * rng.random()
+        frontier.push(f'https://example.com/{i}', i % 3, priority)
+        heapq.heappush(expected, (-priority, i, f'https://example.com/{i}', i % 3))
+        if rng.random() < 0.3:
+            popped.append(frontier.pop())
+            expected_popped.append(heapq.heappop(expected)[2:])
+    while len(frontier):
+        popped.append(frontier.pop())
+        expected_popped.append(heapq.heappop(expected)[2:])
+
+    assert popped == expected_popped
+    assert frontier.stat['compactions'] > 0
+    directory = frontier.directory
+    frontier.close()
+    assert not os.path.exists(directory)
+
+
+def test_url_set():
+
+    urls = UrlSet()
+    urls.MERGE_SIZE = 10
+    for i in range(100):
+        assert urls.add(f'https://example.com/{i}')
+    assert not urls.add('https://example.com/5')
+
+    assert len(urls) == 100 and len(urls._recent) < 10 and len(urls._runs) <= 4
+    assert all(f'https://example.com/{i}' in urls for i in range(100))
+    assert {'https://example.com/5', 'https://example.com/100'} - urls == {'https://example.com/100'}
+    urls.discard('https://example.com/5')
+    assert 'https://example.com/5' in urls
+
+
+def test_url_set_merge_memory():
+
+    size = 20000
+    urls = UrlSet()
+    urls.MERGE_SIZE = 256
+    tracemalloc.start()
+    try:
+        urls.update(f'https://example.com/{i}' for i in range(size))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # слияние серий потоковое: пик памяти - массивы отпечатков (8 байт на URL) с запасом на сливаемую копию,
+    # а не списки чисел Python (больше 40 байт на URL)
+    assert len(urls) == size and len(urls._runs) < 8
+    assert peak < 4 * 8 * size
+    assert all('https://example.com/' + str(i) in urls for i in range(0, size, 97))
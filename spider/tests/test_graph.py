@@ -0,0 +1,46 @@
+import random
+
+from spider.graph import LinkGraph
+
+##################
+# ФУНКЦИИ ТЕСТОВ #
+##################
+
+
+def test_inlinks():
+
+    graph = LinkGraph([('a', 'b'), ('a', 'c'), ('b', 'c'), ('c', 'c')])
+
+    assert graph.inlinks() == {'a': 0, 'b': 1, 'c': 2}
+    assert list(graph.out_degree) == [2, 1, 0]
+
+
+def test_pagerank():
+
+    graph = LinkGraph([('a', 'b'), ('a', 'c'), ('b', 'c'), ('c', 'a'), ('d', 'c')])
+    ranks, iterations = graph.pagerank()
+
+    assert abs(sum(ranks.values()) - 1) < 1e-9
+    assert max(ranks, key=ranks.get) == 'c'
+    assert ranks['d'] == min(ranks.values())
+    assert 1 < iterations < 100
+
+
+def test_pagerank_warm_start():
+
+    generator = random.Random(1)
+    edges = [(str(i), str(generator.randrange(200))) for i in range(200) for _ in range(5)]
+    ranks, _ = LinkGraph(edges).pagerank()
+
+    # граф дополнен несколькими ребрами: расчет от прежних рангов сходится быстрее, чем с нуля
+    edges += [('3', '4'), ('10', '11')]
+    cold_ranks, cold_iterations = LinkGraph(edges).pagerank()
+    warm_ranks, warm_iterations = LinkGraph(edges).pagerank(ranks)
+
+    assert warm_iterations < cold_iterations
+    assert all(abs(warm_ranks[url] - cold_ranks[url]) < 1e-5 for url in cold_ranks)
+
+
+def test_empty_graph():
+
+    assert LinkGraph().pagerank() == ({}, 0)
@@ -0,0 +1,74 @@
+from spider.metrics import Metrics
+from spider.scrapper import Scrapper
+
+from .fixtures import async_test
+from .mocks import DBMock, SessionMock
+from .test_scrapper import load_page
+
+##################
+# ФУНКЦИИ ТЕСТОВ #
+##################
+
+
+def test_render():
+
+    metrics = Metrics()
+    metrics.inc('spider_responses_total', method='GET', status='200')
+    metrics.inc('spider_responses_total', method='GET', status='200')
+    metrics.observe('spider_parse_seconds', 0.02)
+    metrics.observe('spider_parse_seconds', 20)
+
+    text = metrics.render()
+    assert '# TYPE spider_responses_total counter' in text
+    assert 'spider_responses_total{method="GET",status="200"} 2' in text
+    assert 'spider_parse_seconds_bucket{le="0.025"} 1' in text
+    assert 'spider_parse_seconds_bucket{le="+Inf"} 2' in text
+    assert 'spider_parse_seconds_count 2' in text
+    assert 'spider_flush_seconds' not in text
+    assert text.endswith('# EOF\n')
+
+
+def test_snapshot():
+
+    metrics = Metrics()
+    metrics.set('spider_queue_depth', 5)
+    for _ in range(100):
+        metrics.observe('spider_fetch_seconds', 0.03, method='HEAD')
+
+    snapshot = metrics.snapshot()
+    assert snapshot['spider_queue_depth'] == {'': 5}
+    histogram = snapshot['spider_fetch_seconds']['method=HEAD']
+    assert histogram['count'] == 100
+    assert 0.025 <= histogram['p50'] <= histogram['p99'] <= 0.05
+
+
+##############################
+# АСИНХРОННЫЕ ФУНКЦИИ ТЕСТОВ #
+##############################
+
+@async_test
+async def test_scrape_metrics():
+
+    urls = {}
+    for i in range(2):
+        urls[f'https://example.com/{i}'] = {
+            'head_value': {'Content-Type': 'text/html'},
+            'text_value': load_page(str(i))
+        }
+    url = 'https://example.com/1'
+
+    metrics = Metrics()
+    scrapper = Scrapper(url, SessionMock(urls), DBMock(), metrics)
+    await scrapper.scrape(url, 1)
+    await scrapper.flush()
+
+    assert scrapper.stat == {'done': 2}
+
+    snapshot = metrics.snapshot()
+    assert snapshot['spider_responses_total'] == {'method=HEAD,status=200': 2, 'method=GET,status=200': 2}
+    assert snapshot['spider_in_flight'] == {'host=example.com': 0}
+    assert snapshot['spider_queue_depth'] == {'': 0}
+    assert snapshot['spider_parse_seconds']['']['count'] == 2
+    assert snapshot['spider_response_bytes']['']['count'] == 2
+    assert snapshot['spider_flush_seconds']['']['count'] == 1
+    assert snapshot['spider_flushed_records_total'] == {'': 2}
@@ -0,0 +1,56 @@
+from spider.profiler import StageProfiler
+from spider.scrapper import Scrapper
+
+from .fixtures import async_test
+from .mocks import DBMock, SessionMock
+from .test_scrapper import load_page
+
+##################
+# ФУНКЦИИ ТЕСТОВ #
+##################
+
+
+def test_report():
+
+    profiler = StageProfiler()
+    for i in range(1, 101):
+        profiler.record('parse', i / 1000)
+    profiler.record('custom', 1)
+
+    report = profiler.report()
+    assert list(report) == ['parse', 'custom']
+    assert report['parse']['count'] == 100
+    assert report['parse']['p50'] == 0.05
+    assert report['parse']['p95'] == 0.095
+    assert report['parse']['p99'] == 0.099
+    assert 'parse' in profiler.format_report()
+
+
+##############################
+# АСИНХРОННЫЕ ФУНКЦИИ ТЕСТОВ #
+##############################
+
+@async_test
+async def test_scrape_stages():
+
+    urls = {}
+    for i in range(2):
+        urls[f'https://example.com/{i}'] = {
+            'head_value': {'Content-Type': 'text/html'},
+            'text_value': load_page(str(i))
+        }
+    url = 'https://example.com/1'
+
+    profiler = StageProfiler()
+    scrapper = Scrapper(url, SessionMock(urls), DBMock(), profiler=profiler)
+    await scrapper.scrape(url, 1)
+    await scrapper.flush()
+
+    assert scrapper.stat == {'done': 2}
+
+    report = profiler.report()
+    assert list(report) == ['head', 'get', 'decode', 'parse', 'text', 'links', 'flush']
+    for stage in ('head', 'get', 'decode', 'parse', 'text'):
+        assert report[stage]['count'] == 2
+    assert report['links']['count'] == 1
+    assert report['flush']['count'] == 1
@@ -0,0 +1,71 @@
+import asyncio
+
+from spider.resolver import CachingResolver
+
+from .fixtures import async_test
+from .mocks import ResolverMock
+
+
+##############################
+# АСИНХРОННЫЕ ФУНКЦИИ ТЕСТОВ #
+##############################
+
+@async_test
+async def test_cache():
+
+    mock = ResolverMock()
+    resolver = CachingResolver(mock, ttl=0.05)
+
+    # одновременные запросы одного хоста объединяются, порт подставляется в адреса из кэша
+    results = await asyncio.gather(*(resolver.resolve('example.com', port) for port in (80, 443, 443)))
+    assert mock.calls == ['example.com']
+    assert [result[0]['port'] for result in results] == [80, 443, 443]
+    assert resolver.check('example.com') is True
+    assert resolver.stat == {'hits': 0, 'lookups': 1, 'failures': 0, 'prefetched': 0}
+
+    await resolver.resolve('example.com', 80)
+    assert mock.calls == ['example.com']
+
+    # после истечения срока имя разрешается заново
+    await asyncio.sleep(0.06)
+    assert resolver.check('example.com') is None
+    await resolver.resolve('example.com', 80)
+    assert mock.calls == ['example.com', 'example.com']
+
+
+@async_test
+async def test_negative_cache():
+
+    mock = ResolverMock()
+    resolver = CachingResolver(mock)
+
+    for _ in range(3):
+        try:
+            await resolver.resolve('bad.example.com', 80)
+        except OSError:
+            pass
+        else:
+            assert False
+    assert mock.calls == ['bad.example.com']
+    assert resolver.check('bad.example.com') is False
+    assert not await resolver.ensure('bad.example.com')
+    assert await resolver.ensure('127.0.0.1')
+
+
+@async_test
+async def test_prefetch():
+
+    mock = ResolverMock()
+    resolver = CachingResolver(mock, max_lookups=1)
+
+    resolver.prefetch(['example.com', 'bad.example.com', 'example.com', '::1'])
+    resolver.prefetch(['example.com'])
+    assert resolver.check('example.com') is None
+
+    # запросы к DNS выполняются по одному, ожидающий получает результат опережающего запроса
+    assert await resolver.ensure('bad.example.com') is False
+    await asyncio.sleep(0.02)
+    assert sorted(mock.calls) == ['bad.example.com', 'example.com']
+    assert (resolver.check('example.com'), resolver.check('bad.example.com')) == (True, False)
+    assert resolver.stat['prefetched'] == 2
+    await resolver.close()
@@ -0,0 +1,42 @@
+import random
+from math import exp
+
+from spider.revisit import DAY, FetchStats, change_rate, select
+
+###########
+# УТИЛИТЫ #
+###########
+
+
+def simulate(rate: float, interval: float, fetches: int, seed: int = 0) -> FetchStats:
+    """ Сводка загрузок страницы с регулярным интервалом, изменения которой - пуассоновский процесс. """
+    rng = random.Random(seed)
+    changes = sum(rng.random() < 1 - exp(-rate * interval) for _ in range(fetches - 1))
+    return FetchStats(fetches, changes, 0, (fetches - 1) * interval)
+
+
+##################
+# ФУНКЦИИ ТЕСТОВ #
+##################
+
+
+def test_change_rate():
+
+    # изменения чаще загрузок: доля интервалов с изменениями занижает частоту, оценка - нет
+    for rate in (0.2 / DAY, 1 / DAY, 2 / DAY):
+        stats = simulate(rate, DAY, 400)
+        assert abs(change_rate(stats) - rate) / rate < 0.2
+        assert stats.changes / (stats.fetches - 1) / DAY < rate
+
+
+def test_select():
+
+    history = {f'https://example.com/{i}': FetchStats(10, i, 0, 9 * DAY) for i in range(10)}
+    history['https://example.com/fresh'] = FetchStats(10, 9, 0, 10 * DAY)
+
+    selected = select(history, 3, 10 * DAY)
+
+    # бюджет соблюдается, страница, загруженная только что, не выбирается, а не менявшиеся страницы идут последними
+    assert len(selected) == 3
+    assert 'https://example.com/fresh' not in selected
+    assert select(history, 11, 10 * DAY)[-2:] == ['https://example.com/0', 'https://example.com/fresh']
@@ -0,0 +1,84 @@
+import pickle
+
+from spider.psl import PublicSuffixList, default_list
+from spider.scope import Scope
+
+##################
+# ФУНКЦИИ ТЕСТОВ #
+##################
+
+
+def test_registrable_domain():
+
+    psl = default_list()
+
+    assert psl.registrable_domain('news.bbc.co.uk') == 'bbc.co.uk'
+    assert psl.registrable_domain('www.example.com.au') == 'example.com.au'
+    assert psl.registrable_domain('a.b.c.example.co.jp') == 'example.co.jp'
+    assert psl.registrable_domain('user.github.io') == 'user.github.io'
+    assert psl.registrable_domain('shop.user.myshopify.com') == 'user.myshopify.com'
+    assert psl.registrable_domain('xn--80ak6aa92e.xn--p1ai') == 'xn--80ak6aa92e.xn--p1ai'
+    assert psl.registrable_domain('WWW.Example.COM.') == 'example.com'
+    assert psl.registrable_domain('co.uk') == 'co.uk'
+
+
+def test_icann_only():
+
+    psl = PublicSuffixList.load(private=False)
+
+    # без раздела частных доменов github.io - обычный домен второго уровня
+    assert psl.registrable_domain('user.github.io') == 'github.io'
+    assert psl.registrable_domain('news.bbc.co.uk') == 'bbc.co.uk'
+
+
+def test_default_scope():
+
+    scope = Scope('https://news.bbc.co.uk/sport')
+
+    assert scope.base_domain == 'bbc.co.uk'
+    assert scope.allows('https://bbc.co.uk/')
+    assert scope.allows('http://www.bbc.co.uk:8080/news')
+    assert scope.allows('https://user@WWW.BBC.CO.UK/news')
+    assert not scope.allows('https://itv.co.uk/')
+    assert not scope.allows('https://notbbc.co.uk/')
+    assert not scope.allows('ftp://bbc.co.uk/file')
+    assert not scope.allows('javascript:void(0)')
+
+
+def test_include_exclude():
+
+    scope = Scope(
+        'https://example.com',
+        include=['*.example.com', 'example.com', '/docs/', 're:[?&]lang=en'],
+        exclude=['private.example.com', '/docs/draft/', 're:\\.pdf$'],
+    )
+
+    assert scope.allows('https://example.com/docs/intro')
+    assert scope.allows('https://api.example.com/docs/')
+    assert scope.allows('https://example.com/blog?lang=en')
+    assert not scope.allows('https://example.com/blog')
+    assert not scope.allows('https://private.example.com/docs/')
+    assert not scope.allows('https://example.com/docs/draft/1')
+    assert not scope.allows('https://example.com/docs/manual.pdf')
+    assert not scope.allows('https://example.org/docs/')
+
+
+def test_host_cache():
+
+    scope = Scope('https://example.com', cache_size=2)
+    for i in range(10):
+        scope.allows(f'https://example.com/{i}')
+
+    info = scope.allows_netloc.cache_info()
+    assert (info.hits, info.misses) == (9, 1)
+
+
+def test_pickle():
+
+    scope = Scope('https://example.com', exclude=['/admin/'])
+    scope.allows('https://example.com/')
+    restored = pickle.loads(pickle.dumps(scope))
+
+    assert restored.base_domain == 'example.com'
+    assert restored.allows('https://www.example.com/')
+    assert not restored.allows('https://example.com/admin/users')
@@ -1,18 +1,34 @@
 import asyncio
 import os
+from random import Random
 
 from aiohttp import ClientError
 
-from spider.scrapper import Scrapper
+from spider.estimate import estimate
+from spider.extractors import Pipeline
+from spider.frontier import Frontier
+from spider.resolver import CachingResolver
+from spider.scope import Scope
+from spider.scrapper import CrawlLimits, Scrapper
+from spider.throttle import Throttle
+from spider.traps import TrapDetector
 
 from .fixtures import async_test
-from .mocks import DBMock, SessionMock
+from .mocks import GET_HEADERS, HISTORY_VALUE, URL_VALUE, DBMock, ResolverMock, SessionMock
 
 ###########
 # УТИЛИТЫ #
 ###########
 
 
+def make_page(links: list = (), head: str = '') -> dict:
+    body = ''.join(f'<a href="{link}"></a>' for link in links)
+    return {
+        'head_value': {'Content-Type': 'text/html'},
+        'text_value': f'<html><head><title>t</title>{head}</head><body>{body}</body></html>'
+    }
+
+
 def load_page(page_name: str) -> str:
     page_name += '.html'
     base = os.path.join(os.path.split(__file__)[0], 'pages')
@@ -415,3 +431,375 @@ async def test_3_depth():
         assert record[1] == url[-1]
         assert record[2] == urls[url]['text_value']
         urls.pop(url)
+
+
+@async_test
+async def test_store_links():
+
+    urls = {}
+    for i in range(3):
+        url = f'https://example.com/{i}'
+        urls[url] = {
+            'head_value': {'Content-Type': 'text/html'},
+            'text_value': load_page(str(i))
+        }
+
+    session_mock = SessionMock(urls)
+    db_mock = DBMock()
+
+    scrapper = Scrapper(url, session_mock, db_mock, store_links=True)
+    await scrapper.scrape(url, 1)
+    await scrapper.flush()
+
+    assert scrapper.stat == {'done': 2}
+    # ссылки страниц последнего уровня обхода тоже сохраняются
+    assert sorted(db_mock.links) == [
+        ('https://example.com/1', 'https://example.com/0'),
+        ('https://example.com/2', 'https://example.com/1'),
+    ]
+
+
+@async_test
+async def test_scope_exclude():
+
+    urls = {}
+    for i in range(5):
+        url = f'https://example.com/{i}'
+        urls[url] = {
+            'head_value': {'Content-Type': 'text/html'},
+            'text_value': load_page(str(i))
+        }
+
+    session_mock = SessionMock(urls)
+    db_mock = DBMock()
+
+    # страница 4 ссылается на 3, страница 3 - на 2: правило исключения останавливает обход на странице 3
+    scrapper = Scrapper(url, session_mock, db_mock, scope=Scope(url, exclude=['/2']))
+    await scrapper.scrape(url, 3)
+    await scrapper.flush()
+
+    assert scrapper.stat == {'done': 2}
+    assert sorted(record[0] for record in db_mock.records) == ['https://example.com/3', 'https://example.com/4']
+
+
+@async_test
+async def test_extract():
+
+    url = 'https://example.com/article'
+    html = (
+        '<html lang="en"><head><title>t</title><meta name="description" content="about">'
+        '<meta property="og:title" content="OG"></head>'
+        '<body><nav>menu</nav><main><p>main text</p></main><script>broken()</script></body></html>'
+    )
+    session_mock = SessionMock({url: {'head_value': {'Content-Type': 'text/html'}, 'text_value': html}})
+    db_mock = DBMock()
+
+    pipeline = Pipeline(['description', 'canonical', 'language', 'opengraph', 'main_text'])
+    scrapper = Scrapper(url, session_mock, db_mock, pipeline=pipeline)
+    await scrapper.scrape(url)
+    await scrapper.flush()
+
+    assert scrapper.stat == {'done': 1}
+    assert db_mock.records[0][4] == {
+        'description': 'about', 'language': 'en', 'opengraph': {'title': 'OG'}, 'main_text': 'main text'
+    }
+
+
+@async_test
+async def test_redirect():
+
+    url = 'https://example.com'
+    urls = {
+        url: make_page(['/old', '/new']),
+        # /old перенаправляет на /new: страница сохраняется под конечным URL, /new повторно не загружается
+        'https://example.com/old': dict(make_page(), **{
+            URL_VALUE: 'https://example.com/new/', HISTORY_VALUE: ['https://example.com/old']
+        }),
+        'https://example.com/new': make_page(),
+    }
+    db_mock = DBMock()
+
+    scrapper = Scrapper(url, SessionMock(urls), db_mock, priorities={'https://example.com/old': 1})
+    await scrapper.scrape(url, 1)
+    await scrapper.flush()
+
+    assert scrapper.stat == {'done': 2, 'scrapped': 1}
+    assert [(record[0], record[6]) for record in db_mock.records] == [
+        ('https://example.com', None),
+        ('https://example.com/new', ['https://example.com/old']),
+    ]
+
+
+@async_test
+async def test_redirect_out_of_scope():
+
+    url = 'https://example.com'
+    urls = {
+        url: make_page(['/away']),
+        'https://example.com/away': dict(make_page(), **{
+            URL_VALUE: 'https://example.org/', HISTORY_VALUE: ['https://example.com/away']
+        }),
+    }
+    db_mock = DBMock()
+
+    scrapper = Scrapper(url, SessionMock(urls), db_mock)
+    await scrapper.scrape(url, 1)
+    await scrapper.flush()
+
+    assert scrapper.stat == {'done': 1, 'redirected_out': 1}
+    assert [record[0] for record in db_mock.records] == [url]
+
+
+@async_test
+async def test_canonical():
+
+    url = 'https://example.com'
+    canonical = '<link rel="canonical" href="/article">'
+    urls = {
+        url: make_page(['/article?ref=a', '/article?ref=b', '/article']),
+        'https://example.com/article?ref=a': make_page(head=canonical),
+        'https://example.com/article?ref=b': make_page(head=canonical),
+        'https://example.com/article': make_page(head=canonical),
+    }
+    priorities = {'https://example.com/article?ref=a': 3, 'https://example.com/article?ref=b': 2}
+    db_mock = DBMock()
+
+    scrapper = Scrapper(url, SessionMock(urls), db_mock, priorities=priorities)
+    await scrapper.scrape(url, 1)
+    await scrapper.flush()
+
+    # первая страница сохраняется с каноническим URL, вторая - его дубликат, сам канонический URL не загружается
+    assert scrapper.stat == {'done': 2, 'duplicate': 1, 'scrapped': 1}
+    assert [(record[0], record[5]) for record in db_mock.records] == [
+        ('https://example.com', None),
+        ('https://example.com/article?ref=a', 'https://example.com/article'),
+    ]
+
+
+@async_test
+async def test_robots():
+
+    url = 'https://example.com'
+    urls = {
+        url: make_page(['/hidden', '/closed'], '<meta name="robots" content="nofollow">'),
+        'https://example.com/hidden': make_page(['/secret'], '<meta name="robots" content="noindex">'),
+        'https://example.com/closed': dict(make_page(['/secret']), **{GET_HEADERS: {'X-Robots-Tag': 'none'}}),
+        'https://example.com/secret': make_page(),
+    }
+
+    db_mock = DBMock()
+    scrapper = Scrapper(url, SessionMock(urls), db_mock)
+    await scrapper.scrape(url, 2)
+    await scrapper.flush()
+
+    # ссылки страницы с nofollow не обходятся
+    assert scrapper.stat == {'done': 1, 'nofollow': 1}
+    assert [record[0] for record in db_mock.records] == [url]
+
+    db_mock = DBMock()
+    scrapper = Scrapper(url, SessionMock(urls), db_mock)
+    await scrapper.scrape('https://example.com/hidden', 1)
+    await scrapper.scrape('https://example.com/closed', 1)
+    await scrapper.flush()
+
+    # страница с noindex не сохраняется, но ее ссылки обходятся; X-Robots-Tag: none запрещает и то, и другое
+    assert scrapper.stat == {'done': 3, 'noindex': 2, 'nofollow': 1}
+    assert [record[0] for record in db_mock.records] == ['https://example.com/secret']
+
+
+@async_test
+async def test_traps():
+
+    url = 'https://example.com'
+    items = [f'/item/{i}' for i in range(4)]
+    sessions = [f'/list?sid={i}' for i in range(4)]
+    urls = {url: make_page(items + sessions + ['/a/b/a/b/a'])}
+    urls.update((url + link, make_page()) for link in items + sessions + ['/a/b/a/b/a'])
+
+    db_mock = DBMock()
+    traps = TrapDetector(template_cap=3, max_param_values=2)
+    scrapper = Scrapper(url, SessionMock(urls), db_mock, traps=traps)
+    await scrapper.scrape(url, 1)
+    await scrapper.flush()
+
+    # из четырех URL шаблона /item/{n} обходятся три, из четырех значений sid - два, повторяющийся путь не обходится
+    assert scrapper.stat == {'done': 6, 'trapped': {'template': 1, 'param': 2, 'repetition': 1}}
+    assert len(db_mock.records) == 6
+
+
+@async_test
+async def test_throttle():
+
+    url = 'https://example.com/0'
+    urls = {url: {'head_action': timeout_raser}}
+
+    scrapper = Scrapper(url, SessionMock(urls), DBMock(), throttle=Throttle(host_initial=4, total_initial=8))
+    scrapper.SLEEP_TIME = 0.1
+    await scrapper.scrape(url)
+
+    # каждая попытка отправлена после предыдущего снижения, поэтому каждый таймаут снижает лимиты
+    assert scrapper.stat['connection_error'] == 1
+    assert scrapper.stat['throttle'] == {
+        'example.com': {'timeout': 3, 'limit': 1},
+        '*': {'timeout': 3, 'limit': 1},
+    }
+
+
+@async_test
+async def test_history():
+
+    url = 'https://example.com'
+    urls = {url: make_page(['/1']), 'https://example.com/1': make_page(), 'https://example.com/2': make_page()}
+    db_mock = DBMock()
+
+    scrapper = Scrapper(url, SessionMock(urls), db_mock, history=True)
+    await scrapper.scrape(url, 1)
+    await scrapper.flush()
+
+    assert sorted(fetch[0] for fetch in db_mock.fetches) == [url, 'https://example.com/1']
+    # хэш зависит от заголовка и текста страницы, а не от ссылок
+    assert db_mock.fetches[0][2] == db_mock.fetches[1][2]
+
+    # повторная загрузка не обходит ссылки страниц
+    db_mock = DBMock()
+    scrapper = Scrapper(url, SessionMock(urls), db_mock, history=True)
+    await scrapper.revisit([url, 'https://example.com/2'])
+    await scrapper.flush()
+
+    assert scrapper.stat == {'done': 2}
+    assert scrapper.progress() == (2, 2)
+    assert sorted(fetch[0] for fetch in db_mock.fetches) == [url, 'https://example.com/2']
+
+
+@async_test
+async def test_versions():
+
+    url = 'https://example.com'
+    urls = {
+        url: make_page(['/1', '/hidden']),
+        'https://example.com/1': make_page(),
+        'https://example.com/hidden': make_page([], '<meta name="robots" content="noindex">'),
+    }
+    db_mock = DBMock()
+
+    scrapper = Scrapper(url, SessionMock(urls), db_mock, versions=True)
+    await scrapper.scrape(url, 1)
+    await scrapper.flush()
+
+    # версии сохраняются только для сохраняемых страниц, с полным HTML
+    assert sorted(version[0] for version in db_mock.versions) == [url, 'https://example.com/1']
+    assert {version[2] for version in db_mock.versions} == {page[2] for page in db_mock.records}
+    assert db_mock.fetches == []
+
+
+@async_test
+async def test_frontier():
+
+    url = 'https://example.com'
+    urls = {url: make_page(['/1', '/2', '/3'])}
+    for i in range(1, 4):
+        urls[f'{url}/{i}'] = make_page(['/'] + [f'/{i}/{j}' for j in range(1, 4)])
+        urls.update((f'{url}/{i}/{j}', make_page(['/1'])) for j in range(1, 4))
+
+    db_mock = DBMock()
+    scrapper = Scrapper(url, SessionMock(urls), db_mock)
+    await scrapper.crawl(url, 2)
+    await scrapper.flush()
+
+    frontier_db_mock = DBMock()
+    with Frontier(hot_size=4) as frontier:
+        scrapper = Scrapper(url, SessionMock(urls), frontier_db_mock, frontier=frontier)
+        await scrapper.crawl(url, 2, concurrency=2)
+        await scrapper.flush()
+        assert frontier.stat['spilled'] > 0
+
+    # результат тот же, что у рекурсивного обхода, страницы обходятся по уровням
+    assert scrapper.stat == {'done': 13}
+    assert scrapper.progress() == (13, 13)
+    assert sorted(frontier_db_mock.records) == sorted(db_mock.records)
+    assert [record[0].count('/') for record in frontier_db_mock.records] == [2] + [3] * 3 + [4] * 9
+
+
+@async_test
+async def test_resolver():
+
+    url = 'https://example.com'
+    links = ['https://www.example.com', 'https://bad.example.com', 'https://bad.example.com/1']
+    urls = {url: make_page(links), links[0]: make_page(['https://bad.example.com/2'])}
+
+    resolver_mock = ResolverMock()
+    db_mock = DBMock()
+    scrapper = Scrapper(url, SessionMock(urls), db_mock, resolver=CachingResolver(resolver_mock))
+    await scrapper.scrape(url, 2)
+    await scrapper.flush()
+
+    # ссылки на хост, имя которого не разрешилось, отбрасываются без запросов, имя разрешается один раз
+    assert scrapper.stat == {'done': 2, 'unresolved': 3}
+    assert sorted(record[0] for record in db_mock.records) == [url, links[0]]
+    assert sorted(resolver_mock.calls) == ['bad.example.com', 'example.com', 'www.example.com']
+
+
+@async_test
+async def test_limits():
+
+    url = 'https://example.com'
+    urls = {url: make_page([f'/{i}' for i in range(10)])}
+    urls.update((f'{url}/{i}', make_page([f'/{i}/{j}' for j in range(10)])) for i in range(10))
+    urls.update((f'{url}/{i}/{j}', make_page()) for i in range(10) for j in range(10))
+
+    db_mock = DBMock()
+    scrapper = Scrapper(url, SessionMock(urls), db_mock, throttle=Throttle(host_initial=2),
+                        limits=CrawlLimits(max_pages=15))
+    await scrapper.crawl(url, 2)
+    await scrapper.flush()
+
+    # после достижения предела загруженные страницы сохраняются, остальные пропускаются
+    assert len(db_mock.records) == 15
+    assert scrapper.stat['stopped'] == 'max_pages'
+    assert scrapper.stat['done'] == 15 and scrapper.stat['skipped'] > 0
+    assert scrapper.summary()['pages'] == 15 and scrapper.summary()['stopped'] == 'max_pages'
+
+    # при обходе через очередь оставшиеся в ней URL пропускаются
+    db_mock = DBMock()
+    with Frontier() as frontier:
+        scrapper = Scrapper(url, SessionMock(urls), db_mock, frontier=frontier, limits=CrawlLimits(max_bytes=1))
+        await scrapper.crawl(url, 2)
+        await scrapper.flush()
+        assert len(frontier) == 0
+    assert [record[0] for record in db_mock.records] == [url]
+    assert scrapper.stat == {'done': 1, 'stopped': 'max_bytes', 'skipped': 10}
+    assert scrapper.progress() == (11, 11)
+
+    scrapper = Scrapper(url, SessionMock(urls), DBMock())
+    scrapper.stop()
+    await scrapper.crawl(url, 2)
+    assert scrapper.stat == {'stopped': 'signal', 'skipped': 1}
+
+
+@async_test
+async def test_sample():
+
+    url = 'https://example.com'
+    urls = {url: make_page([f'/{i}' for i in range(1, 11)])}
+    urls[f'{url}/about'] = make_page()
+    for i in range(1, 11):
+        urls[f'{url}/{i}'] = make_page(['/', '/about', f'/{i}.pdf'] + [f'/{i}/{j}' for j in range(1, 21)])
+        urls[f'{url}/{i}.pdf'] = {'head_value': {'Content-Type': 'application/pdf'}}
+        urls.update((f'{url}/{i}/{j}', make_page(['/about'])) for j in range(1, 21))
+
+    db_mock = DBMock()
+    scrapper = Scrapper(url, SessionMock(urls), db_mock)
+    site = await scrapper.sample(url, 3, 5, Random(0))
+
+    # с уровня загружается не больше 5 страниц, ссылки предыдущих уровней не считаются новыми, данные не сохраняются
+    assert [(level.discovered, level.sampled) for level in site.levels] == [(1, 1), (10, 5), (106, 5)]
+    assert sorted(map(len, site.levels[1].sources)) == [1] * 105 + [5]
+    assert site.levels[2].sources == []
+    assert site.responses == 11 and site.non_html == sum(scrapper.stat.get('wrong_content_type', {}).values())
+    assert scrapper.progress() == (11, 11)
+    assert db_mock.records == []
+
+    # уникальные ссылки масштабируются на весь уровень, общая ссылка считается один раз: 200 страниц, 10 PDF и /about
+    result = estimate(site)
+    assert [level.value for level in result.levels] == [1, 10, 211]
+    assert result.total.value == 222
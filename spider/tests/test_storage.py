@@ -0,0 +1,300 @@
+import os
+from tempfile import TemporaryDirectory
+
+from spider.db import DB, HISTORY, LINKS, SEARCH, VERSIONS, WORKERS
+from spider.revisit import FetchStats
+from spider.storage import SegmentDB, SQLiteDB, open_storage
+
+from .fixtures import async_test
+
+###########
+# УТИЛИТЫ #
+###########
+
+
+def make_storages(directory: str) -> list:
+    return [SQLiteDB(os.path.join(directory, 'spider.db')), SegmentDB(os.path.join(directory, 'segments'))]
+
+
+##################
+# ФУНКЦИИ ТЕСТОВ #
+##################
+
+
+def test_open_storage():
+
+    assert isinstance(open_storage('postgresql://spider:password@db/spiderdata'), DB)
+    assert isinstance(open_storage('sqlite://spider.db'), SQLiteDB)
+    assert isinstance(open_storage('warc:///tmp/segments'), SegmentDB)
+
+    db = open_storage('postgresql://spider:password@db/spiderdata?max_size=20&pgbouncer=1')
+    assert (db._options.min_size, db._options.max_size, db._options.pgbouncer) == (2, 20, True)
+    try:
+        open_storage('postgresql://spider:password@db/spiderdata?pool_size=20')
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+##############################
+# АСИНХРОННЫЕ ФУНКЦИИ ТЕСТОВ #
+##############################
+
+@async_test
+async def test_add_records():
+
+    records = [(f'https://{i}.example.com', f'title{i}', f'html{i}') for i in range(10)]
+    records += [(f'https://{i}.another.example.com', f'another_title{i}', f'another_html{i}') for i in range(10)]
+
+    with TemporaryDirectory() as directory:
+        for storage in make_storages(directory):
+            async with storage as db:
+
+                await db.add_records(records)
+
+                test_records = [(r['url'], r['title']) async for r in db.get_records('example.com', 50)]
+                assert set(test_records) == {record[0:2] for record in records}
+
+                test_records = [r['url'] async for r in db.get_records('another.example.com', 3)]
+                assert len(test_records) == 3
+
+                test_records = [r['url'] async for r in db.get_records('another.example.com', 50, 7)]
+                assert len(test_records) == 3
+
+                test_records = [r async for r in db.get_records('example.org')]
+                assert len(test_records) == 0
+
+
+@async_test
+async def test_overwrite_and_reopen():
+
+    with TemporaryDirectory() as directory:
+        for storage in make_storages(directory):
+
+            async with storage as db:
+                await db.add_records([('https://example.com', 'title', 'html')])
+                await db.add_records([('https://example.com', 'new_title', 'new_html')])
+
+            async with storage as db:
+                test_records = [(r['url'], r['title']) async for r in db.get_records('example.com')]
+                assert test_records == [('https://example.com', 'new_title')]
+
+
+@async_test
+async def test_segment_html():
+
+    with TemporaryDirectory() as directory:
+        async with SegmentDB(directory) as db:
+            db.SEGMENT_SIZE = 1
+            await db.add_records([('https://example.com/0', '0', '<html>0</html>')])
+            await db.add_records([('https://example.com/1', '1', '<html>1</html>')])
+            assert await db.get_html('https://example.com/0') == '<html>0</html>'
+            assert await db.get_html('https://example.com/1') == '<html>1</html>'
+            assert await db.get_html('https://example.com/2') is None
+        assert sorted(os.listdir(directory)) == [
+            'segment-00000.idx', 'segment-00000.warc.gz', 'segment-00001.idx', 'segment-00001.warc.gz'
+        ]
+
+
+@async_test
+async def test_sqlite_search():
+
+    records = [
+        ('https://example.com/0', 'Spiders', 'html0', 'spiders weave webs'),
+        ('https://example.com/1', 'Webs', 'html1', 'a web of links between spiders and pages'),
+        ('https://example.com/2', 'Crawlers', 'html2', 'crawlers follow links'),
+        ('https://another.org/0', 'Spiders', 'html3', 'spiders everywhere'),
+        ('https://example.com/3', 'No text', 'html4'),
+    ]
+
+    with TemporaryDirectory() as directory:
+        async with SQLiteDB(os.path.join(directory, 'spider.db')) as db:
+
+            await db.add_records(records)
+
+            test_records = [test_record async for test_record in db.search('example.com', 'spiders')]
+            assert [test_record['url'] for test_record in test_records] == [
+                'https://example.com/0', 'https://example.com/1'
+            ]
+            assert '[spiders]' in test_records[1]['snippet']
+
+            test_records = [test_record async for test_record in db.search('example.com', 'spiders', 1, 1)]
+            assert [test_record['url'] for test_record in test_records] == ['https://example.com/1']
+
+            test_records = [test_record async for test_record in db.search('example.com', 'follow "links"')]
+            assert [test_record['url'] for test_record in test_records] == ['https://example.com/2']
+
+            # or и исключение слов работают так же, как в PostgreSQL
+            test_records = [test_record async for test_record in db.search('example.com', 'weave or crawlers')]
+            assert sorted(test_record['url'] for test_record in test_records) == [
+                'https://example.com/0', 'https://example.com/2'
+            ]
+            test_records = [test_record async for test_record in db.search('example.com', 'spiders -weave')]
+            assert [test_record['url'] for test_record in test_records] == ['https://example.com/1']
+            test_records = [test_record async for test_record in db.search('example.com', '-"weave webs" links')]
+            assert sorted(test_record['url'] for test_record in test_records) == [
+                'https://example.com/1', 'https://example.com/2'
+            ]
+            assert [test_record async for test_record in db.search('example.com', '-spiders')] == []
+
+            await db.add_records([('https://example.com/2', 'Crawlers', 'html2', 'crawlers stopped')])
+            test_records = [test_record async for test_record in db.search('example.com', 'follow')]
+            assert len(test_records) == 0
+
+
+@async_test
+async def test_segment_search_is_not_supported():
+
+    # хранилище сегментов не объявляет необязательных возможностей, команды отклоняются до начала работы
+    assert SegmentDB.FEATURES == frozenset()
+    assert SQLiteDB.FEATURES == DB.FEATURES == {SEARCH, LINKS, HISTORY, VERSIONS, WORKERS}
+
+    with TemporaryDirectory() as directory:
+        async with SegmentDB(directory) as db:
+            try:
+                [test_record async for test_record in db.search('example.com', 'spiders')]
+            except NotImplementedError:
+                pass
+            else:
+                assert False
+
+
+@async_test
+async def test_sqlite_links():
+
+    with TemporaryDirectory() as directory:
+        async with SQLiteDB(os.path.join(directory, 'spider.db')) as db:
+
+            await db.add_links([('https://example.com/0', 'https://example.com/1'),
+                                ('https://example.com/0', 'https://example.com/2'),
+                                ('https://example.com/1', 'https://example.com/0'),
+                                ('https://another.org/0', 'https://example.com/0')])
+            # исходящие ссылки страницы заменяются при повторном обходе
+            await db.add_links([('https://example.com/0', 'https://example.com/2'),
+                                ('https://example.com/0', 'https://example.com/2')])
+
+            test_links = sorted([(r['src'], r['dst']) async for r in db.get_links('example.com')])
+            assert test_links == [('https://example.com/0', 'https://example.com/2'),
+                                  ('https://example.com/1', 'https://example.com/0')]
+
+            await db.set_ranks({'https://example.com/0': 0.5, 'https://example.com/2': 0.25},
+                               {'https://example.com/0': 1})
+            await db.set_ranks({'https://example.com/0': 0.75}, {})
+            assert await db.get_ranks('example.com') == {'https://example.com/0': 0.75, 'https://example.com/2': 0.25}
+
+
+@async_test
+async def test_sqlite_fetch_history():
+
+    with TemporaryDirectory() as directory:
+        async with SQLiteDB(os.path.join(directory, 'spider.db')) as db:
+
+            await db.add_fetches([('https://example.com/0', 100.0, 'a'), ('https://example.com/1', 100.0, 'a')])
+            await db.add_fetches([('https://example.com/0', 200.0, 'b'), ('https://example.com/1', 200.0, 'a')])
+            await db.add_fetches([('https://example.com/0', 300.0, 'b'), ('https://another.org', 300.0, 'a')])
+
+            # первая загрузка не считается изменением
+            assert await db.get_fetch_stats('example.com') == {
+                'https://example.com/0': FetchStats(3, 1, 100.0, 300.0),
+                'https://example.com/1': FetchStats(2, 0, 100.0, 200.0),
+            }
+
+        # история хранится в файле БД
+        async with SQLiteDB(os.path.join(directory, 'spider.db')) as db:
+            assert len(await db.get_fetch_stats('')) == 3
+
+
+@async_test
+async def test_sqlite_page_versions():
+
+    pages = [''.join(f'<li>item {i} of version {version}</li>\n' if i == version else f'<li>item {i}</li>\n'
+                     for i in range(100)) for version in range(20)]
+
+    with TemporaryDirectory() as directory:
+        async with SQLiteDB(os.path.join(directory, 'spider.db')) as db:
+
+            for i, page in enumerate(pages):
+                await db.add_versions([('https://example.com', 100.0 * i, page),
+                                       ('https://example.com', 100.0 * i, page)])
+
+            # повтор последней версии не сохраняется, ключевые версии перемежаются цепочками дельт
+            versions = await db.get_versions('https://example.com')
+            assert [version.version for version in versions] == list(range(1, 21))
+            assert [version.version for version in versions if version.keyframe] == [1, 17]
+            assert versions[1].fetched_at == 100.0 and versions[1].stored < versions[0].stored
+            assert sum(version.stored for version in versions) < sum(map(len, pages)) / 10
+
+            for i, page in enumerate(pages):
+                assert await db.get_version('https://example.com', i + 1) == page
+            assert await db.get_version('https://example.com') == pages[-1]
+            assert await db.get_version('https://example.com', 21) is None
+            assert await db.get_version('https://another.org') is None
+
+
+@async_test
+async def test_iter_pages():
+
+    records = [(f'https://{i}.example.com', f'title{i}', f'<html>{i}</html>', f'text{i}') for i in range(7)]
+    records += [('https://another.org', 'another', '<html>другой</html>', 'другой')]
+
+    with TemporaryDirectory() as directory:
+        for storage in make_storages(directory):
+            async with storage as db:
+
+                await db.add_records(records)
+
+                test_records = [tuple(r) async for r in db.iter_pages('example.com', ('url', 'title'), batch_size=3)]
+                assert sorted(test_records) == sorted(record[:2] for record in records[:7])
+
+                test_records = [tuple(r) async for r in db.iter_pages('another.org', ('html', 'url'), raw=True)]
+                assert len(test_records) == 1
+                assert bytes(test_records[0][0]) == '<html>другой</html>'.encode()
+                assert test_records[0][1] == 'https://another.org'
+
+                assert len([r async for r in db.iter_pages()]) == 8
+
+                try:
+                    [r async for r in db.iter_pages(columns=('url', 'tsv'))]
+                except ValueError:
+                    pass
+                else:
+                    assert False
+
+
+@async_test
+async def test_sqlite_iter_pages_text():
+
+    with TemporaryDirectory() as directory:
+        async with SQLiteDB(os.path.join(directory, 'spider.db')) as db:
+            await db.add_records([('https://example.com', 'title', 'html', 'text'),
+                                  ('https://example.com/1', 'title', 'html')])
+            test_records = sorted([tuple(r) async for r in db.iter_pages(columns=('url', 'text'), raw=True)])
+            assert test_records == [('https://example.com', b'text'), ('https://example.com/1', b'')]
+
+
+@async_test
+async def test_extracted():
+
+    records = [
+        ('https://example.com/0', 'title0', 'html0', 'text0', {'description': 'd', 'opengraph': {'type': 'article'}}),
+        ('https://example.com/1', 'title1', 'html1'),
+        ('https://example.com/2', 'title2', 'html2', 'text2', None, 'https://example.com/1', ['https://example.com/r']),
+    ]
+
+    with TemporaryDirectory() as directory:
+        for storage in make_storages(directory):
+            async with storage as db:
+                await db.add_records(records)
+
+            # извлеченные данные сохраняются после повторного открытия хранилища
+            async with storage as db:
+                test_records = sorted([tuple(r) async for r in db.iter_pages(columns=('url', 'extracted'))])
+                assert test_records == [
+                    ('https://example.com/0', {'description': 'd', 'opengraph': {'type': 'article'}}),
+                    ('https://example.com/1', None),
+                    ('https://example.com/2', None),
+                ]
+
+                test_records = [tuple(r) async for r in db.iter_pages('example.com/2', ('canonical', 'redirects'))]
+                assert test_records == [('https://example.com/1', ['https://example.com/r'])]
@@ -0,0 +1,102 @@
+from asyncio import TimeoutError, gather, sleep
+
+from spider.throttle import INCREASE, LATENCY, TIMEOUT, AdaptiveLimit, Throttle
+
+from .fixtures import async_test
+
+###########
+# УТИЛИТЫ #
+###########
+
+
+async def run_window(limit: AdaptiveLimit, latency: float) -> list:
+    """ Выполнить окно запросов, каждый раз занимая весь лимит. Возвращает решения. """
+    decisions = []
+    while len(decisions) < max(AdaptiveLimit.MIN_SAMPLES, int(limit.limit)):
+        tickets = [await limit.acquire() for _ in range(int(limit.limit))]
+        decisions += [limit.release(ticket, latency) for ticket in tickets]
+    return [decision for decision in decisions if decision is not None]
+
+
+##############################
+# АСИНХРОННЫЕ ФУНКЦИИ ТЕСТОВ #
+##############################
+
+@async_test
+async def test_limit_caps_concurrency():
+
+    limit = AdaptiveLimit(2)
+    active = []
+
+    async def request():
+        ticket = await limit.acquire()
+        active.append(limit.in_flight)
+        await sleep(0.01)
+        limit.release(ticket, 0.01)
+
+    await gather(*(request() for _ in range(8)))
+
+    assert max(active) == 2
+    assert limit.in_flight == 0
+
+
+@async_test
+async def test_increase_and_decrease():
+
+    limit = AdaptiveLimit(2, max_limit=6)
+
+    # медленный старт: лимит удваивается, пока не достигнет максимума
+    assert await run_window(limit, 0.01) == [INCREASE]
+    assert limit.limit == 4
+    assert await run_window(limit, 0.01) == [INCREASE]
+    assert limit.limit == 6
+    assert await run_window(limit, 0.01) == []
+
+    # таймауты запросов, отправленных до снижения, лимит повторно не снижают
+    tickets = [await limit.acquire() for _ in range(3)]
+    assert [limit.release(ticket, outcome=TIMEOUT) for ticket in tickets] == [TIMEOUT, None, None]
+    assert limit.limit == 3
+
+    # после снижения лимит растет на единицу
+    assert await run_window(limit, 0.01) == [INCREASE]
+    assert limit.limit == 4
+
+
+@async_test
+async def test_latency_spike():
+
+    limit = AdaptiveLimit(4, max_limit=4)
+
+    assert await run_window(limit, 0.1) == []
+    assert await run_window(limit, 0.15) == []
+    assert await run_window(limit, 0.5) == [LATENCY]
+    assert limit.limit == 2
+
+
+@async_test
+async def test_slot():
+
+    throttle = Throttle(host_initial=2, total_initial=8)
+    stat = {}
+
+    async with throttle.slot('example.com', stat) as slot:
+        slot.status = 429
+    try:
+        async with throttle.slot('example.com', stat):
+            raise TimeoutError
+    except TimeoutError:
+        pass
+    async with throttle.slot('example.org', stat) as slot:
+        slot.status = 200
+
+    # ответ 429 и таймаут снижают лимит хоста и общий лимит, успешный ответ решений не вызывает
+    assert stat == {'throttle': {
+        'example.com': {'overload': 1, 'timeout': 1, 'limit': 1},
+        '*': {'overload': 1, 'timeout': 1, 'limit': 2},
+    }}
+    assert throttle.host_limit('example.org').limit == 2
+
+    # место, освобожденное без запроса, не учитывается во времени ответа
+    async with throttle.slot('example.net', stat):
+        pass
+    assert throttle.host_limit('example.net')._latencies == [] and throttle.host_limit('example.net').in_flight == 0
@@ -0,0 +1,58 @@
+import pickle
+
+from spider.traps import TrapDetector, url_template
+
+##################
+# ФУНКЦИИ ТЕСТОВ #
+##################
+
+
+def test_url_template():
+
+    assert url_template('https://Example.com/news/2024/05/01/') == 'example.com/news/{n}/{n}/{n}/'
+    assert url_template('https://example.com/a?b=1&a=2&b=3') == 'example.com/a?a&b'
+    assert url_template('https://example.com/u/3f2504e0-4f89-11d3-9a0c-0305e82c3301') == 'example.com/u/{id}'
+    # слова без цифр идентификаторами не считаются
+    assert url_template('https://example.com/internationalization') == 'example.com/internationalization'
+
+
+def test_path_limits():
+
+    traps = TrapDetector(max_depth=3, max_repeats=1)
+
+    assert traps.check('https://example.com/a/b/c') is None
+    assert traps.check('https://example.com/a/b/c/d') == 'depth'
+    assert traps.check('https://example.com/a/b/a') == 'repetition'
+
+
+def test_param_cardinality():
+
+    traps = TrapDetector(max_param_values=2)
+
+    assert traps.check('https://example.com/search?page=1') is None
+    assert traps.check('https://example.com/search?page=2&q=x') is None
+    # новое значение параметра page отбрасывается, известное - нет, другие пути считаются отдельно
+    assert traps.check('https://example.com/search?page=3') == 'param'
+    assert traps.check('https://example.com/search?page=1&sort=asc') is None
+    assert traps.check('https://example.com/archive?page=3') is None
+
+
+def test_novelty():
+
+    menu = 'Home News Events Archive About Contacts Search Subscribe Login Register Help Privacy Terms Sitemap'
+    traps = TrapDetector()
+    for day in range(TrapDetector.MIN_PAGES):
+        traps.observe(f'https://example.com/calendar/{day}', f'{menu} Day {day}: no events, see the next day {menu}')
+        traps.observe(f'https://example.com/post/{day}', ' '.join(f'word{day}x{i}' for i in range(50)))
+
+    # страницы календаря почти одинаковы, статьи различаются
+    assert traps.check('https://example.com/calendar/99') == 'novelty'
+    assert traps.check('https://example.com/post/99') is None
+
+
+def test_pickle():
+
+    traps = pickle.loads(pickle.dumps(TrapDetector(template_cap=1)))
+
+    assert traps.check('https://example.com/1') is None
+    assert traps.check('https://example.com/2') == 'template'
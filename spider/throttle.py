@@ -0,0 +1,306 @@
+from asyncio import TimeoutError, get_event_loop
+from collections import deque
+from time import perf_counter
+from typing import Deque, Dict, List, Union
+
+try:
+    from .profiler import percentile
+except ImportError:
+    from profiler import percentile
+
+TOTAL = '*'                 # ключ общего лимита в статистике
+
+OK = 'ok'                   # исход: ответ получен
+TIMEOUT = 'timeout'         # исход: таймаут запроса
+ERROR = 'error'             # исход: ошибка соединения или ответ 5xx
+OVERLOAD = 'overload'       # исход: ответ 429 или 503 (сервер просит снизить нагрузку)
+LATENCY = 'latency'         # решение: снижение из-за роста p95 времени ответа
+INCREASE = 'increase'       # решение: увеличение лимита
+OVERLOAD_STATUSES = {429, 503}
+
+
+def classify(exc_type: type, status: Union[int, None]) -> str:
+    """ Определить исход запроса.
+
+    :param exc_type: тип исключения, прервавшего запрос (None, если его не было)
+    :type exc_type: type
+    :param status: статус ответа (None, если ответ не получен)
+    :type status: Union[int, None]
+    :return: исход
+    :rtype: str
+
+    >>> classify(None, 200), classify(TimeoutError, None), classify(None, 429), classify(OSError, None)
+    ('ok', 'timeout', 'overload', 'error')
+    """
+    if exc_type is not None:
+        return TIMEOUT if issubclass(exc_type, TimeoutError) else ERROR
+    if status in OVERLOAD_STATUSES:
+        return OVERLOAD
+    if status is not None and status >= 500:
+        return ERROR
+    return OK
+
+
+class AdaptiveLimit:
+    """ Лимит одновременных запросов, подстраиваемый по схеме AIMD (additive increase, multiplicative decrease).
+
+    Успешные ответы собираются в окна (не меньше MIN_SAMPLES и не меньше текущего лимита). Если в окне лимит был
+    исчерпан, а p95 времени ответа не превысил базовый уровень больше чем в tolerance раз, лимит увеличивается: до
+    первого снижения - вдвое (медленный старт), затем на единицу. Таймаут, ошибка, ответ 429/503 или рост p95
+    уменьшают лимит в decrease раз. Снижение происходит не чаще одного раза на поколение запросов: неудачи запросов,
+    отправленных до последнего снижения, уже учтены им.
+    """
+
+    MIN_SAMPLES = 10        # минимальный размер окна ответов
+    MIN_LATENCY = 0.05      # p95 ниже этого значения (в секундах) ростом задержки не считается
+    BASELINE_DRIFT = 1.1    # во сколько раз за окно базовый уровень p95 может вырасти вслед за стабильной задержкой
+
+    limit: float                        # текущий лимит
+    in_flight: int                      # число выполняемых запросов
+    baseline: float                     # базовый уровень p95 времени ответа (None, пока окно не собрано)
+    _min_limit: int                     # минимальный лимит
+    _max_limit: int                     # максимальный лимит
+    _decrease: float                    # множитель снижения
+    _tolerance: float                   # допустимый рост p95 относительно базового уровня
+    _slow_start: bool                   # лимит еще не снижался и растет вдвое
+    _saturated: bool                    # лимит был исчерпан в текущем окне
+    _latencies: List[float]             # времена ответов текущего окна
+    _started: int                       # число начатых запросов (номер последнего выданного билета)
+    _cut_at: int                        # номер последнего билета, выданного до последнего снижения
+    _waiters: Deque                     # ожидающие освобождения лимита (futures)
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 256, decrease: float = 0.5,
+                 tolerance: float = 2.0):
+        """ Инициализация лимита.
+
+        :param initial: начальный лимит
+        :type initial: int
+        :param min_limit: минимальный лимит, defaults to 1
+        :type min_limit: int, optional
+        :param max_limit: максимальный лимит, defaults to 256
+        :type max_limit: int, optional
+        :param decrease: множитель снижения, defaults to 0.5
+        :type decrease: float, optional
+        :param tolerance: допустимый рост p95 времени ответа относительно базового уровня, defaults to 2.0
+        :type tolerance: float, optional
+        """
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.baseline = None
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._decrease = decrease
+        self._tolerance = tolerance
+        self._slow_start = True
+        self._saturated = False
+        self._latencies = []
+        self._started = 0
+        self._cut_at = 0
+        self._waiters = deque()
+
+    async def acquire(self) -> int:
+        """ Дождаться свободного места и занять его.
+
+        :return: билет запроса (его номер), передаваемый в release
+        :rtype: int
+        """
+        while self.in_flight >= int(self.limit):
+            self._saturated = True
+            waiter = get_event_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif not waiter.cancelled():
+                    self._wake()
+                raise
+        self.in_flight += 1
+        self._started += 1
+        if self.in_flight >= int(self.limit):
+            self._saturated = True
+        return self._started
+
+    def release(self, ticket: int, latency: float = None, outcome: str = OK) -> Union[str, None]:
+        """ Освободить место и учесть исход запроса.
+
+        :param ticket: билет запроса
+        :type ticket: int
+        :param latency: время ответа в секундах (None, если запрос не выполнялся), defaults to None
+        :type latency: float, optional
+        :param outcome: исход запроса, defaults to OK
+        :type outcome: str, optional
+        :return: решение (INCREASE, LATENCY или исход, вызвавший снижение) или None, если лимит не изменился
+        :rtype: Union[str, None]
+
+        >>> limit = AdaptiveLimit(2, max_limit=3)
+        >>> limit.release(get_event_loop().run_until_complete(limit.acquire()), outcome=TIMEOUT), limit.limit
+        ('timeout', 1.0)
+        """
+        self.in_flight -= 1
+        decision = None
+        if outcome != OK:
+            if ticket > self._cut_at:
+                decision = outcome
+        elif latency is not None:
+            self._latencies.append(latency)
+            if len(self._latencies) >= max(self.MIN_SAMPLES, int(self.limit)):
+                decision = self._evaluate(ticket)
+        if decision is not None and decision != INCREASE:
+            self.limit = max(float(self._min_limit), self.limit * self._decrease)
+            self._slow_start = False
+            self._cut_at = self._started
+            self._latencies = []
+        self._wake()
+        return decision
+
+    def _evaluate(self, ticket: int) -> Union[str, None]:
+        p95 = percentile(sorted(self._latencies), 95)
+        self._latencies = []
+        saturated, self._saturated = self._saturated, False
+        if self.baseline is None:
+            self.baseline = p95
+        if p95 > max(self.baseline * self._tolerance, self.MIN_LATENCY):
+            return LATENCY if ticket > self._cut_at else None
+        self.baseline = min(p95, self.baseline * self.BASELINE_DRIFT)
+        if not saturated or self.limit >= self._max_limit:
+            return None
+        self.limit = min(float(self._max_limit), self.limit * 2 if self._slow_start else self.limit + 1)
+        return INCREASE
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class Slot:
+    """ Место для одного запроса в лимитах хоста и общем лимите (асинхронный контекстный менеджер).
+
+    Исход определяется по исключению, прервавшему блок, и статусу ответа, который нужно записать в атрибут status.
+    Если блок завершился без исключения и без статуса (запрос не отправлен), время ответа не учитывается.
+    """
+
+    __slots__ = ('status', '_throttle', '_host', '_tickets', '_started', '_stat')
+
+    status: int                         # статус ответа (None, если ответ не получен)
+    _throttle: 'Throttle'               # регулятор
+    _host: str                          # хост запроса
+    _tickets: tuple                     # билеты лимита хоста и общего лимита
+    _started: float                     # момент получения места
+    _stat: dict                         # словарь статистики (None, если решения не учитываются)
+
+    def __init__(self, throttle: 'Throttle', host: str, stat: dict = None):
+        self.status = None
+        self._throttle = throttle
+        self._host = host
+        self._stat = stat
+
+    async def __aenter__(self):
+        host_limit = self._throttle.host_limit(self._host)
+        ticket = await host_limit.acquire()
+        try:
+            self._tickets = (ticket, await self._throttle.total.acquire())
+        except BaseException:
+            host_limit.release(ticket, outcome=OK)
+            raise
+        self._started = perf_counter()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        latency = None if exc_type is None and self.status is None else perf_counter() - self._started
+        outcome = classify(exc_type, self.status)
+        host_limit = self._throttle.host_limit(self._host)
+        for key, limit, ticket in ((self._host, host_limit, self._tickets[0]),
+                                   (TOTAL, self._throttle.total, self._tickets[1])):
+            decision = limit.release(ticket, latency, outcome)
+            if decision is not None and self._stat is not None:
+                decisions = self._stat.setdefault('throttle', {}).setdefault(key, {})
+                decisions[decision] = decisions.get(decision, 0) + 1
+                decisions['limit'] = int(limit.limit)
+
+
+class NullSlot:
+    """ Заглушка места запроса, если регулятор не используется. """
+
+    status: int = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+class Throttle:
+    """ Адаптивный регулятор числа одновременных запросов: отдельный лимит для каждого хоста и общий лимит.
+
+    Решения (увеличения и снижения лимитов с причинами) учитываются в статистике обхода по ключу throttle: для
+    каждого хоста и для общего лимита ('*') - число решений каждого вида и лимит после последнего решения.
+    """
+
+    total: AdaptiveLimit                # общий лимит
+    _hosts: Dict[str, AdaptiveLimit]    # лимиты хостов
+    _host_initial: int                  # начальный лимит хоста
+    _host_max: int                      # максимальный лимит хоста
+    _decrease: float                    # множитель снижения
+    _tolerance: float                   # допустимый рост p95 времени ответа
+
+    def __init__(self, host_initial: int = 4, host_max: int = 64, total_initial: int = 32, total_max: int = 512,
+                 decrease: float = 0.5, tolerance: float = 2.0):
+        """ Инициализация регулятора.
+
+        :param host_initial: начальный лимит хоста, defaults to 4
+        :type host_initial: int, optional
+        :param host_max: максимальный лимит хоста, defaults to 64
+        :type host_max: int, optional
+        :param total_initial: начальный общий лимит, defaults to 32
+        :type total_initial: int, optional
+        :param total_max: максимальный общий лимит, defaults to 512
+        :type total_max: int, optional
+        :param decrease: множитель снижения лимита, defaults to 0.5
+        :type decrease: float, optional
+        :param tolerance: допустимый рост p95 времени ответа относительно базового уровня, defaults to 2.0
+        :type tolerance: float, optional
+        """
+        self.total = AdaptiveLimit(total_initial, max_limit=total_max, decrease=decrease, tolerance=tolerance)
+        self._hosts = {}
+        self._host_initial = host_initial
+        self._host_max = host_max
+        self._decrease = decrease
+        self._tolerance = tolerance
+
+    def host_limit(self, host: str) -> AdaptiveLimit:
+        """ Получить лимит хоста (создается при первом запросе к хосту).
+
+        :param host: хост
+        :type host: str
+        :return: лимит
+        :rtype: AdaptiveLimit
+        """
+        limit = self._hosts.get(host)
+        if limit is None:
+            limit = self._hosts[host] = AdaptiveLimit(self._host_initial, max_limit=self._host_max,
+                                                      decrease=self._decrease, tolerance=self._tolerance)
+        return limit
+
+    def slot(self, host: str, stat: dict = None) -> Slot:
+        """ Получить место для запроса к хосту.
+
+        :param host: хост
+        :type host: str
+        :param stat: словарь статистики, в который записываются решения, defaults to None
+        :type stat: dict, optional
+        :return: асинхронный контекстный менеджер
+        :rtype: Slot
+        """
+        return Slot(self, host, stat)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
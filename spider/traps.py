@@ -0,0 +1,191 @@
+import re
+from collections import Counter
+from hashlib import blake2b
+from typing import Dict, List, Set, Tuple, Union
+from urllib.parse import parse_qsl, urlsplit
+
+DIGITS = re.compile(r'[0-9]+')                          # числа в сегментах пути
+TOKEN = re.compile(r'(?=.*[0-9])(?=.*[a-zA-Z])[0-9a-zA-Z_-]{16,}')   # идентификаторы: хэши, UUID, токены сессий
+WORD = re.compile(r'\w+')                               # слова текста для отпечатка
+FINGERPRINT_BITS = 64                                   # размер отпечатка simhash
+
+DEPTH = 'depth'             # причина: слишком глубокий путь
+REPETITION = 'repetition'   # причина: сегмент пути повторяется (/a/b/a/b/a/b)
+TEMPLATE = 'template'       # причина: превышено число URL одного шаблона
+PARAM = 'param'             # причина: у параметра запроса слишком много разных значений (сессии, фильтры)
+NOVELTY = 'novelty'         # причина: страницы шаблона почти не отличаются друг от друга (пустые дни календаря)
+
+
+def url_template(url: str) -> str:
+    """ Получить шаблон URL: числа заменяются на {n}, идентификаторы - на {id}, из запроса остаются имена параметров.
+
+    :param url: URL
+    :type url: str
+    :return: шаблон
+    :rtype: str
+
+    >>> url_template('https://example.com/calendar/2024/05/?month=5&year=2024')
+    'example.com/calendar/{n}/{n}/?month&year'
+    >>> url_template('https://example.com/s/9f86d081884c7d659a2feaa0c55ad015/page-2')
+    'example.com/s/{id}/page-{n}'
+    """
+    parts = urlsplit(url)
+    segments = [
+        '{id}' if TOKEN.fullmatch(segment) else DIGITS.sub('{n}', segment)
+        for segment in parts.path.split('/')
+    ]
+    template = parts.netloc.lower() + '/'.join(segments)
+    if parts.query:
+        template += '?' + '&'.join(sorted({name for name, _ in parse_qsl(parts.query, keep_blank_values=True)}))
+    return template
+
+
+def simhash(text: str) -> int:
+    """ Получить отпечаток simhash текста по парам соседних слов: у похожих текстов отпечатки отличаются в немногих
+    битах.
+
+    :param text: текст
+    :type text: str
+    :return: отпечаток (FINGERPRINT_BITS бит)
+    :rtype: int
+
+    >>> page = ('Calendar of events. There are no events planned for {}. See the previous or the next day, '
+    ...         'subscribe to the newsletter, search the archive or contact the editors of the site.')
+    >>> a, b, c = simhash(page.format('May 1')), simhash(page.format('May 2')), simhash('A different page.')
+    >>> bin(a ^ b).count('1') <= TrapDetector.MAX_DISTANCE < bin(a ^ c).count('1'), simhash('')
+    (True, 0)
+    """
+    words = WORD.findall(text.lower())
+    weights = [0] * FINGERPRINT_BITS
+    for shingle in set(zip(words, words[1:])) or {(word,) for word in words}:
+        value = int.from_bytes(blake2b(' '.join(shingle).encode(), digest_size=8).digest(), 'little')
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+class TrapDetector:
+    """ Обнаружение ловушек обходчика: бесконечных пространств URL (календари, фасетный поиск, идентификаторы сессий,
+    бесконечно растущие пути).
+
+    Проверяются только новые ссылки (еще не посещенные и не стоящие в очереди). Ссылка отбрасывается, если ее путь
+    слишком глубокий или в нем повторяются сегменты, если число принятых URL ее шаблона достигло предела, если у
+    параметра запроса этого пути уже слишком много разных значений или если страницы ее шаблона почти одинаковы.
+    """
+
+    MIN_PAGES = 10              # число страниц шаблона, после которого оценивается новизна контента
+    MAX_FINGERPRINTS = 64       # число последних отпечатков страниц, хранимых для шаблона
+    MAX_DISTANCE = 12           # число различающихся бит отпечатков, при котором страницы считаются почти одинаковыми
+
+    _max_depth: int                             # максимальное число сегментов пути
+    _max_repeats: int                           # максимальное число повторов сегмента пути
+    _template_cap: int                          # предел числа URL одного шаблона (None - без предела)
+    _max_param_values: int                      # предел числа разных значений параметра запроса одного пути
+    _min_novelty: float                         # минимальная доля непохожих страниц шаблона
+    _templates: Counter                         # число принятых URL по шаблонам
+    _param_values: Dict[Tuple[str, str], Set[str]]     # значения параметров по (шаблон пути, имя параметра)
+    _fingerprints: Dict[str, List[int]]         # последние отпечатки страниц по шаблонам
+    _pages: Counter                             # число страниц по шаблонам
+    _duplicates: Counter                        # число почти одинаковых страниц по шаблонам
+    _blocked: Set[str]                          # шаблоны, отброшенные из-за низкой новизны
+
+    def __init__(self, max_depth: int = 12, max_repeats: int = 2, template_cap: int = None,
+                 max_param_values: int = 200, min_novelty: float = 0.2):
+        """ Инициализация детектора ловушек.
+
+        :param max_depth: максимальное число сегментов пути, defaults to 12
+        :type max_depth: int, optional
+        :param max_repeats: максимальное число повторов одного сегмента пути, defaults to 2
+        :type max_repeats: int, optional
+        :param template_cap: предел числа URL одного шаблона, defaults to None (без предела)
+        :type template_cap: int, optional
+        :param max_param_values: предел числа разных значений одного параметра запроса одного шаблона пути,
+            defaults to 200
+        :type max_param_values: int, optional
+        :param min_novelty: минимальная доля страниц шаблона, непохожих на предыдущие, defaults to 0.2
+        :type min_novelty: float, optional
+        """
+        self._max_depth = max_depth
+        self._max_repeats = max_repeats
+        self._template_cap = template_cap
+        self._max_param_values = max_param_values
+        self._min_novelty = min_novelty
+        self._templates = Counter()
+        self._param_values = {}
+        self._fingerprints = {}
+        self._pages = Counter()
+        self._duplicates = Counter()
+        self._blocked = set()
+
+    def check(self, url: str) -> Union[str, None]:
+        """ Проверить новую ссылку. Принятая ссылка учитывается в счетчиках шаблона и параметров.
+
+        :param url: URL
+        :type url: str
+        :return: причина, по которой ссылка отброшена, или None, если ссылка принята
+        :rtype: Union[str, None]
+
+        >>> traps = TrapDetector(template_cap=2)
+        >>> [traps.check(f'https://example.com/item/{i}') for i in range(3)]
+        [None, None, 'template']
+        >>> traps.check('https://example.com/a/b/a/b/a'), traps.check('https://example.com/' + 'x/' * 20)
+        ('repetition', 'depth')
+        """
+        parts = urlsplit(url)
+        segments = [segment for segment in parts.path.split('/') if segment]
+        if len(segments) > self._max_depth:
+            return DEPTH
+        if segments and max(Counter(segments).values()) > self._max_repeats:
+            return REPETITION
+
+        template = url_template(url)
+        if template in self._blocked:
+            return NOVELTY
+        if self._template_cap is not None and self._templates[template] >= self._template_cap:
+            return TEMPLATE
+
+        # значения параметров считаются для шаблона пути: /search?page=1 и /search?page=2&q=x - один путь
+        path = template.partition('?')[0]
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        for name, value in params:
+            values = self._param_values.get((path, name))
+            if values is not None and value not in values and len(values) >= self._max_param_values:
+                return PARAM
+        for name, value in params:
+            self._param_values.setdefault((path, name), set()).add(value)
+
+        self._templates[template] += 1
+        return None
+
+    def observe(self, url: str, text: str):
+        """ Учесть текст загруженной страницы. Если страницы шаблона почти не отличаются друг от друга, новые ссылки
+        этого шаблона отбрасываются.
+
+        :param url: URL страницы
+        :type url: str
+        :param text: видимый текст страницы
+        :type text: str
+
+        >>> traps = TrapDetector()
+        >>> for day in range(12):
+        ...     traps.observe(f'https://example.com/calendar/{day}', 'no events planned for this day ' * 10)
+        >>> traps.check('https://example.com/calendar/13')
+        'novelty'
+        """
+        template = url_template(url)
+        fingerprint = simhash(text)
+        fingerprints = self._fingerprints.setdefault(template, [])
+        if any(bin(fingerprint ^ other).count('1') <= self.MAX_DISTANCE for other in fingerprints):
+            self._duplicates[template] += 1
+        fingerprints.append(fingerprint)
+        del fingerprints[:-self.MAX_FINGERPRINTS]
+        self._pages[template] += 1
+
+        pages = self._pages[template]
+        if pages >= self.MIN_PAGES and (pages - self._duplicates[template]) / pages < self._min_novelty:
+            self._blocked.add(template)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,163 @@
+import re
+from typing import Callable, Iterable, List
+from urllib.parse import urljoin, urlparse, urlsplit
+
+try:
+    from .psl import default_list
+except ImportError:
+    from psl import default_list
+
+SCHEME_PATTERN = re.compile(r'[a-zA-Z][a-zA-Z0-9+.-]*:')    # ссылка со схемой (https:, mailto:, javascript: и т.д.)
+
+
+def doctor(url: str) -> str:
+    """ Простая нормализация домена (убирает фрагмент и завершающий слэш).
+
+    :param url: входной URL
+    :type url: str
+    :return: нормализованный URL
+    :rtype: str
+
+    >>> doctor('https://example.com#frag')
+    'https://example.com'
+    >>> doctor('https://example.com/')
+    'https://example.com'
+    >>> doctor('https://example.com/#frag')
+    'https://example.com'
+    >>> doctor('https://example.com')
+    'https://example.com'
+    """
+    if '#' in url:
+        url = url[:url.find('#')]
+    url = url.strip('/')
+    return url
+
+
+def get_base_domain(url: str) -> str:
+    """ Получить регистрируемый домен для URL по списку публичных суффиксов.
+
+    Для хоста news.bbc.co.uk это bbc.co.uk, а не co.uk. IP-адреса и localhost возвращаются без изменений, порт
+    отбрасывается.
+
+    :param url: URL
+    :type url: str
+    :return: регистрируемый домен
+    :rtype: str
+
+    >>> get_base_domain('https://up.example.com')
+    'example.com'
+    >>> get_base_domain('https://example.com/')
+    'example.com'
+    >>> get_base_domain('https://example.com/some/path')
+    'example.com'
+    >>> get_base_domain('https://example.com/some/path/')
+    'example.com'
+    >>> get_base_domain('https://example.com/some/path/?key=value')
+    'example.com'
+    >>> get_base_domain('https://example.com/some/path/?key=value#frag')
+    'example.com'
+    >>> get_base_domain('https://news.bbc.co.uk/sport')
+    'bbc.co.uk'
+    >>> get_base_domain('https://user.github.io')
+    'user.github.io'
+    >>> get_base_domain('http://127.0.0.1:8080/'), get_base_domain('http://localhost:8080/')
+    ('127.0.0.1', 'localhost')
+    """
+    return default_list().registrable_domain(urlparse(url).hostname or '')
+
+
+def rel2abs(path: str, base: str) -> str:
+    """ Сформировать абсолютную ссылку из относительной.
+
+    :param path: относительный путь
+    :type path: str
+    :param base: базовый URL
+    :type base: str
+    :return: абсолютная ссылка
+    :rtype: str
+
+    >>> rel2abs('/some/path', 'https://up.example.com')
+    'https://up.example.com/some/path'
+    >>> rel2abs('/some/path', 'https://example.com/')
+    'https://example.com/some/path'
+    >>> rel2abs('/some/path', 'https://example.com/another/path')
+    'https://example.com/some/path'
+    >>> rel2abs('/some/path', 'https://example.com/another/path/')
+    'https://example.com/some/path'
+    >>> rel2abs('/some/path', 'https://example.com/another/path/?key=value')
+    'https://example.com/some/path'
+    >>> rel2abs('/some/path', 'https://example.com/another/path/?key=value#frag')
+    'https://example.com/some/path'
+    """
+    base = urlparse(base)
+    base = '://'.join((base.scheme, base.netloc))
+    return urljoin(base, path)
+
+
+def resolve_links(hrefs: Iterable[str], base: str, allows: Callable[[str], bool] = None) -> List[str]:
+    """ Получить абсолютные нормализованные ссылки страницы за один проход.
+
+    Ссылки дополняются относительно базового URL страницы, нормализуются так же, как doctor, фильтруются и
+    избавляются от повторов. Частые виды ссылок (абсолютные, от корня сайта, //host/path, ?query) дополняются
+    конкатенацией строк, urljoin вызывается только для путей с сегментами '.' и '..'.
+    Фильтр вызывается один раз для каждой уникальной ссылки.
+
+    :param hrefs: значения атрибутов href (None и пустые строки пропускаются)
+    :type hrefs: Iterable[str]
+    :param base: базовый URL страницы (URL страницы или значение тэга <base href>)
+    :type base: str
+    :param allows: фильтр ссылок (например, Scope.allows), defaults to None (ссылки не фильтруются)
+    :type allows: Callable[[str], bool], optional
+    :return: ссылки в порядке появления на странице
+    :rtype: List[str]
+
+    >>> resolve_links(['/a', 'b/', '?page=2', '//cdn.example.com/x', '#top', '/a#frag', 'mailto:me@example.com'],
+    ...               'https://example.com/docs/index.html?lang=en')
+    ['https://example.com/a', 'https://example.com/docs/b', 'https://example.com/docs/index.html?page=2', \
+'https://cdn.example.com/x', 'mailto:me@example.com']
+    >>> resolve_links(['../up', '/x/./y', None, 'https://other.org/'], 'https://example.com/docs/',
+    ...               lambda link: 'other' not in link)
+    ['https://example.com/up', 'https://example.com/x/y']
+    """
+    parts = urlsplit(base)
+    origin = f'{parts.scheme}://{parts.netloc}'
+    document = origin + (parts.path or '/')
+    directory = document[:document.rfind('/') + 1]
+    seen = set()
+    links = []
+    for href in hrefs:
+        if not href:
+            continue
+        cut = href.find('#')
+        if cut >= 0:
+            href = href[:cut]
+        href = href.strip()
+        if not href:
+            continue
+        if href[0] == '/':
+            if href[1:2] == '/':
+                link = f'{parts.scheme}:{href}'
+            elif '/.' in href:
+                link = urljoin(base, href)
+            else:
+                link = origin + href
+        elif href[0] == '?':
+            link = document + href
+        elif SCHEME_PATTERN.match(href):
+            link = href
+        elif './' in href or href.endswith('.'):
+            link = urljoin(base, href)
+        else:
+            link = directory + href
+        link = link.strip('/')
+        if link in seen:
+            continue
+        seen.add(link)
+        if allows is None or allows(link):
+            links.append(link)
+    return links
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()